@@ -1,25 +1,74 @@
 """
 Hamees Attire Inventory Management System
 Main Application
+
+``create_app(config)`` builds an application: Config (environment variables)
+updated with ``config``, the extensions and the ``api`` blueprint. Nothing
+connects to the database until the first request, and engines are reset in
+forked children, so a pre-forking server can build the app once in the
+master (``gunicorn --preload wsgi:app``). The NumPy-based sizing and
+forecasting modules are imported on first use.
 """
-from flask import Flask, request, jsonify
-from datetime import datetime
-from models import db, Customer, InventoryItem, TailoringOrder, OrderItem
+import click
+from flask import (Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context,
+                   url_for)
+from datetime import datetime, timezone
+from models import db, Customer, InventoryItem, TailoringOrder, OrderItem, Job, ORDER_DETAIL_LOADING
+from config import Config, database_binds, engine_options
+from database import init_engines
+from routing import replica_router
+from cache import response_cache
+from profiling import request_profiler
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from stats import aggregate_counters, rebuild_stat_counters, stats_payload, stored_counters
+from stock import StockError, complete_order_stock, open_stock_ledger, stock_at, take_stock_snapshots
+from migrations import upgrade_database
+from serializers import CUSTOMERS, INVENTORY_ITEMS, ORDERS, dumps, json_response
+from pagination import PaginationError, apply_cursor, paginate, stream_json_array
+from search import SEARCH_INDEXES, SearchError, parse_result_limit
+from planning import material_requirements
+from bulk import BulkOrderError, insert_orders, validate_orders
+from exports import EXPORTS, ExportError, export_response
+from jobs import JobError, enqueue, run_worker_pool
+from reports import ReportError, financial_report, parse_report_args, rebuild_financial_rollups
+from importer import (InventoryImportError, import_format, import_inventory,
+                      parse_chunk_size, read_rows)
+import logging
 import os
 
-app = Flask(__name__)
+# Routes and CLI commands (the commands stay top level: flask --app app rebuild-stats)
+api = Blueprint('api', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """Build the application; config overrides settings from Config"""
+    app = Flask(__name__)
 
-# Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hamees_inventory.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+    # Configuration (see config.py for the environment variables)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+        if 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+                app.config['SQLALCHEMY_DATABASE_URI'])
+        if 'SQLALCHEMY_BINDS' not in config:
+            app.config['SQLALCHEMY_BINDS'] = database_binds(app.config['DATABASE_REPLICA_URL'])
 
-# Initialize database
-db.init_app(app)
+    # Initialize database, read replica routing, the conditional GET /
+    # response cache, request profiling and Prometheus metrics
+    db.init_app(app)
+    init_engines(app)
+    replica_router.init_app(app)
+    response_cache.init_app(app)
+    request_profiler.init_app(app)
+    metrics.init_app(app)
 
+    app.register_blueprint(api)
+    return app
 
-def parse_delivery_date(date_string):
-    """Parse delivery date string to datetime object with error handling"""
+
+def parse_datetime(date_string):
+    """Parse an ISO 8601 date string to a datetime object with error handling"""
     if not date_string:
         return None
     try:
@@ -28,7 +77,34 @@ def parse_delivery_date(date_string):
         return None
 
 
-@app.route('/')
+def list_response(statement, key_columns, serialize):
+    """Return a select as a plain list, a keyset page or a streamed array
+
+    ``?limit=N&after=<cursor>`` returns ``{"items": [...], "next_cursor": ...}``
+    and ``?stream=1`` streams the whole result set in batches. Rows are
+    converted by one of the serializers in serializers.py.
+    """
+    args = request.args
+    try:
+        if args.get('stream', '').lower() in ('1', 'true'):
+            statement = apply_cursor(statement, key_columns, args.get('after'))
+            return stream_json_array(statement, serialize)
+        if 'limit' in args or 'after' in args:
+            rows, next_cursor = paginate(statement, key_columns, args)
+            return json_response({'items': serialize(rows), 'next_cursor': next_cursor})
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return json_response(serialize(db.session.execute(statement)))
+
+
+def load_order(order_id):
+    """Reload an order with everything to_dict() needs in a single query"""
+    return db.session.get(TailoringOrder, order_id, options=ORDER_DETAIL_LOADING,
+                          populate_existing=True)
+
+
+@api.route('/')
 def index():
     """Welcome endpoint"""
     return jsonify({
@@ -38,18 +114,25 @@ def index():
             'customers': '/api/customers',
             'inventory': '/api/inventory',
             'orders': '/api/orders',
-            'low_stock': '/api/inventory/low-stock'
+            'low_stock': '/api/inventory/low-stock',
+            'requirements': '/api/inventory/requirements',
+            'forecast': '/api/inventory/forecast',
+            'search': '/api/search?q=...',
+            'export_orders': '/api/export/orders',
+            'export_inventory': '/api/export/inventory',
+            'financial_report': '/api/reports/financial',
+            'jobs': '/api/jobs'
         }
     })
 
 
 # Customer endpoints
-@app.route('/api/customers', methods=['GET', 'POST'])
+@api.route('/api/customers', methods=['GET', 'POST'])
+@response_cache.cached('customers')
 def customers():
     """Get all customers or create a new customer"""
     if request.method == 'GET':
-        customers = Customer.query.all()
-        return jsonify([customer.to_dict() for customer in customers])
+        return list_response(CUSTOMERS.select(), (Customer.id,), CUSTOMERS)
     
     elif request.method == 'POST':
         data = request.json
@@ -64,7 +147,8 @@ def customers():
         return jsonify(customer.to_dict()), 201
 
 
-@app.route('/api/customers/<int:customer_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/api/customers/<int:customer_id>', methods=['GET', 'PUT', 'DELETE'])
+@response_cache.cached('customers')
 def customer_detail(customer_id):
     """Get, update or delete a specific customer"""
     customer = Customer.query.get_or_404(customer_id)
@@ -88,16 +172,16 @@ def customer_detail(customer_id):
 
 
 # Inventory endpoints
-@app.route('/api/inventory', methods=['GET', 'POST'])
+@api.route('/api/inventory', methods=['GET', 'POST'])
+@response_cache.cached('inventory')
 def inventory():
     """Get all inventory items or create a new item"""
     if request.method == 'GET':
         category = request.args.get('category')
+        statement = INVENTORY_ITEMS.select()
         if category:
-            items = InventoryItem.query.filter_by(category=category).all()
-        else:
-            items = InventoryItem.query.all()
-        return jsonify([item.to_dict() for item in items])
+            statement = statement.where(InventoryItem.category == category)
+        return list_response(statement, (InventoryItem.id,), INVENTORY_ITEMS)
     
     elif request.method == 'POST':
         data = request.json
@@ -117,7 +201,8 @@ def inventory():
         return jsonify(item.to_dict()), 201
 
 
-@app.route('/api/inventory/<int:item_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/api/inventory/<int:item_id>', methods=['GET', 'PUT', 'DELETE'])
+@response_cache.cached('inventory')
 def inventory_detail(item_id):
     """Get, update or delete a specific inventory item"""
     item = InventoryItem.query.get_or_404(item_id)
@@ -145,37 +230,88 @@ def inventory_detail(item_id):
         return '', 204
 
 
-@app.route('/api/inventory/low-stock', methods=['GET'])
+@api.route('/api/inventory/import', methods=['POST'])
+def import_items():
+    """Upsert inventory items from a CSV or NDJSON upload, streaming progress"""
+    try:
+        chunk_size = parse_chunk_size(request.args.get('chunk_size'),
+                                      current_app.config['IMPORT_CHUNK_SIZE'])
+        rows = read_rows(request.stream,
+                         import_format(request.args.get('format'), request.mimetype))
+    except InventoryImportError as e:
+        return jsonify({'error': str(e)}), 400
+    events = (dumps(event) + b'\n' for event in import_inventory(rows, chunk_size))
+    return Response(stream_with_context(events), mimetype='application/x-ndjson')
+
+
+@api.route('/api/inventory/<int:item_id>/stock', methods=['GET'])
+@response_cache.cached('inventory')
+def inventory_stock_at(item_id):
+    """Get the stock level of an item at a point in time (?at=ISO date)"""
+    item = InventoryItem.query.get_or_404(item_id)
+    at = datetime.utcnow()
+    if request.args.get('at'):
+        at = parse_datetime(request.args['at'])
+        if at is None:
+            return jsonify({'error': 'at must be an ISO 8601 date'}), 400
+        if at.tzinfo is not None:
+            at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    return jsonify({
+        'inventory_item_id': item.id,
+        'at': at.isoformat(),
+        'quantity': stock_at(item.id, at)
+    })
+
+
+@api.route('/api/inventory/low-stock', methods=['GET'])
+@response_cache.cached('inventory')
 def low_stock():
     """Get all inventory items that are at or below reorder level"""
-    items = InventoryItem.query.filter(
-        InventoryItem.quantity <= InventoryItem.reorder_level
-    ).all()
-    return jsonify([item.to_dict() for item in items])
+    rows = db.session.execute(
+        INVENTORY_ITEMS.select().where(InventoryItem.is_low_stock == True)  # noqa: E712
+    )
+    return json_response(INVENTORY_ITEMS(rows))
+
+
+@api.route('/api/inventory/requirements', methods=['GET'])
+@response_cache.cached('inventory', 'orders')
+def inventory_requirements():
+    """Get the stock reserved by open orders and any shortfall per item"""
+    shortfall_only = request.args.get('shortfall', '').lower() in ('1', 'true')
+    return json_response(material_requirements(shortfall_only))
+
+
+@api.route('/api/inventory/forecast', methods=['GET'])
+def inventory_forecast():
+    """Get forecast daily demand and reorder suggestions per item"""
+    from forecasting import reorder_suggestions
+
+    # Not response-cached: the forecast also moves on with the date
+    return json_response(reorder_suggestions())
 
 
 # Tailoring Order endpoints
-@app.route('/api/orders', methods=['GET', 'POST'])
+@api.route('/api/orders', methods=['GET', 'POST'])
+@response_cache.cached('orders')
 def orders():
     """Get all orders or create a new order"""
     if request.method == 'GET':
         status = request.args.get('status')
         customer_id = request.args.get('customer_id')
         
-        query = TailoringOrder.query
+        statement = ORDERS.select()
         if status:
-            query = query.filter_by(status=status)
+            statement = statement.where(TailoringOrder.status == status)
         if customer_id:
-            query = query.filter_by(customer_id=customer_id)
+            statement = statement.where(TailoringOrder.customer_id == customer_id)
         
-        orders = query.all()
-        return jsonify([order.to_dict() for order in orders])
+        return list_response(statement, (TailoringOrder.order_date, TailoringOrder.id), ORDERS)
     
     elif request.method == 'POST':
         data = request.json
         
         # Parse delivery date if provided
-        delivery_date = parse_delivery_date(data.get('delivery_date'))
+        delivery_date = parse_datetime(data.get('delivery_date'))
         
         order = TailoringOrder(
             customer_id=data['customer_id'],
@@ -207,13 +343,35 @@ def orders():
                 db.session.add(order_item)
         
         db.session.commit()
-        return jsonify(order.to_dict()), 201
+        return jsonify(load_order(order.id).to_dict()), 201
+
 
+@api.route('/api/orders/bulk', methods=['POST'])
+def bulk_orders():
+    """Create many orders at once; nothing is created if any order is invalid"""
+    try:
+        orders, invalid = validate_orders(request.get_json(silent=True))
+    except BulkOrderError as e:
+        return jsonify({'error': str(e)}), 400
+    if invalid:
+        return jsonify({
+            'error': f'{len(invalid)} of {len(orders)} orders are invalid; none were created',
+            'results': invalid
+        }), 400
+    
+    results = insert_orders(orders)
+    created = sum('id' in result for result in results)
+    # Committed chunks stay; a 5xx would invite a retry that creates them twice
+    status = 201 if created == len(results) else 207 if created else 500
+    return json_response({'created': created, 'failed': len(results) - created,
+                          'results': results}, status)
 
-@app.route('/api/orders/<int:order_id>', methods=['GET', 'PUT', 'DELETE'])
+
+@api.route('/api/orders/<int:order_id>', methods=['GET', 'PUT', 'DELETE'])
+@response_cache.cached('orders')
 def order_detail(order_id):
     """Get, update or delete a specific order"""
-    order = TailoringOrder.query.get_or_404(order_id)
+    order = TailoringOrder.query.options(*ORDER_DETAIL_LOADING).get_or_404(order_id)
     
     if request.method == 'GET':
         return jsonify(order.to_dict())
@@ -223,10 +381,14 @@ def order_detail(order_id):
         
         # Update delivery date if provided
         if 'delivery_date' in data:
-            order.delivery_date = parse_delivery_date(data['delivery_date'])
+            order.delivery_date = parse_datetime(data['delivery_date'])
+        
+        # Completing an order goes through the atomic stock deduction below
+        completing = data.get('status') == 'completed' and order.status != 'completed'
+        if not completing:
+            order.status = data.get('status', order.status)
         
         # Update order fields
-        order.status = data.get('status', order.status)
         order.garment_type = data.get('garment_type', order.garment_type)
         order.chest = data.get('chest', order.chest)
         order.waist = data.get('waist', order.waist)
@@ -241,13 +403,15 @@ def order_detail(order_id):
         order.advance_payment = data.get('advance_payment', order.advance_payment)
         
         # If order is being marked as completed, deduct inventory
-        if data.get('status') == 'completed' and order.status != 'completed':
-            for order_item in order.order_items:
-                inventory_item = order_item.inventory_item
-                inventory_item.quantity -= order_item.quantity_used
+        if completing:
+            try:
+                complete_order_stock(order)
+            except StockError as e:
+                db.session.rollback()
+                return jsonify(e.to_dict()), e.status_code
         
         db.session.commit()
-        return jsonify(order.to_dict())
+        return jsonify(load_order(order_id).to_dict())
     
     elif request.method == 'DELETE':
         db.session.delete(order)
@@ -255,67 +419,213 @@ def order_detail(order_id):
         return '', 204
 
 
-@app.route('/api/orders/<int:order_id>/complete', methods=['POST'])
+@api.route('/api/orders/<int:order_id>/complete', methods=['POST'])
 def complete_order(order_id):
     """Mark an order as completed and deduct inventory"""
-    order = TailoringOrder.query.get_or_404(order_id)
+    order = TailoringOrder.query.options(*ORDER_DETAIL_LOADING).get_or_404(order_id)
     
     if order.status == 'completed':
         return jsonify({'error': 'Order already completed'}), 400
     
-    # Deduct inventory for all items used
-    for order_item in order.order_items:
-        inventory_item = order_item.inventory_item
-        if inventory_item.quantity < order_item.quantity_used:
-            return jsonify({
-                'error': f'Insufficient quantity for {inventory_item.name}',
-                'available': inventory_item.quantity,
-                'required': order_item.quantity_used
-            }), 400
-        inventory_item.quantity -= order_item.quantity_used
+    # Deduct inventory for all items used, all or nothing
+    try:
+        complete_order_stock(order)
+    except StockError as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), e.status_code
     
-    order.status = 'completed'
     db.session.commit()
     
-    return jsonify(order.to_dict())
+    return jsonify(load_order(order_id).to_dict())
+
+
+@api.route('/api/orders/similar', methods=['GET'])
+@response_cache.cached('orders')
+def similar():
+    """Find past orders of a garment type with the closest measurements"""
+    from sizing import SizingError, parse_match_count, parse_profile, similar_orders
+
+    garment_type = request.args.get('garment_type')
+    if not garment_type:
+        return jsonify({'error': 'garment_type is required'}), 400
+    try:
+        profile = parse_profile(request.args)
+        k = parse_match_count(request.args.get('k'))
+    except SizingError as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({
+        'garment_type': garment_type,
+        'matches': similar_orders(garment_type, profile, k)
+    })
+
+
+# Search
+@api.route('/api/search', methods=['GET'])
+@response_cache.cached('customers', 'inventory')
+def search():
+    """Search customers and inventory items by (partial) words or phone number"""
+    query = request.args.get('q', '')
+    kinds = request.args.get('type')
+    kinds = kinds.split(',') if kinds else list(SEARCH_INDEXES)
+    unknown = [kind for kind in kinds if kind not in SEARCH_INDEXES]
+    if unknown:
+        return jsonify({'error': f"type must be one of: {', '.join(SEARCH_INDEXES)}"}), 400
+    
+    try:
+        limit = parse_result_limit(request.args.get('limit'))
+        candidates = current_app.config['SEARCH_RANK_CANDIDATES']
+        results = {}
+        for kind in kinds:
+            index = SEARCH_INDEXES[kind]
+            rows = db.session.execute(index.search(query, limit, candidates))
+            results[kind] = index.serializer(rows)
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response(results)
+
+
+# Exports
+@api.route('/api/export/<kind>', methods=['GET'])
+def export(kind):
+    """Stream all orders or inventory items as CSV or NDJSON"""
+    if kind not in EXPORTS:
+        return jsonify({'error': f"Export must be one of: {', '.join(EXPORTS)}"}), 404
+    try:
+        return export_response(EXPORTS[kind], request.args,
+                               gzip=request.accept_encodings['gzip'] > 0)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
 
 
 # Statistics and reporting
-@app.route('/api/stats', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])
+@response_cache.cached('customers', 'inventory', 'orders')
 def stats():
     """Get system statistics"""
-    total_customers = Customer.query.count()
-    total_inventory_items = InventoryItem.query.count()
-    total_orders = TailoringOrder.query.count()
-    pending_orders = TailoringOrder.query.filter_by(status='pending').count()
-    in_progress_orders = TailoringOrder.query.filter_by(status='in_progress').count()
-    completed_orders = TailoringOrder.query.filter_by(status='completed').count()
-    low_stock_items = InventoryItem.query.filter(
-        InventoryItem.quantity <= InventoryItem.reorder_level
-    ).count()
-    
-    return jsonify({
-        'customers': total_customers,
-        'inventory_items': total_inventory_items,
-        'total_orders': total_orders,
-        'orders': {
-            'pending': pending_orders,
-            'in_progress': in_progress_orders,
-            'completed': completed_orders
-        },
-        'low_stock_items': low_stock_items
-    })
+    counters = None
+    if current_app.config['STATS_USE_COUNTERS']:
+        counters = stored_counters()
+        if counters is None:
+            rebuild_stat_counters()
+            counters = stored_counters()
+    if counters is None:
+        counters = aggregate_counters()
+    return jsonify(stats_payload(counters))
+
+
+@api.route('/api/reports/financial', methods=['GET'])
+@response_cache.cached('orders')
+def financial_report_view():
+    """Get revenue, advance collected and balance due (?from=&to=&interval=day|month)"""
+    try:
+        start, end, interval = parse_report_args(request.args)
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(financial_report(start, end, interval))
+
+
+@api.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue a background job; poll its Location for the status"""
+    data = request.json or {}
+    try:
+        job = enqueue(data.get('kind'), data.get('payload'))
+    except JobError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify(job.to_dict()), 202, {'Location': url_for('api.job_status', job_id=job.id)}
+
+
+@api.route('/api/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    """Get a job's status, result and last error"""
+    return jsonify(Job.query.get_or_404(job_id).to_dict())
+
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, database, cache and business metrics of all workers"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@api.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the maintained dashboard counters and financial rollups"""
+    rebuild_stat_counters()
+    rebuild_financial_rollups()
+    print("Statistics counters and financial rollups rebuilt.")
+
+
+@api.cli.command('snapshot-stock')
+def snapshot_stock_command():
+    """Snapshot stock levels for point-in-time queries (run periodically)"""
+    count = take_stock_snapshots()
+    print(f"Recorded {count} stock snapshots.")
+
+
+@api.cli.command('forecast-demand')
+def forecast_demand_command():
+    """Recompute demand forecasts and reorder suggestions (run nightly)"""
+    from forecasting import rebuild_forecasts
+
+    count = rebuild_forecasts()
+    print(f"Forecast demand for {count} inventory items.")
+
+
+@api.cli.command('import-inventory')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']),
+              help='File format (default: from the file extension)')
+@click.option('--chunk-size', type=int, help='Rows committed per transaction')
+def import_inventory_command(path, file_format, chunk_size):
+    """Create or update inventory items from a CSV or NDJSON file"""
+    with open(path, 'rb') as stream:
+        try:
+            chunk_size = parse_chunk_size(chunk_size, current_app.config['IMPORT_CHUNK_SIZE'])
+            rows = read_rows(stream, import_format(file_format, path=path))
+        except InventoryImportError as e:
+            raise click.ClickException(str(e))
+        for event in import_inventory(rows, chunk_size):
+            if event['event'] == 'error':
+                errors = '; '.join(f'{key} {message}' for key, message in event['errors'].items())
+                print(f"line {event['line']}: {errors}")
+            elif event['event'] == 'failed':
+                raise click.ClickException(f"lines {event['lines'][0]}-{event['lines'][1]} "
+                                           f"{event['error']}")
+            else:
+                print(f"{event['rows']} rows: {event['created']} created, "
+                      f"{event['updated']} updated, {event['rejected']} rejected")
+
+
+@api.cli.command('run-jobs')
+@click.option('--workers', type=int, help='Worker processes (default: JOB_WORKERS)')
+@click.option('--burst', is_flag=True, help='Exit once no job is due')
+def run_jobs_command(workers, burst):
+    """Run background job workers until interrupted"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(process)d %(message)s')
+    run_worker_pool(current_app._get_current_object(),
+                    workers or current_app.config['JOB_WORKERS'], burst)
+
+
+@api.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Bring an existing database up to the current schema"""
+    count = upgrade_database()
+    print(f"Applied {count} migrations.")
 
 
-def init_db():
+def init_db(app):
     """Initialize the database"""
     with app.app_context():
-        db.create_all()
+        upgrade_database()
+        rebuild_stat_counters()
+        open_stock_ledger()
         print("Database initialized successfully!")
 
 
 if __name__ == '__main__':
-    init_db()
+    app = create_app()
+    init_db(app)
     # Debug mode should only be enabled in development
     # In production, set debug=False and use a production WSGI server
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
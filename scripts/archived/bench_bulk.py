@@ -0,0 +1,86 @@
+"""
+Benchmark: orders per second created through POST /api/orders (one request
+per order) versus POST /api/orders/bulk (one request for the whole batch),
+against an SQLite file with the app's normal settings.
+
+Usage: python bench_bulk.py [orders]   (default 5000)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import func, insert, select
+
+from app import create_app
+from models import db, Customer, InventoryItem, TailoringOrder
+
+CUSTOMERS = 1000
+ITEMS = 200
+
+
+def populate():
+    db.create_all()
+    db.session.execute(insert(Customer), [
+        {'name': f'Customer {i}', 'phone': str(i)} for i in range(CUSTOMERS)
+    ])
+    db.session.execute(insert(InventoryItem), [
+        {'name': f'Fabric {i}', 'category': 'fabric', 'quantity': 1000.0, 'unit': 'meters',
+         'price_per_unit': 20.0, 'reorder_level': 10.0} for i in range(ITEMS)
+    ])
+    db.session.commit()
+
+
+def random_order(rng):
+    return {
+        'customer_id': rng.randint(1, CUSTOMERS),
+        'garment_type': rng.choice(['shirt', 'pant', 'suit', 'kurta']),
+        'chest': round(rng.gauss(40, 3), 1),
+        'waist': round(rng.gauss(34, 3), 1),
+        'delivery_date': '2024-11-20T00:00:00',
+        'total_price': 2500.0,
+        'advance_payment': 1000.0,
+        'items_used': [{'inventory_item_id': rng.randint(1, ITEMS), 'quantity_used': 2.5}
+                       for _ in range(rng.randint(1, 3))],
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = random.Random(3)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    client = app.test_client()
+    try:
+        with app.app_context():
+            populate()
+
+        # The single-order loop is slow, so it is timed over a tenth of the batch
+        orders = [random_order(rng) for _ in range(max(1, count // 10))]
+        start = time.perf_counter()
+        for order in orders:
+            assert client.post('/api/orders', json=order).status_code == 201
+        single = len(orders) / (time.perf_counter() - start)
+
+        orders = [random_order(rng) for _ in range(count)]
+        start = time.perf_counter()
+        response = client.post('/api/orders/bulk', json=orders)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 201, response.json
+
+        with app.app_context():
+            total = db.session.execute(select(func.count()).select_from(TailoringOrder)).scalar()
+            db.session.remove()
+            db.engine.dispose()
+        print(f"POST /api/orders       {single:9.0f} orders/s")
+        print(f"POST /api/orders/bulk  {count / elapsed:9.0f} orders/s "
+              f"({count} orders in {elapsed * 1000:.0f} ms)")
+        print(f"({total} orders in the database)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
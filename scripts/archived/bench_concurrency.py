@@ -0,0 +1,123 @@
+"""
+Benchmark: mixed read/write throughput of several worker processes sharing
+one SQLite file, with default connection settings versus the tuned pragmas
+from config.py (WAL, synchronous=NORMAL, busy timeout, mmap, cache size).
+
+Usage: python bench_concurrency.py [workers] [seconds] [write_percent]
+       (defaults: 4 workers, 5 seconds, 20% writes)
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from database import apply_sqlite_pragmas, sqlite_pragmas
+from models import db, Customer, InventoryItem, TailoringOrder
+
+ORDERS = 20000
+ITEMS = 500
+
+
+def make_engine(path, tuned):
+    engine = create_engine(f'sqlite:///{path}')
+    if tuned:
+        apply_sqlite_pragmas(engine, sqlite_pragmas(vars(Config)))
+    return engine
+
+
+def populate(path):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    now = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(Customer), [
+            {'name': f'Customer {i}', 'phone': str(i)} for i in range(1, 1001)
+        ])
+        connection.execute(insert(InventoryItem), [
+            {'name': f'Fabric {i}', 'category': 'fabric', 'quantity': 1000.0,
+             'unit': 'meters', 'price_per_unit': 20.0, 'reorder_level': 10.0}
+            for i in range(1, ITEMS + 1)
+        ])
+        connection.execute(insert(TailoringOrder), [
+            {'customer_id': i % 1000 + 1, 'order_date': now, 'status': 'pending',
+             'garment_type': 'shirt', 'total_price': 1500.0}
+            for i in range(ORDERS)
+        ])
+    engine.dispose()
+
+
+def worker(path, tuned, seconds, write_percent, seed, results):
+    rng = random.Random(seed)
+    engine = make_engine(path, tuned)
+    reads = writes = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if rng.randrange(100) < write_percent:
+                with engine.begin() as connection:
+                    connection.execute(
+                        update(InventoryItem)
+                        .where(InventoryItem.id == rng.randint(1, ITEMS))
+                        .values(quantity=InventoryItem.quantity + 1)
+                    )
+                writes += 1
+            else:
+                with engine.connect() as connection:
+                    connection.execute(
+                        select(TailoringOrder.id, Customer.name)
+                        .join(Customer, Customer.id == TailoringOrder.customer_id)
+                        .where(TailoringOrder.status == 'pending')
+                        .order_by(TailoringOrder.order_date.desc())
+                        .limit(50)
+                    ).all()
+                reads += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put((reads, writes, errors))
+
+
+def run(label, tuned, workers, seconds, write_percent):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        populate(path)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker,
+                                    args=(path, tuned, seconds, write_percent, seed, results))
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        totals = [sum(values) for values in zip(*(results.get() for _ in processes))]
+        for process in processes:
+            process.join()
+    finally:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    reads, writes, errors = totals
+    print(f"{label:<8} reads/s {reads / seconds:9.0f}   writes/s {writes / seconds:7.0f}"
+          f"   total/s {(reads + writes) / seconds:9.0f}   lock errors {errors}")
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    write_percent = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    print(f"{workers} workers, {seconds:g} s, {write_percent}% writes")
+    run('default', False, workers, seconds, write_percent)
+    run('tuned', True, workers, seconds, write_percent)
+
+
+if __name__ == '__main__':
+    main()
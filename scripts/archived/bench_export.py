@@ -0,0 +1,94 @@
+"""
+Benchmark: streaming order export throughput and peak Python memory
+(tracemalloc) for growing order histories, as CSV, NDJSON and gzipped CSV.
+
+Usage: python bench_export.py [orders ...]   (default 20000 200000)
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from models import db, Customer, InventoryItem, TailoringOrder, OrderItem
+
+ITEMS = 200
+
+
+def populate(count, batch=20000):
+    db.create_all()
+    db.session.execute(insert(Customer), [{'name': f'Customer {i}', 'phone': str(i)}
+                                          for i in range(1000)])
+    db.session.execute(insert(InventoryItem), [
+        {'name': f'Fabric {i}', 'category': 'fabric', 'quantity': 1000.0, 'unit': 'meters',
+         'price_per_unit': 20.0} for i in range(ITEMS)
+    ])
+    start = datetime(2022, 1, 1)
+    for first in range(0, count, batch):
+        ids = range(first + 1, min(first + batch, count) + 1)
+        db.session.execute(insert(TailoringOrder), [
+            {'id': i, 'customer_id': i % 1000 + 1, 'garment_type': 'shirt', 'chest': 40.0,
+             'waist': 34.0, 'total_price': 2500.0, 'advance_payment': 500.0,
+             'order_date': start + timedelta(minutes=i)} for i in ids
+        ])
+        db.session.execute(insert(OrderItem), [
+            {'order_id': i, 'inventory_item_id': (i + k) % ITEMS + 1, 'quantity_used': 2.5}
+            for i in ids for k in range(2)
+        ])
+    db.session.commit()
+
+
+def consume(client, url, headers):
+    response = client.get(url, headers=headers or {}, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return size
+
+
+def measure(client, url, headers=None):
+    """Seconds and bytes for one streamed export, then its peak traced memory
+
+    tracemalloc slows Python down, so the timing comes from an untraced run.
+    """
+    start = time.perf_counter()
+    size = consume(client, url, headers)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    consume(client, url, headers)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, size, peak
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [20000, 200000]
+    for count in counts:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+        try:
+            with app.app_context():
+                populate(count)
+            client = app.test_client()
+            print(f"{count} orders")
+            for label, url, headers in (
+                ('csv', '/api/export/orders', None),
+                ('ndjson', '/api/export/orders?format=ndjson', None),
+                ('csv, gzip', '/api/export/orders', {'Accept-Encoding': 'gzip'}),
+            ):
+                elapsed, size, peak = measure(client, url, headers)
+                print(f"  {label:<10} {count / elapsed:9.0f} orders/s  "
+                      f"{size / 1e6:7.1f} MB sent  peak {peak / 1e6:5.1f} MB")
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
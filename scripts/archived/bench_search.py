@@ -0,0 +1,82 @@
+"""
+Benchmark: /api/search query latency over the FTS5 customer index.
+
+Usage: python bench_search.py [customers] [rank candidates]   (default 1000000, all)
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models import db, Customer
+from search import SEARCH_INDEXES
+
+FIRST_NAMES = ['Ahmed', 'Ali', 'Bilal', 'Fatima', 'Hassan', 'Ayesha', 'Usman', 'Zainab',
+               'Imran', 'Sana', 'Kamran', 'Hira', 'Farhan', 'Mariam', 'Omar', 'Nadia',
+               'Tariq', 'Amna', 'Saad', 'Rabia', 'Junaid', 'Mehwish', 'Asad', 'Iqra']
+LAST_NAMES = ['Khan', 'Malik', 'Qureshi', 'Sheikh', 'Butt', 'Chaudhry', 'Siddiqui', 'Raza',
+              'Hussain', 'Mirza', 'Abbasi', 'Javed', 'Baig', 'Shah', 'Akhtar', 'Rehman',
+              'Anwar', 'Iqbal', 'Aslam', 'Nawaz', 'Bhatti', 'Gill', 'Dar', 'Lodhi']
+QUERIES = ['ah', 'kha', 'ahmed khan', 'fatima q', 'siddiq', 'zai mir', 'bhatti',
+           '1234567', '92-321-55', '923331234', 'gill@', 'nomatch']
+
+
+def populate(count, seed=7):
+    rng = random.Random(seed)
+    batch = []
+    for i in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        batch.append({
+            'name': f'{first} {last}',
+            'phone': f'+92-3{rng.randint(0, 49):02d}-{rng.randint(0, 9999999):07d}',
+            'email': f'{first.lower()}.{last.lower()}{i}@example.com' if i % 3 else None,
+        })
+        if len(batch) == 50000:
+            db.session.execute(insert(Customer), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Customer), batch)
+    db.session.commit()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    candidates = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    index = SEARCH_INDEXES['customers']
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"Populating {count} customers (indexed by the triggers)...")
+            start = time.perf_counter()
+            populate(count)
+            print(f"  {time.perf_counter() - start:.1f} s")
+
+            print(f"{'query':<14} {'hits':>5} {'p50 ms':>8} {'p95 ms':>8}")
+            for query in QUERIES:
+                statement = index.search(query, candidates=candidates)
+                timings = []
+                for _ in range(50):
+                    start = time.perf_counter()
+                    hits = index.serializer(db.session.execute(statement))
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                print(f"{query:<14} {len(hits):>5} {statistics.median(timings):8.2f} "
+                      f"{timings[int(len(timings) * 0.95)]:8.2f}")
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
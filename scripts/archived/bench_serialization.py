@@ -0,0 +1,99 @@
+"""
+Benchmark: ORM to_dict() + jsonify versus the column-tuple serializers
+used by the list endpoints.
+
+Usage: python bench_serialization.py [orders]   (default 100000)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db, Customer, InventoryItem, TailoringOrder, OrderItem
+import serializers
+
+
+def populate(order_count, items_per_order=2, seed=42):
+    """Insert customers, inventory and orders with bulk Core inserts"""
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1)
+    db.session.execute(insert(Customer), [
+        {'name': f'Customer {i}', 'phone': f'+92-300-{i:07d}', 'created_at': now}
+        for i in range(1, order_count // 10 + 2)
+    ])
+    db.session.execute(insert(InventoryItem), [
+        {'name': f'Fabric {i}', 'category': 'fabric', 'quantity': 1000.0, 'unit': 'meters',
+         'price_per_unit': 20.0, 'reorder_level': 10.0, 'created_at': now, 'updated_at': now}
+        for i in range(1, 201)
+    ])
+    orders = []
+    for i in range(1, order_count + 1):
+        orders.append({
+            'id': i, 'customer_id': rng.randint(1, order_count // 10 + 1),
+            'order_date': now + timedelta(minutes=i), 'status': 'pending', 'garment_type': 'shirt',
+            'chest': rng.uniform(34, 48), 'waist': rng.uniform(28, 42), 'total_price': 1500.0,
+            'advance_payment': 500.0, 'created_at': now, 'updated_at': now
+        })
+    db.session.execute(insert(TailoringOrder), orders)
+    db.session.execute(insert(OrderItem), [
+        {'order_id': i, 'inventory_item_id': rng.randint(1, 200), 'quantity_used': 2.5}
+        for i in range(1, order_count + 1) for _ in range(items_per_order)
+    ])
+    db.session.commit()
+
+
+def orm_path(app):
+    orders = TailoringOrder.query.options(
+        joinedload(TailoringOrder.customer),
+        selectinload(TailoringOrder.order_items).joinedload(OrderItem.inventory_item)
+    ).all()
+    body = app.json.dumps([order.to_dict() for order in orders], separators=(',', ':'))
+    db.session.expunge_all()
+    return body
+
+
+def fast_path():
+    rows = db.session.execute(serializers.ORDERS.select())
+    return serializers.dumps(serializers.ORDERS(rows))
+
+
+def timed(label, func, repeat=2):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<28} {best:8.3f} s  ({len(result) / 1e6:.1f} MB)")
+    return best
+
+
+def main():
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"Populating {order_count} orders...")
+            populate(order_count)
+            orm = timed('ORM + to_dict + jsonify', lambda: orm_path(app))
+            fast = timed('column tuples + json', fast_path)
+            print(f"Speedup: {orm / fast:.1f}x")
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: sizing suggestions over the in-memory measurement matrix.
+
+Reports the full load, an incremental refresh after a few order updates and
+the latency of nearest-order queries.
+
+Usage: python bench_sizing.py [orders]   (default 500000)
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import insert, update
+
+from cache import response_cache
+from models import db, Customer, TailoringOrder
+from serializers import MEASUREMENT_FIELDS
+from sizing import measurement_index, similar_orders
+
+GARMENTS = ['shirt', 'pant', 'suit', 'kurta', 'waistcoat']
+MEANS = {'chest': 40, 'waist': 34, 'shoulder': 18, 'sleeve_length': 24,
+         'shirt_length': 30, 'neck': 15.5, 'hip': 40, 'inseam': 31}
+
+
+def random_profile(rng):
+    """A profile with roughly one in five measurements not taken"""
+    return {key: round(rng.gauss(mean, mean * 0.08), 1) if rng.random() > 0.2 else None
+            for key, mean in MEANS.items()}
+
+
+def populate(count, seed=11):
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1)
+    db.session.execute(insert(Customer), [{'name': 'Customer', 'phone': '0'}])
+    for start in range(0, count, 50000):
+        db.session.execute(insert(TailoringOrder), [
+            {'customer_id': 1, 'garment_type': rng.choice(GARMENTS), 'total_price': 1000.0,
+             'order_date': now, 'updated_at': now + timedelta(seconds=i), **random_profile(rng)}
+            for i in range(start, min(start + 50000, count))
+        ])
+    db.session.commit()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    rng = random.Random(5)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['RESOURCE_VERSION_DIR'] = tempfile.mkdtemp()
+    db.init_app(app)
+    response_cache.init_app(app)
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"Populating {count} orders...")
+            populate(count)
+
+            print(f"full load            {timed(measurement_index.refresh):9.1f} ms")
+            db.session.execute(
+                update(TailoringOrder).where(TailoringOrder.id.in_(range(1, count, count // 10)))
+                .values(chest=TailoringOrder.chest + 1, updated_at=datetime.utcnow())
+            )
+            db.session.commit()
+            response_cache.bump(['orders'])
+            print(f"incremental refresh  {timed(measurement_index.refresh):9.1f} ms")
+
+            for label, query in (
+                ('matrix only', lambda p: measurement_index.nearest(p, 'shirt', 5)),
+                ('with order rows', lambda p: similar_orders('shirt', p, 5)),
+            ):
+                timings = []
+                for _ in range(100):
+                    profile = np.array([np.nan if value is None else value
+                                        for value in random_profile(rng).values()])
+                    timings.append(timed(lambda: query(profile)))
+                timings.sort()
+                print(f"query, {label:<14} p50 {statistics.median(timings):6.2f} ms   "
+                      f"p95 {timings[94]:6.2f} ms")
+
+            batch = np.array([[np.nan if v is None else v for v in random_profile(rng).values()]
+                              for _ in range(32)])
+            elapsed = timed(lambda: measurement_index.nearest(batch, 'shirt', 5))
+            print(f"batch of 32 profiles {elapsed:9.1f} ms")
+            print(f"(about {count // len(GARMENTS)} orders per garment type, "
+                  f"{len(MEASUREMENT_FIELDS)} measurements each)")
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: worker startup, from a fresh interpreter (import, create_app(),
+first response) and from a forked copy of a master that has already built
+the app (fork to first response, as with gunicorn --preload).
+
+Usage: python bench_startup.py [runs]   (default 5)
+"""
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+URL = '/api/stats'
+
+
+def cold_worker(database_uri):
+    """Run in a fresh interpreter: time each startup phase in milliseconds"""
+    start = time.perf_counter()
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri})
+    created = time.perf_counter()
+    assert app.test_client().get(URL).status_code == 200
+    responded = time.perf_counter()
+    print((imported - start) * 1000, (created - imported) * 1000, (responded - created) * 1000)
+
+
+def forked_worker(app):
+    """Fork from a built app; return the child's milliseconds to first response"""
+    read, write = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read)
+            assert app.test_client().get(URL).status_code == 200
+            os.write(write, str((time.perf_counter() - start) * 1000).encode())
+        finally:
+            os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as pipe:
+        elapsed = float(pipe.read())
+    os.waitpid(pid, 0)
+    return elapsed
+
+
+def main():
+    logging.getLogger('hamees.requests').setLevel(logging.WARNING)
+    if sys.argv[1:2] == ['--cold-worker']:
+        cold_worker(sys.argv[2])
+        return
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    database_uri = f'sqlite:///{path}'
+    try:
+        from app import create_app
+        from models import db
+        app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri})
+        with app.app_context():
+            db.create_all()
+            db.session.remove()
+            # The master keeps no connections, as a preloading master should not
+            db.engine.dispose()
+
+        phases = [[float(value) for value in subprocess.run(
+            [sys.executable, __file__, '--cold-worker', database_uri],
+            capture_output=True, text=True, check=True).stdout.split()] for _ in range(runs)]
+        imported, created, responded = (statistics.median(values) for values in zip(*phases))
+        print(f"fresh interpreter (median of {runs})")
+        print(f"  import app        {imported:7.1f} ms")
+        print(f"  create_app()      {created:7.1f} ms")
+        print(f"  first response    {responded:7.1f} ms")
+        print(f"  total             {imported + created + responded:7.1f} ms")
+        forked = statistics.median(forked_worker(app) for _ in range(runs))
+        print(f"forked from a built app: first response {forked:7.1f} ms")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
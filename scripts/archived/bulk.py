@@ -0,0 +1,193 @@
+"""
+Hamees Attire Inventory Management System
+Bulk Order Creation
+
+``POST /api/orders/bulk`` takes a JSON array of orders in the same shape as
+``POST /api/orders``. Every order is validated before anything is written
+(including that its customer and inventory items exist, with one IN query per
+batch of ids), so a spreadsheet with a bad row is rejected as a whole with
+the errors of every bad row.
+
+Valid orders are inserted CHUNK_SIZE at a time, one transaction per chunk: the
+chunk's order ids are reserved up front, then one executemany INSERT writes
+the orders and one their items, instead of a flush and a round trip per
+order. These are Core statements, so the stat counters and response cache
+are updated here rather than by the session hooks.
+"""
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import mark_changed
+from database import reserve_ids
+from models import db, Customer, InventoryItem, TailoringOrder, OrderItem
+from serializers import IN_CLAUSE_BATCH, MEASUREMENT_FIELDS
+from reports import adjust_financial_rollups
+from stats import adjust_stat_counters
+
+CHUNK_SIZE = 500
+MAX_ORDERS = 10000
+
+
+class BulkOrderError(ValueError):
+    """Raised when the request body is not a list of orders"""
+
+
+def _number(data, key, errors, required=False, default=None, positive=False):
+    value = data.get(key)
+    if value is None:
+        if required:
+            errors[key] = 'is required'
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        errors[key] = 'must be a number'
+        return None
+    if value < 0 or (positive and value == 0):
+        errors[key] = 'must be positive' if positive else 'must not be negative'
+        return None
+    return float(value)
+
+
+def _delivery_date(value, errors):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        errors['delivery_date'] = 'must be an ISO 8601 date'
+        return None
+
+
+def validate_order(data):
+    """Column values, item rows and field errors for one order"""
+    if not isinstance(data, dict):
+        return None, [], {'order': 'must be an object'}
+    errors = {}
+
+    customer_id = data.get('customer_id')
+    if isinstance(customer_id, bool) or not isinstance(customer_id, int):
+        errors['customer_id'] = 'must be an integer'
+    garment_type = data.get('garment_type')
+    if not isinstance(garment_type, str) or not garment_type.strip():
+        errors['garment_type'] = 'is required'
+    special_instructions = data.get('special_instructions')
+    if special_instructions is not None and not isinstance(special_instructions, str):
+        errors['special_instructions'] = 'must be a string'
+
+    order = {
+        'customer_id': customer_id,
+        'garment_type': garment_type,
+        'delivery_date': _delivery_date(data.get('delivery_date'), errors),
+        'special_instructions': special_instructions,
+        'total_price': _number(data, 'total_price', errors, required=True),
+        'advance_payment': _number(data, 'advance_payment', errors, default=0.0),
+        **{key: _number(data, key, errors, positive=True) for key in MEASUREMENT_FIELDS},
+    }
+
+    items = []
+    items_used = data.get('items_used', [])
+    if not isinstance(items_used, list):
+        errors['items_used'] = 'must be a list'
+        items_used = []
+    for i, item in enumerate(items_used):
+        item_errors = {}
+        if not isinstance(item, dict):
+            errors[f'items_used[{i}]'] = 'must be an object'
+            continue
+        item_id = item.get('inventory_item_id')
+        if isinstance(item_id, bool) or not isinstance(item_id, int):
+            item_errors['inventory_item_id'] = 'must be an integer'
+        quantity = _number(item, 'quantity_used', item_errors, required=True, positive=True)
+        for key, message in item_errors.items():
+            errors[f'items_used[{i}].{key}'] = message
+        items.append({'inventory_item_id': item_id, 'quantity_used': quantity})
+
+    if order['total_price'] is not None and order['advance_payment'] is not None \
+            and order['advance_payment'] > order['total_price']:
+        errors['advance_payment'] = 'must not exceed total_price'
+    return order, items, errors
+
+
+def existing_ids(column, ids):
+    """The subset of ids present in a primary key column"""
+    ids = sorted(set(ids))
+    found = set()
+    for start in range(0, len(ids), IN_CLAUSE_BATCH):
+        found.update(db.session.execute(
+            select(column).where(column.in_(ids[start:start + IN_CLAUSE_BATCH]))
+        ).scalars())
+    return found
+
+
+def validate_orders(payload):
+    """Validate every order; returns (orders, invalid) where invalid lists row errors"""
+    if not isinstance(payload, list) or not payload:
+        raise BulkOrderError('Request body must be a non-empty JSON array of orders')
+    if len(payload) > MAX_ORDERS:
+        raise BulkOrderError(f'At most {MAX_ORDERS} orders per request')
+
+    orders = [validate_order(data) for data in payload]
+    customers = existing_ids(Customer.id, [
+        order['customer_id'] for order, _, errors in orders
+        if order is not None and 'customer_id' not in errors
+    ])
+    inventory = existing_ids(InventoryItem.id, [
+        item['inventory_item_id'] for _, items, _ in orders for item in items
+        if isinstance(item['inventory_item_id'], int)
+    ])
+
+    invalid = []
+    for index, (order, items, errors) in enumerate(orders):
+        if order is not None and 'customer_id' not in errors \
+                and order['customer_id'] not in customers:
+            errors['customer_id'] = 'customer not found'
+        for i, item in enumerate(items):
+            if isinstance(item['inventory_item_id'], int) \
+                    and item['inventory_item_id'] not in inventory:
+                errors[f'items_used[{i}].inventory_item_id'] = 'inventory item not found'
+        if errors:
+            invalid.append({'index': index, 'errors': errors})
+    return [(order, items) for order, items, _ in orders], invalid
+
+
+def insert_orders(orders):
+    """Insert validated (order, items) pairs, one transaction per chunk
+
+    Returns one result per order: ``{'index', 'id'}`` once created, or
+    ``{'index', 'error'}`` for the orders of a chunk that failed and of the
+    chunks after it, which are not attempted.
+    """
+    results = []
+    status = TailoringOrder.status.default.arg
+    for start in range(0, len(orders), CHUNK_SIZE):
+        chunk = orders[start:start + CHUNK_SIZE]
+        now = datetime.utcnow()
+        try:
+            connection = db.session.connection()
+            order_ids = reserve_ids(connection, TailoringOrder.id, len(chunk))
+            connection.execute(insert(TailoringOrder), [
+                {**order, 'id': order_id, 'status': status, 'order_date': now,
+                 'created_at': now, 'updated_at': now}
+                for order_id, (order, _) in zip(order_ids, chunk)
+            ])
+            items = [
+                {**item, 'order_id': order_id}
+                for order_id, (_, order_items) in zip(order_ids, chunk) for item in order_items
+            ]
+            if items:
+                connection.execute(insert(OrderItem), items)
+            adjust_stat_counters(connection, {f'orders:{status}': len(chunk)})
+            adjust_financial_rollups(connection, [
+                (1, now, status, order['garment_type'], order['total_price'],
+                 order['advance_payment']) for order, _ in chunk])
+            mark_changed(db.session, 'orders')
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            message = f'not created: {e.__class__.__name__}'
+            results.extend({'index': index, 'error': message}
+                           for index in range(start, len(orders)))
+            return results
+        results.extend({'index': start + i, 'id': order_id} for i, order_id in enumerate(order_ids))
+    return results
@@ -0,0 +1,163 @@
+"""
+Hamees Attire Inventory Management System
+Conditional GET and Response Cache
+
+Every resource (customers, inventory, orders) has a version number. Commits
+that touch a resource bump its version, and GET handlers decorated with
+``response_cache.cached(...)`` derive their ETag from the request path and the
+versions they read. An unchanged poll is answered with 304 Not Modified, or
+from an in-process LRU of response bodies, without querying the database.
+
+Versions have to be shared by all worker processes, so each one is a file in
+the instance folder. A bump appends one byte (an atomic O_APPEND write) and a
+read is a single ``os.stat()``; the file size is the version number.
+
+Responses read from a read replica (see routing.py) are neither stored nor
+given an ETag, as the replica may not have caught up with the versions yet.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, has_app_context, request
+from sqlalchemy import event
+
+from models import db, Customer, InventoryItem, TailoringOrder, OrderItem, StockMovement
+from routing import reading_from_replica
+
+CHANGED_KEY = 'changed_resources'
+
+# Resources whose responses embed data from each model
+MODEL_RESOURCES = {
+    Customer: ('customers', 'orders'),         # orders show customer_name
+    InventoryItem: ('inventory', 'orders'),    # order items show name and unit
+    StockMovement: ('inventory',),
+    TailoringOrder: ('orders',),
+    OrderItem: ('orders',),
+}
+
+CachedResponse = namedtuple('CachedResponse', 'versions body mimetype')
+
+
+class ResponseCache:
+    """ETags from shared resource versions plus an LRU of response bodies"""
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_SIZE', 256)
+        app.config.setdefault('RESOURCE_VERSION_DIR', os.path.join(app.instance_path, 'versions'))
+        os.makedirs(app.config['RESOURCE_VERSION_DIR'], exist_ok=True)
+        app.extensions['response_cache'] = self
+
+    @property
+    def version_dir(self):
+        return current_app.config['RESOURCE_VERSION_DIR']
+
+    def versions(self, resources):
+        """Current version of each resource"""
+        result = []
+        for resource in resources:
+            try:
+                stat = os.stat(os.path.join(self.version_dir, resource))
+                result.append((stat.st_ino, stat.st_size))
+            except FileNotFoundError:
+                result.append((0, 0))
+        return tuple(result)
+
+    def bump(self, resources):
+        """Invalidate every cached response and ETag that reads resources"""
+        for resource in resources:
+            with open(os.path.join(self.version_dir, resource), 'ab') as f:
+                f.write(b'.')
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.versions != versions:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > current_app.config['RESPONSE_CACHE_SIZE']:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def cached(self, *resources):
+        """Serve GET requests with ETags and from the cache while resources are unchanged"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = (self.version_dir, request.full_path)
+                versions = self.versions(resources)
+                etag = hashlib.sha1(repr((key, versions)).encode()).hexdigest()
+                if etag in request.if_none_match:
+                    response = current_app.response_class(status=304)
+                else:
+                    entry = self.get(key, versions)
+                    if entry is not None:
+                        response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+                    else:
+                        response = current_app.make_response(view(*args, **kwargs))
+                        if response.status_code != 200:
+                            return response
+                        if reading_from_replica():
+                            # The replica may not have reached these versions yet
+                            return response
+                        if not response.is_streamed:
+                            self.put(key, CachedResponse(versions, response.get_data(),
+                                                         response.mimetype))
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            return wrapper
+        return decorator
+
+
+response_cache = ResponseCache()
+
+
+def mark_changed(session, *resources):
+    """Record resources changed outside the ORM (e.g. Core UPDATEs)"""
+    session.info.setdefault(CHANGED_KEY, set()).update(resources)
+
+
+@event.listens_for(db.session, 'before_flush')
+def track_changed_resources(session, flush_context, instances):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        mark_changed(session, *MODEL_RESOURCES.get(type(obj), ()))
+
+
+@event.listens_for(db.session, 'after_commit')
+def bump_changed_resources(session):
+    # Bump only after the commit, so no reader can cache the old data under
+    # the new versions
+    changed = session.info.pop(CHANGED_KEY, None)
+    cache = current_app.extensions.get('response_cache') if has_app_context() else None
+    if changed and cache is not None:
+        cache.bump(sorted(changed))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_changed_resources(session):
+    session.info.pop(CHANGED_KEY, None)
@@ -0,0 +1,109 @@
+"""
+Hamees Attire Inventory Management System
+Configuration
+
+Every setting can be overridden with an environment variable of the same
+name, except the database URI, which is read from DATABASE_URL.
+"""
+import os
+
+
+def env_bool(name, default=False):
+    return os.environ.get(name, str(default)).lower() == 'true'
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def is_memory_sqlite(uri):
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+
+def engine_options(uri):
+    """SQLAlchemy create_engine() options for the database URI"""
+    if is_memory_sqlite(uri):
+        # Flask-SQLAlchemy uses a single static connection for in-memory SQLite
+        return {}
+    options = {
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+    }
+    if not uri.startswith('sqlite'):
+        options['pool_pre_ping'] = True
+    return options
+
+
+def database_binds(replica_uri):
+    """SQLALCHEMY_BINDS for the read replica, if one is configured"""
+    if not replica_uri:
+        return {}
+    return {'replica': {'url': replica_uri, **engine_options(replica_uri)}}
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///hamees_inventory.db')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # GET requests read from this database when set (see routing.py): for up
+    # to REPLICA_STICKY_SECONDS after a client writes, and whenever the
+    # replica's heartbeat is more than REPLICA_MAX_LAG_SECONDS behind the
+    # primary's (checked at most every REPLICA_LAG_CHECK_SECONDS), they read
+    # from the primary instead
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = database_binds(DATABASE_REPLICA_URL)
+    REPLICA_STICKY_SECONDS = env_float('REPLICA_STICKY_SECONDS', 5.0)
+    REPLICA_MAX_LAG_SECONDS = env_float('REPLICA_MAX_LAG_SECONDS', 10.0)
+    REPLICA_LAG_CHECK_SECONDS = env_float('REPLICA_LAG_CHECK_SECONDS', 1.0)
+
+    # Applied to every new SQLite connection (see database.py). WAL lets
+    # readers and a writer work at the same time; NORMAL sync is safe in WAL.
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    SQLITE_MMAP_SIZE = env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    SQLITE_CACHE_SIZE_KB = env_int('SQLITE_CACHE_SIZE_KB', 64 * 1024)
+
+    # Serve /api/stats from the maintained stat_counters table instead of aggregating
+    STATS_USE_COUNTERS = env_bool('STATS_USE_COUNTERS')
+
+    # Reorder suggestions (see forecasting.py): days a supplier takes to deliver,
+    # days of demand one order should cover, and standard deviations of daily
+    # demand kept as safety stock (1.65 covers about 95% of lead times)
+    FORECAST_LEAD_TIME_DAYS = env_int('FORECAST_LEAD_TIME_DAYS', 7)
+    FORECAST_COVER_DAYS = env_int('FORECAST_COVER_DAYS', 30)
+    FORECAST_SAFETY_FACTOR = env_float('FORECAST_SAFETY_FACTOR', 1.65)
+
+    # Rank only the newest N matches of a search (see search.py); 0 ranks them all
+    SEARCH_RANK_CANDIDATES = env_int('SEARCH_RANK_CANDIDATES', 0)
+
+    # Rows committed per transaction by inventory imports (see importer.py)
+    IMPORT_CHUNK_SIZE = env_int('IMPORT_CHUNK_SIZE', 1000)
+
+    # Server-Timing headers and a JSON log line per request (see profiling.py);
+    # PROFILE_SLOW_QUERIES=N adds the N slowest statements and their query plans
+    REQUEST_PROFILING = env_bool('REQUEST_PROFILING', True)
+    PROFILE_SLOW_QUERIES = env_int('PROFILE_SLOW_QUERIES', 0)
+
+    # Background jobs (see jobs.py): worker processes of flask run-jobs, tries
+    # per job, first retry delay (doubling after each failure), how often idle
+    # workers poll, and when a running job counts as abandoned
+    JOB_WORKERS = env_int('JOB_WORKERS', 2)
+    JOB_MAX_ATTEMPTS = env_int('JOB_MAX_ATTEMPTS', 5)
+    JOB_RETRY_SECONDS = env_float('JOB_RETRY_SECONDS', 30.0)
+    JOB_POLL_SECONDS = env_float('JOB_POLL_SECONDS', 1.0)
+    JOB_TIMEOUT_SECONDS = env_float('JOB_TIMEOUT_SECONDS', 600.0)
+    # Low-stock alerts are POSTed here as JSON (logged if unset)
+    LOW_STOCK_WEBHOOK_URL = os.environ.get('LOW_STOCK_WEBHOOK_URL')
+
+    # How often each worker writes its metrics for /metrics (see metrics.py)
+    METRICS_FLUSH_SECONDS = env_float('METRICS_FLUSH_SECONDS', 5.0)
@@ -0,0 +1,85 @@
+"""
+Hamees Attire Inventory Management System
+Database Engine Setup
+"""
+import os
+import weakref
+
+from sqlalchemy import event, false, func, select, update
+
+from config import is_memory_sqlite
+from models import db
+from routing import REPLICA_BIND
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements for each new SQLite connection, from app config"""
+    return [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT_MS'])),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+        # A negative cache_size is a size in KiB rather than in pages
+        ('cache_size', -int(config['SQLITE_CACHE_SIZE_KB'])),
+        # Off by default in SQLite; the ON DELETE actions in models.py need it
+        ('foreign_keys', 'ON'),
+    ]
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run the pragmas on every connection the engine opens (SQLite only)"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+# Engines whose pools are emptied in forked children; one fork hook serves
+# them all, and engines of apps that are gone drop out by themselves
+_fork_engines = weakref.WeakSet()
+
+
+def _reset_pools_after_fork():
+    for engine in list(_fork_engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def reset_after_fork(engine):
+    """Give forked children an empty pool instead of the parent's connections
+
+    ``dispose(close=False)`` drops the pool without closing the connections,
+    which still belong to the parent. In-memory SQLite is left alone, as its
+    single connection is the database.
+    """
+    if not is_memory_sqlite(str(engine.url)):
+        _fork_engines.add(engine)
+
+
+def reserve_ids(connection, column, count):
+    """The next count ids of an integer primary key, for an INSERT that sets them
+
+    A no-op UPDATE takes SQLite's write lock first, so no other writer can
+    insert rows, and take these ids, before the caller's transaction ends.
+    """
+    connection.execute(update(column.table).where(false()).values({column.name: column}))
+    first = connection.execute(select(func.coalesce(func.max(column), 0))).scalar() + 1
+    return range(first, first + count)
+
+
+def init_engines(app):
+    """Tune the engines Flask-SQLAlchemy created for the app"""
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        for key, engine in db.engines.items():
+            # A write routed to the replica by mistake fails instead of diverging
+            apply_sqlite_pragmas(engine, pragmas + [('query_only', 'ON')]
+                                 if key == REPLICA_BIND else pragmas)
+            reset_after_fork(engine)
@@ -0,0 +1,141 @@
+"""
+Hamees Attire Inventory Management System
+Data Export
+
+``/api/export/orders`` and ``/api/export/inventory`` stream every row as CSV
+or NDJSON for accounting. Rows are fetched EXPORT_BATCH_SIZE at a time with
+``yield_per`` and converted by the serializers in serializers.py (order items
+are loaded per batch), then written to the response batch by batch, so
+memory use does not grow with the number of rows. When the client accepts
+gzip, each batch is compressed as it is sent.
+
+Orders are filtered on order_date and inventory items on updated_at with
+``?from=`` (inclusive) and ``?to=`` (inclusive) ISO dates.
+"""
+import csv
+import io
+import zlib
+from datetime import date, timedelta
+
+from flask import Response, stream_with_context
+
+from models import db, InventoryItem, TailoringOrder
+from serializers import INVENTORY_ITEMS, ORDERS, dumps
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+class ExportError(ValueError):
+    """Raised when export parameters are invalid"""
+
+
+def _order_csv_row(order):
+    """Flatten an ORDERS dictionary: measurements as columns, items as one text column"""
+    row = {key: value for key, value in order.items() if key not in ('measurements', 'items_used')}
+    row.update(order['measurements'])
+    row['items_used'] = '; '.join(
+        f"{item['inventory_item_name']} x {item['quantity_used']:g} {item['unit']}"
+        for item in order['items_used']
+    )
+    return row
+
+
+class Export:
+    """A serializer, the column its date range filters on and its CSV layout"""
+
+    def __init__(self, name, serializer, date_column, order_by, csv_columns, csv_row=None):
+        self.name = name
+        self.serializer = serializer
+        self.date_column = date_column
+        self.order_by = order_by
+        self.csv_columns = csv_columns
+        self.csv_row = csv_row
+
+    def statement(self, start=None, end=None):
+        statement = self.serializer.select()
+        if start is not None:
+            statement = statement.where(self.date_column >= start)
+        if end is not None:
+            statement = statement.where(self.date_column < end + timedelta(days=1))
+        return statement.order_by(*self.order_by)
+
+    def batches(self, start=None, end=None):
+        """Serialized rows, one list per batch fetched from the database"""
+        result = db.session.execute(
+            self.statement(start, end).execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for rows in result.partitions():
+            yield self.serializer(rows)
+
+
+EXPORTS = {
+    'orders': Export(
+        'orders', ORDERS, TailoringOrder.order_date,
+        # Served by ix_tailoring_orders_order_date, whose last key is the id
+        (TailoringOrder.order_date, TailoringOrder.id),
+        (*ORDERS.keys, 'balance_due', 'items_used'),
+        _order_csv_row,
+    ),
+    'inventory': Export(
+        'inventory', INVENTORY_ITEMS, InventoryItem.updated_at, (InventoryItem.id,),
+        INVENTORY_ITEMS.keys,
+    ),
+}
+
+
+def parse_date(args, key):
+    value = args.get(key)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{key} must be a date (YYYY-MM-DD)')
+
+
+def encode_csv(export, batches):
+    """CSV bytes, the header row first and then one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=export.csv_columns)
+    writer.writeheader()
+    for rows in batches:
+        writer.writerows(map(export.csv_row, rows) if export.csv_row else rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def encode_ndjson(batches):
+    for rows in batches:
+        yield b''.join(dumps(row) + b'\n' for row in rows)
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of byte chunks into one gzip member as they arrive"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(export, args, gzip=False):
+    """Streaming response for an export with ?format=, ?from= and ?to="""
+    file_format = args.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    start, end = parse_date(args, 'from'), parse_date(args, 'to')
+    if start and end and start > end:
+        raise ExportError('from must not be after to')
+
+    batches = export.batches(start, end)
+    chunks = encode_csv(export, batches) if file_format == 'csv' else encode_ndjson(batches)
+    headers = {'Content-Disposition': f'attachment; filename={export.name}.{file_format}'}
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    headers['Vary'] = 'Accept-Encoding'
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[file_format],
+                    headers=headers)
@@ -0,0 +1,158 @@
+"""
+Hamees Attire Inventory Management System
+Demand Forecasting and Reorder Suggestions
+
+Daily consumption of every inventory item over the last HISTORY_DAYS days is
+read with one grouped query (quantity_used of completed orders, by item and
+completion day) into an items x days NumPy matrix. Forecasts for all items are
+then computed at once:
+
+* a simple moving average of the last MOVING_AVERAGE_DAYS days, and
+* simple exponential smoothing, whose final level is a weighted sum of the
+  history, i.e. one matrix-vector product.
+
+The smoothed rate drives the suggestions: the reorder level covers demand
+over the supplier lead time plus safety stock, and an item at or below it
+should be ordered up to the reorder level plus COVER_DAYS of demand.
+
+Results are stored in ``demand_forecasts`` and reused until an order is
+completed (or one is deleted) or the day changes. ``flask forecast-demand``
+recomputes them, e.g. from a nightly cron job.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import Integer, cast, delete, func, insert, select
+
+from models import db, InventoryItem, TailoringOrder, OrderItem, DemandForecast
+
+HISTORY_DAYS = 90
+MOVING_AVERAGE_DAYS = 28
+SMOOTHING = 0.2
+
+
+def completion_state():
+    """(completed orders, latest completion): changes when completions arrive"""
+    return tuple(db.session.execute(
+        select(func.count(TailoringOrder.completed_at), func.max(TailoringOrder.completed_at))
+    ).one())
+
+
+def consumption_matrix(as_of, days=HISTORY_DAYS):
+    """Item ids and their daily consumption for the days before as_of"""
+    start = as_of - timedelta(days=days)
+    item_ids = np.array(db.session.execute(
+        select(InventoryItem.id).order_by(InventoryItem.id)).scalars().all(), dtype=np.int64)
+    matrix = np.zeros((len(item_ids), days))
+
+    # Day number within the window, computed by SQLite rather than per row in Python
+    offset = cast(func.julianday(TailoringOrder.completed_at) - func.julianday(start.isoformat()),
+                  Integer)
+    rows = db.session.connection().execute(
+        select(OrderItem.inventory_item_id, offset, func.sum(OrderItem.quantity_used))
+        .join(TailoringOrder, TailoringOrder.id == OrderItem.order_id)
+        .where(TailoringOrder.completed_at >= datetime.combine(start, datetime.min.time()),
+               TailoringOrder.completed_at < datetime.combine(as_of, datetime.min.time()))
+        .group_by(OrderItem.inventory_item_id, offset)
+    ).all()
+    if rows:
+        items, offsets, quantities = (np.array(column) for column in zip(*rows))
+        positions = np.searchsorted(item_ids, items)
+        # Items deleted since their orders were completed fall out here
+        known = positions < len(item_ids)
+        known[known] = item_ids[positions[known]] == items[known]
+        matrix[positions[known], offsets[known]] = quantities[known]
+    return item_ids, matrix
+
+
+def smoothing_weights(days, alpha=SMOOTHING):
+    """Weights w with level = history @ w for exponential smoothing started at day 0"""
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=float)
+    weights[0] = (1 - alpha) ** (days - 1)
+    return weights
+
+
+def forecast(matrix, lead_time_days, safety_factor):
+    """Per-item moving average, smoothed rate, daily std and reorder level"""
+    recent = matrix[:, -MOVING_AVERAGE_DAYS:]
+    moving_average = recent.mean(axis=1)
+    smoothed = matrix @ smoothing_weights(matrix.shape[1])
+    daily_std = recent.std(axis=1, ddof=1)
+    reorder_level = (smoothed * lead_time_days
+                     + safety_factor * daily_std * np.sqrt(lead_time_days))
+    return moving_average, smoothed, daily_std, reorder_level
+
+
+def rebuild_forecasts(as_of=None):
+    """Recompute and store the forecasts of every item; returns how many"""
+    config = current_app.config
+    as_of = as_of or datetime.utcnow().date()
+    completions, completed_through = completion_state()
+    item_ids, matrix = consumption_matrix(as_of)
+    columns = forecast(matrix, config['FORECAST_LEAD_TIME_DAYS'],
+                       config['FORECAST_SAFETY_FACTOR'])
+
+    db.session.execute(delete(DemandForecast))
+    if len(item_ids):
+        now = datetime.utcnow()
+        db.session.execute(insert(DemandForecast), [
+            {'inventory_item_id': int(item_id), 'as_of': as_of, 'completions': completions,
+             'completed_through': completed_through, 'moving_average': float(ma),
+             'smoothed': float(ses), 'daily_std': float(std), 'reorder_level': float(level),
+             'computed_at': now}
+            for item_id, ma, ses, std, level in zip(item_ids, *columns)
+        ])
+    db.session.commit()
+    return len(item_ids)
+
+
+def forecasts_are_current(as_of):
+    stored = db.session.execute(
+        select(DemandForecast.as_of, DemandForecast.completions, DemandForecast.completed_through)
+        .limit(1)
+    ).first()
+    return stored is not None and (stored.as_of, *stored[1:]) == (as_of, *completion_state())
+
+
+def reorder_suggestions():
+    """Stored forecasts (rebuilt if stale) with order quantities for current stock"""
+    config = current_app.config
+    as_of = datetime.utcnow().date()
+    if not forecasts_are_current(as_of):
+        rebuild_forecasts(as_of)
+
+    cover_days = config['FORECAST_COVER_DAYS']
+    rows = db.session.execute(
+        select(InventoryItem.id, InventoryItem.name, InventoryItem.unit, InventoryItem.quantity,
+               InventoryItem.reorder_level, DemandForecast.moving_average,
+               DemandForecast.smoothed, DemandForecast.daily_std, DemandForecast.reorder_level)
+        .outerjoin(DemandForecast, DemandForecast.inventory_item_id == InventoryItem.id)
+        .order_by(InventoryItem.id)
+    )
+    items = []
+    for item_id, name, unit, quantity, current_level, ma, ses, std, level in rows:
+        # Items created since the forecasts were computed have no history yet
+        ma, ses, std, level = ma or 0.0, ses or 0.0, std or 0.0, level or 0.0
+        reorder_now = quantity <= level and ses > 0
+        order_up_to = level + ses * cover_days
+        items.append({
+            'inventory_item_id': item_id,
+            'name': name,
+            'unit': unit,
+            'quantity': quantity,
+            'reorder_level': current_level,
+            'daily_demand': {'moving_average': round(ma, 4), 'smoothed': round(ses, 4),
+                             'std': round(std, 4)},
+            'days_of_stock': round(quantity / ses, 1) if ses > 0 else None,
+            'suggested_reorder_level': round(level, 2),
+            'suggested_order_quantity': round(order_up_to - quantity, 2) if reorder_now else 0,
+            'reorder_now': reorder_now,
+        })
+    return {
+        'as_of': as_of.isoformat(),
+        'history_days': HISTORY_DAYS,
+        'lead_time_days': config['FORECAST_LEAD_TIME_DAYS'],
+        'cover_days': cover_days,
+        'items': items,
+    }
@@ -0,0 +1,347 @@
+"""
+Hamees Attire Inventory Management System
+Synthetic Data Generator
+
+Builds a realistic dataset at any scale, e.g. a million customers, five
+million orders and twenty million order items, to reproduce production
+behaviour locally. Unlike sample_data.py, rows are generated with NumPy in
+batches of BATCH_SIZE and written with executemany Core inserts.
+
+Every table draws from its own random stream derived from the seed, so the
+same seed, scale and end date always produce the same rows. The shape of the
+data follows the shop:
+
+* a few customers order often, and each customer has a body profile that
+  their orders' measurements are taken from, with a little noise;
+* each garment type has its own measurements, price range and fabric use,
+  and every order uses one fabric plus accessories;
+* orders are spread over HISTORY_DAYS up to the end date. Older orders are
+  completed or delivered, and recent ones are mostly pending or in progress.
+
+Afterwards the stat counters, the stock ledger's opening balances and the
+query planner statistics are rebuilt. The FTS triggers index rows as they are
+inserted.
+
+Usage: python generate_data.py [--customers N] [--orders N] [--order-items N]
+       [--inventory-items N] [--seed N] [--end YYYY-MM-DD] [--reset]
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import func, insert, select, text
+
+from cache import response_cache
+from models import db, Customer, InventoryItem, TailoringOrder, OrderItem
+from serializers import MEASUREMENT_FIELDS
+from reports import rebuild_financial_rollups
+from stats import rebuild_stat_counters
+from stock import open_stock_ledger
+
+BATCH_SIZE = 50000
+HISTORY_DAYS = 3 * 365
+STATUSES = ('pending', 'in_progress', 'completed', 'delivered')
+
+FIRST_NAMES = ['Ahmed', 'Ali', 'Bilal', 'Fatima', 'Hassan', 'Ayesha', 'Usman', 'Zainab',
+               'Imran', 'Sana', 'Kamran', 'Hira', 'Farhan', 'Mariam', 'Omar', 'Nadia',
+               'Tariq', 'Amna', 'Saad', 'Rabia', 'Junaid', 'Mehwish', 'Asad', 'Iqra']
+LAST_NAMES = ['Khan', 'Malik', 'Qureshi', 'Sheikh', 'Butt', 'Chaudhry', 'Siddiqui', 'Raza',
+              'Hussain', 'Mirza', 'Abbasi', 'Javed', 'Baig', 'Shah', 'Akhtar', 'Rehman',
+              'Anwar', 'Iqbal', 'Aslam', 'Nawaz', 'Bhatti', 'Gill', 'Dar', 'Lodhi']
+CITIES = ['Karachi', 'Lahore', 'Islamabad', 'Rawalpindi', 'Faisalabad', 'Multan', 'Peshawar',
+          'Sialkot']
+STREETS = ['Main Street', 'Garden Road', 'Park Avenue', 'Mall Road', 'Canal View',
+           'Jinnah Road', 'Circular Road', 'Model Town']
+
+MATERIALS = ['Cotton', 'Linen', 'Silk', 'Wool Blend', 'Khaddar', 'Lawn', 'Chiffon', 'Denim',
+             'Velvet', 'Polyester']
+COLORS = ['White', 'Black', 'Navy Blue', 'Charcoal', 'Beige', 'Maroon', 'Olive', 'Sky Blue',
+          'Cream', 'Grey']
+SUPPLIERS = [('ABC Textiles Ltd', '+92-21-11111111'), ('Lahore Mills', '+92-42-22222222'),
+             ('Karachi Fabrics', '+92-21-33333333'), ('Sialkot Trims', '+92-52-44444444'),
+             ('Faisal Threads', '+92-41-55555555')]
+
+# category: (name, unit, quantity used per order from, to); whole units for integer ranges
+ACCESSORIES = {
+    'thread': ('{color} Polyester Thread', 'spools', 1, 2),
+    'button': ('{color} Buttons - Pack of 12', 'packs', 1, 3),
+    'accessory': ('{color} Zipper', 'pieces', 1, 2),
+    'lining': ('{color} Lining Fabric', 'meters', 0.5, 2.0),
+}
+
+# garment: (share of orders, base price, fabric meters, measurements taken)
+GARMENTS = {
+    'shirt': (0.35, 1500, 2.5, ('chest', 'waist', 'shoulder', 'sleeve_length',
+                                'shirt_length', 'neck')),
+    'pant': (0.25, 1200, 1.4, ('waist', 'hip', 'inseam')),
+    'suit': (0.15, 8000, 3.5, MEASUREMENT_FIELDS),
+    'kurta': (0.15, 2500, 3.0, ('chest', 'shoulder', 'sleeve_length', 'shirt_length', 'neck')),
+    'waistcoat': (0.10, 3000, 1.2, ('chest', 'waist', 'shoulder')),
+}
+GARMENT_TYPES = list(GARMENTS)
+GARMENT_SHARES = np.array([share for share, _, _, _ in GARMENTS.values()])
+GARMENT_PRICES = np.array([price for _, price, _, _ in GARMENTS.values()], dtype=float)
+GARMENT_FABRIC = np.array([meters for _, _, meters, _ in GARMENTS.values()])
+GARMENT_MEASURED = np.array([[key in taken for key in MEASUREMENT_FIELDS]
+                             for _, _, _, taken in GARMENTS.values()])
+
+INSTRUCTIONS = ['Slim fit', 'French cuffs', 'Monogram on pocket', 'Double stitching',
+                'Side slits', 'Extra buttons', 'Rush order']
+
+# Mean and spread (inches) of each measurement across customers, in MEASUREMENT_FIELDS order
+BODY_MEANS = np.array([40.0, 34.0, 18.0, 24.0, 30.0, 15.5, 40.0, 31.0])
+BODY_SPREAD = np.array([3.0, 3.5, 1.0, 1.2, 1.5, 0.8, 3.0, 1.8])
+
+
+def random_streams(seed):
+    """Independent generators per table, so one table's size does not change another's rows"""
+    names = ('customers', 'inventory', 'bodies', 'orders', 'order_items')
+    return dict(zip(names, (np.random.default_rng(child)
+                            for child in np.random.SeedSequence(seed).spawn(len(names)))))
+
+
+def to_datetimes(seconds):
+    """datetime objects from an array of numpy datetime64 seconds"""
+    return seconds.astype('datetime64[us]').tolist()
+
+
+def quarter_inches(values):
+    return np.round(values * 4) / 4
+
+
+def history_start(end):
+    return np.datetime64(datetime.combine(end, datetime.min.time()), 's') - \
+        np.timedelta64(HISTORY_DAYS, 'D')
+
+
+def popular(rng, size, count):
+    """Ids 1..count with low ids drawn more often (squared uniform)"""
+    return (rng.random(size) ** 2 * count).astype(np.int64) + 1
+
+
+def customer_batches(rng, count, end):
+    start = history_start(end)
+    for first in range(1, count + 1, BATCH_SIZE):
+        ids = np.arange(first, min(first + BATCH_SIZE, count + 1))
+        size = len(ids)
+        # Customers join over the whole history, in id order
+        joined = start + (ids * HISTORY_DAYS * 86400 // (count + 1)).astype('timedelta64[s]')
+        yield [
+            {'id': i, 'name': f'{FIRST_NAMES[f]} {LAST_NAMES[l]}',
+             'phone': f'+92-3{network:02d}-{number:07d}',
+             'email': f'{FIRST_NAMES[f].lower()}.{LAST_NAMES[l].lower()}{i}@example.com'
+             if has_email else None,
+             'address': f'{house} {STREETS[street]}, {CITIES[city]}', 'created_at': created}
+            for i, f, l, network, number, has_email, house, street, city, created in zip(
+                ids.tolist(),
+                rng.integers(len(FIRST_NAMES), size=size).tolist(),
+                rng.integers(len(LAST_NAMES), size=size).tolist(),
+                rng.integers(50, size=size).tolist(),
+                rng.integers(10_000_000, size=size).tolist(),
+                (rng.random(size) < 0.7).tolist(),
+                rng.integers(1, 1000, size=size).tolist(),
+                rng.integers(len(STREETS), size=size).tolist(),
+                rng.integers(len(CITIES), size=size).tolist(),
+                to_datetimes(joined))
+        ]
+
+
+def inventory_rows(rng, count, end):
+    """Fabrics (the first three fifths) and accessories, with per-order usage ranges"""
+    created = to_datetimes(history_start(end))
+    fabrics = max(1, count * 3 // 5)
+    rows, usage = [], []
+    for item_id in range(1, count + 1):
+        supplier, contact = SUPPLIERS[rng.integers(len(SUPPLIERS))]
+        color = COLORS[rng.integers(len(COLORS))]
+        if item_id <= fabrics:
+            material = MATERIALS[rng.integers(len(MATERIALS))]
+            name, category, unit = f'{material} Fabric - {color}', 'fabric', 'meters'
+            price, quantity = rng.uniform(15, 120), rng.uniform(0, 400)
+            usage.append((0, 0))
+        else:
+            category = list(ACCESSORIES)[rng.integers(len(ACCESSORIES))]
+            name, unit, low, high = ACCESSORIES[category]
+            name = name.format(color=color)
+            price, quantity = rng.uniform(1, 40), rng.uniform(0, 500)
+            usage.append((low, high))
+        rows.append({
+            'id': item_id, 'name': f'{name} #{item_id}', 'category': category,
+            'description': f'{category.title()} from {supplier}',
+            'quantity': round(float(quantity), 1), 'unit': unit,
+            'price_per_unit': round(float(price), 2),
+            'reorder_level': float(rng.integers(10, 50)),
+            'supplier_name': supplier, 'supplier_contact': contact,
+            'created_at': created, 'updated_at': created,
+        })
+    return rows, fabrics, np.array(usage, dtype=float)
+
+
+def body_profiles(rng, customers):
+    """One set of measurements per customer"""
+    return BODY_MEANS + rng.standard_normal((customers, len(MEASUREMENT_FIELDS))) * BODY_SPREAD
+
+
+def order_batches(rng, bodies, count, end):
+    """(order rows, order ids, garment codes) per batch"""
+    start = history_start(end)
+    span = HISTORY_DAYS * 86400
+    end_time = start + np.timedelta64(span, 's')
+    for first in range(1, count + 1, BATCH_SIZE):
+        ids = np.arange(first, min(first + BATCH_SIZE, count + 1))
+        size = len(ids)
+        # Orders arrive in id order over the history, give or take an hour
+        offsets = np.maximum(ids * span // (count + 1) - rng.integers(0, 3600, size), 0)
+        ordered = start + offsets.astype('timedelta64[s]')
+        recent = span - offsets < 30 * 86400
+
+        customers = popular(rng, size, len(bodies))
+        garments = rng.choice(len(GARMENT_TYPES), size=size, p=GARMENT_SHARES)
+        measured = quarter_inches(bodies[customers - 1] +
+                                  rng.normal(0, 0.25, (size, len(MEASUREMENT_FIELDS))))
+        measured = np.where(GARMENT_MEASURED[garments], measured, np.nan)
+
+        draw = rng.random(size)
+        status = np.where(recent, np.searchsorted([0.4, 0.75, 0.9], draw, side='right'),
+                          np.where(draw < 0.9, 3, 2))
+        completed = np.minimum(ordered + rng.integers(3 * 86400, 14 * 86400, size)
+                               .astype('timedelta64[s]'), end_time)
+        due = ordered + (rng.integers(7, 22, size) * 86400).astype('timedelta64[s]')
+        price = np.round(GARMENT_PRICES[garments] * rng.uniform(0.8, 1.5, size) / 50) * 50
+        advance = np.where(status == 3, price, price * rng.choice([0, 0.25, 0.5, 1.0], size))
+        instruction = rng.integers(len(INSTRUCTIONS) * 8, size=size)
+
+        done = (status >= 2).tolist()
+        columns = [measured[:, i].tolist() for i in range(len(MEASUREMENT_FIELDS))]
+        rows = []
+        for n, (order_id, customer, garment, state, order_date, completed_at, delivery_date,
+                total, paid, note) in enumerate(zip(
+                    ids.tolist(), customers.tolist(), garments.tolist(), status.tolist(),
+                    to_datetimes(ordered), to_datetimes(completed), to_datetimes(due),
+                    price.tolist(), advance.tolist(), instruction.tolist())):
+            completed_at = completed_at if done[n] else None
+            row = {
+                'id': order_id, 'customer_id': customer, 'order_date': order_date,
+                'delivery_date': delivery_date, 'completed_at': completed_at,
+                'status': STATUSES[state], 'garment_type': GARMENT_TYPES[garment],
+                'special_instructions': INSTRUCTIONS[note] if note < len(INSTRUCTIONS) else None,
+                'total_price': total, 'advance_payment': paid,
+                'created_at': order_date, 'updated_at': completed_at or order_date,
+            }
+            for key, column in zip(MEASUREMENT_FIELDS, columns):
+                value = column[n]
+                row[key] = None if value != value else value
+            rows.append(row)
+        yield rows, ids, garments
+
+
+def order_item_rows(rng, order_ids, garments, per_order, fabrics, usage):
+    """One fabric per order plus accessories, per_order items per order on average"""
+    counts = 1 + rng.poisson(per_order - 1, len(order_ids))
+    orders = np.repeat(order_ids, counts)
+    size = len(orders)
+    is_fabric = np.ones(size, dtype=bool)
+    accessories = len(usage) - fabrics
+    if accessories:
+        is_fabric[1:] = orders[1:] != orders[:-1]
+    items = np.where(is_fabric, popular(rng, size, fabrics),
+                     fabrics + popular(rng, size, max(accessories, 1)))
+
+    low, high = usage[items - 1, 0], usage[items - 1, 1]
+    whole = (low == np.round(low)) & (high == np.round(high))
+    accessory_quantity = low + rng.random(size) * (high - low)
+    accessory_quantity = np.where(whole, np.round(accessory_quantity), accessory_quantity)
+    fabric_quantity = GARMENT_FABRIC[np.repeat(garments, counts)] * rng.uniform(0.9, 1.2, size)
+    quantity = np.round(np.where(is_fabric, fabric_quantity, accessory_quantity), 2)
+    return [
+        {'order_id': order_id, 'inventory_item_id': item_id, 'quantity_used': used}
+        for order_id, item_id, used in zip(orders.tolist(), items.tolist(), quantity.tolist())
+    ]
+
+
+def generate(customers, orders, order_items, inventory_items, seed=0, end=None, log=print):
+    """Insert a synthetic dataset into empty tables (app context); returns row counts"""
+    if orders and not (customers and inventory_items):
+        raise ValueError('Orders need at least one customer and one inventory item')
+    end = end or date.today()
+    streams = random_streams(seed)
+    # Stale statistics from empty tables slow the FTS triggers down as the
+    # tables fill; the ANALYZE at the end gathers fresh ones
+    if db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")).first():
+        db.session.execute(text('DELETE FROM sqlite_stat1'))
+        db.session.commit()
+
+    def insert_batches(label, batches):
+        """Insert and commit each list of (model, rows) pairs"""
+        start = time.perf_counter()
+        count = 0
+        for batch in batches:
+            connection = db.session.connection()
+            for model, rows in batch:
+                if rows:
+                    connection.execute(insert(model), rows)
+                    count += len(rows)
+            db.session.commit()
+        log(f"{label:<14} {count:>10} rows {time.perf_counter() - start:8.1f} s")
+
+    insert_batches('customers', ([(Customer, rows)] for rows in
+                                 customer_batches(streams['customers'], customers, end)))
+    items, fabrics, usage = inventory_rows(streams['inventory'], inventory_items, end)
+    insert_batches('inventory', [[(InventoryItem, items)]])
+
+    bodies = body_profiles(streams['bodies'], customers)
+    per_order = max(1.0, order_items / orders) if orders else 1.0
+    insert_batches('orders, items', (
+        [(TailoringOrder, rows),
+         (OrderItem, order_item_rows(streams['order_items'], ids, garments, per_order,
+                                     fabrics, usage))]
+        for rows, ids, garments in order_batches(streams['orders'], bodies, orders, end)
+    ))
+
+    start = time.perf_counter()
+    open_stock_ledger()
+    rebuild_stat_counters()
+    rebuild_financial_rollups()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    response_cache.bump(['customers', 'inventory', 'orders'])
+    log(f"{'ledger, stats':<14} {'':>10}      {time.perf_counter() - start:8.1f} s")
+    return {model.__tablename__: db.session.execute(
+        select(func.count()).select_from(model)).scalar()
+        for model in (Customer, InventoryItem, TailoringOrder, OrderItem)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--order-items', type=int, default=200000,
+                        help='approximate total; orders get 1 + Poisson(mean - 1) items')
+    parser.add_argument('--inventory-items', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end', type=date.fromisoformat, default=None,
+                        help='last day of order history (default: today)')
+    parser.add_argument('--reset', action='store_true',
+                        help='drop and recreate all tables first')
+    args = parser.parse_args()
+
+    from app import create_app
+    from migrations import upgrade_database
+    app = create_app()
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        upgrade_database()
+        if any(db.session.execute(select(model.id).limit(1)).first()
+               for model in (Customer, InventoryItem, TailoringOrder)):
+            sys.exit('The database already has data; use --reset to replace it.')
+        counts = generate(args.customers, args.orders, args.order_items,
+                          args.inventory_items, args.seed, args.end)
+    print(', '.join(f'{count} {table}' for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""
+Hamees Attire Inventory Management System
+Inventory Import
+
+Supplier price lists are imported from CSV (with a header row) or NDJSON (one
+JSON object per line), either uploaded to ``POST /api/inventory/import`` or
+read from a file with ``flask import-inventory``. Rows are parsed one at a
+time from the stream, so memory use does not depend on the file size.
+
+Each row is checked against the InventoryItem columns and upserted by
+(name, supplier_name): an existing item is updated with the columns given,
+otherwise a new item is created, which needs every required column. Valid
+rows are committed in chunks, with one query per chunk to find the existing
+items. Updates go through the ORM and its session hooks; new items are
+inserted with one multi-row INSERT per chunk, which records their stock
+movements (reason ``import``), stat counters and cache versions itself.
+
+Progress is reported as a sequence of events: one per rejected row, one
+after every committed chunk and a final summary.
+"""
+import codecs
+import csv
+import json
+import math
+import os
+from datetime import datetime
+
+from sqlalchemy import Float, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import mark_changed
+from database import reserve_ids
+from models import db, InventoryItem, StockMovement
+from stats import adjust_stat_counters, is_low_stock
+from stock import movement_reason
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+MAX_CHUNK_SIZE = 10000
+
+IMPORT_COLUMNS = ('name', 'category', 'description', 'quantity', 'unit', 'price_per_unit',
+                  'reorder_level', 'supplier_name', 'supplier_contact')
+
+# Columns a new item cannot be created without
+REQUIRED_COLUMNS = tuple(
+    name for name in IMPORT_COLUMNS
+    if not InventoryItem.__table__.c[name].nullable
+    and InventoryItem.__table__.c[name].default is None
+)
+
+_MIMETYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/json-lines': 'ndjson',
+}
+
+
+class InventoryImportError(ValueError):
+    """Raised when an import cannot start (unknown format, bad header)"""
+
+
+def import_format(requested=None, mimetype=None, path=None):
+    """The import format from an explicit choice, a content type or a file name"""
+    if requested:
+        if requested not in IMPORT_FORMATS:
+            raise InventoryImportError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+        return requested
+    if mimetype in _MIMETYPES:
+        return _MIMETYPES[mimetype]
+    extension = os.path.splitext(path or '')[1].lower()
+    if extension in ('.csv', '.ndjson', '.jsonl'):
+        return 'csv' if extension == '.csv' else 'ndjson'
+    raise InventoryImportError('Send text/csv or application/x-ndjson, or set format')
+
+
+def parse_chunk_size(raw_chunk_size, default):
+    if raw_chunk_size is None:
+        return default
+    try:
+        chunk_size = int(raw_chunk_size)
+    except ValueError:
+        raise InventoryImportError('chunk_size must be an integer')
+    if chunk_size < 1 or chunk_size > MAX_CHUNK_SIZE:
+        raise InventoryImportError(f'chunk_size must be between 1 and {MAX_CHUNK_SIZE}')
+    return chunk_size
+
+
+def text_lines(stream, block_size=64 * 1024):
+    """Decode a binary stream as UTF-8 lines, reading one block at a time"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    pending = ''
+    while True:
+        block = stream.read(block_size)
+        lines = (pending + decoder.decode(block or b'', final=not block)).split('\n')
+        # The last piece has no newline yet and may continue in the next block
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+        if not block:
+            if pending:
+                yield pending
+            return
+
+
+def read_csv(stream):
+    """(line number, row) pairs from a CSV stream; the header is checked first"""
+    reader = csv.DictReader(text_lines(stream))
+    header = reader.fieldnames
+    if not header:
+        raise InventoryImportError('CSV file is empty')
+    unknown = [name for name in header if name not in IMPORT_COLUMNS]
+    if unknown:
+        raise InventoryImportError(f"Unknown CSV columns: {', '.join(unknown)}")
+    if 'name' not in header:
+        raise InventoryImportError('CSV file needs a name column')
+
+    def rows():
+        for row in reader:
+            # Fields beyond the header are collected under None
+            yield reader.line_num, row
+    return rows()
+
+
+def read_ndjson(stream):
+    """(line number, object) pairs from an NDJSON stream, None for invalid JSON"""
+    for number, line in enumerate(text_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def read_rows(stream, file_format):
+    return read_csv(stream) if file_format == 'csv' else read_ndjson(stream)
+
+
+def validate_row(raw):
+    """Column values and field errors for one row; empty fields are left unchanged"""
+    if not isinstance(raw, dict):
+        return None, {'row': 'is not a JSON object'}
+    values, errors = {}, {}
+    for key, value in raw.items():
+        if key is None:
+            errors['row'] = 'has more fields than the header'
+            continue
+        if key not in IMPORT_COLUMNS:
+            errors[key] = 'unknown column'
+            continue
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        column = InventoryItem.__table__.c[key]
+        if isinstance(column.type, Float):
+            try:
+                if isinstance(value, bool):
+                    raise ValueError
+                number = float(value)
+            except (TypeError, ValueError):
+                errors[key] = 'must be a number'
+                continue
+            if not math.isfinite(number) or number < 0:
+                errors[key] = 'must be a non-negative number'
+                continue
+            values[key] = number
+        elif not isinstance(value, str):
+            errors[key] = 'must be a string'
+        elif column.type.length and len(value.strip()) > column.type.length:
+            errors[key] = f'must be at most {column.type.length} characters'
+        else:
+            values[key] = value.strip()
+    if 'name' not in values and 'name' not in errors:
+        errors['name'] = 'is required'
+    return values, errors
+
+
+def _new_item_rows(new_items, now):
+    """Full column dictionaries for an executemany INSERT of new items"""
+    defaults = {
+        name: column.default.arg if column.default is not None else None
+        for name, column in InventoryItem.__table__.c.items() if name in IMPORT_COLUMNS
+    }
+    return [{**defaults, **values, 'created_at': now, 'updated_at': now}
+            for values in new_items]
+
+
+def insert_new_items(new_items):
+    """Insert new items with one multi-row INSERT, keeping the ledger and counters
+
+    The ORM would insert them one row at a time to read back the computed
+    is_low_stock column, so they bypass it and its session hooks; their ids
+    are reserved up front so the ledger rows match them.
+    """
+    connection = db.session.connection()
+    rows = _new_item_rows(new_items, datetime.utcnow())
+    item_ids = reserve_ids(connection, InventoryItem.id, len(rows))
+    connection.execute(insert(InventoryItem), [
+        {**row, 'id': item_id} for item_id, row in zip(item_ids, rows)])
+    movements = [
+        {'inventory_item_id': item_id, 'delta': row['quantity'], 'reason': 'import'}
+        for item_id, row in zip(item_ids, rows) if row['quantity']
+    ]
+    if movements:
+        connection.execute(insert(StockMovement), movements)
+    adjust_stat_counters(connection, {
+        'inventory_items': len(rows),
+        'low_stock_items': sum(is_low_stock(row['quantity'], row['reorder_level'])
+                               for row in rows),
+    })
+    mark_changed(db.session, 'inventory')
+
+
+def upsert_chunk(rows):
+    """Create or update the items of (line, values) rows in one transaction
+
+    Returns (created, updated, rejected) where rejected lists the error
+    events of new items missing required columns.
+    """
+    existing = {}
+    names = {values['name'] for _, values in rows}
+    for item in db.session.scalars(
+        select(InventoryItem).where(InventoryItem.name.in_(names)).order_by(InventoryItem.id)
+    ):
+        # With duplicates already in the table, the oldest item is updated
+        existing.setdefault((item.name, item.supplier_name), item)
+
+    new_items = {}
+    created = updated = 0
+    rejected = []
+    for line, values in rows:
+        key = (values['name'], values.get('supplier_name'))
+        if key in existing:
+            for column, value in values.items():
+                setattr(existing[key], column, value)
+            updated += 1
+        elif key in new_items:
+            # A later row for an item created by this chunk
+            new_items[key].update(values)
+            updated += 1
+        else:
+            missing = [column for column in REQUIRED_COLUMNS if column not in values]
+            if missing:
+                rejected.append({
+                    'event': 'error', 'line': line,
+                    'errors': {column: 'is required for a new item' for column in missing}
+                })
+                continue
+            new_items[key] = dict(values)
+            created += 1
+
+    with movement_reason('import'):
+        db.session.flush()
+    if new_items:
+        insert_new_items(list(new_items.values()))
+    db.session.commit()
+    return created, updated, rejected
+
+
+def import_inventory(rows, chunk_size):
+    """Validate and upsert (line, row) pairs, committing chunk_size rows at a time
+
+    A generator of events: ``error`` for each rejected row, ``progress`` after
+    each commit and ``done`` at the end. If a commit fails, that chunk is
+    rolled back and the import stops with ``failed``.
+    """
+    totals = {'rows': 0, 'created': 0, 'updated': 0, 'rejected': 0}
+    chunk = []
+
+    def commit():
+        try:
+            created, updated, rejected = upsert_chunk(chunk)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return [{'event': 'failed', 'lines': [chunk[0][0], chunk[-1][0]],
+                     'error': f'chunk not imported: {e.__class__.__name__}', **totals}]
+        totals['created'] += created
+        totals['updated'] += updated
+        totals['rejected'] += len(rejected)
+        return [*rejected, {'event': 'progress', 'line': chunk[-1][0], **totals}]
+
+    for line, raw in rows:
+        totals['rows'] += 1
+        values, errors = validate_row(raw)
+        if errors:
+            totals['rejected'] += 1
+            yield {'event': 'error', 'line': line, 'errors': errors}
+            continue
+        chunk.append((line, values))
+        if len(chunk) >= chunk_size:
+            events = commit()
+            yield from events
+            if events[-1]['event'] == 'failed':
+                return
+            chunk = []
+    if chunk:
+        events = commit()
+        yield from events
+        if events[-1]['event'] == 'failed':
+            return
+    yield {'event': 'done', **totals}
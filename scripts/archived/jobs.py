@@ -0,0 +1,255 @@
+"""
+Hamees Attire Inventory Management System
+Background Jobs
+
+Work that should not hold up a request is queued in the ``jobs`` table and
+run by worker processes (``flask --app app run-jobs``). ``enqueue()`` only
+adds the row to the session, so a job is queued exactly when the caller's
+transaction commits: completing an order that takes items down to their
+reorder level queues one ``low_stock_alert`` in the same commit.
+
+A worker claims the oldest due job with a single conditional UPDATE, so two
+workers never run the same job:
+
+    UPDATE jobs SET status = 'running', attempts = attempts + 1, ...
+    WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND run_at <= :now
+                ORDER BY run_at, id LIMIT 1) AND status = 'queued'
+
+A job that raises is queued again JOB_RETRY_SECONDS later, doubling with
+every attempt, until it has failed JOB_MAX_ATTEMPTS times. Jobs left running
+for JOB_TIMEOUT_SECONDS by a worker that died are queued again by the pool.
+``GET /api/jobs/<id>`` reports a job's status, result and last error.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from models import db, InventoryItem, Job
+from stats import is_low_stock, rebuild_stat_counters
+
+MAX_RETRY_DELAY = 3600  # seconds
+WEBHOOK_TIMEOUT = 10  # seconds
+
+logger = logging.getLogger('hamees.jobs')
+
+# kind -> function(payload) returning a JSON-serializable result
+JOB_HANDLERS = {}
+
+
+class JobError(ValueError):
+    """Raised when a job cannot be queued"""
+
+
+def job_handler(kind):
+    """Register a function as the handler of a job kind"""
+    def decorator(function):
+        JOB_HANDLERS[kind] = function
+        return function
+    return decorator
+
+
+def enqueue(kind, payload=None, delay=0, max_attempts=None):
+    """Add a job to the session; it is queued when the caller commits"""
+    if kind not in JOB_HANDLERS:
+        raise JobError(f"Unknown job kind {kind!r}; choose from {', '.join(sorted(JOB_HANDLERS))}")
+    if payload is not None and not isinstance(payload, dict):
+        raise JobError('payload must be an object')
+    job = Job(kind=kind, payload=payload or {},
+              max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS'],
+              run_at=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    return job
+
+
+def retry_delay(attempts):
+    """Seconds before the next try of a job that has failed attempts times"""
+    return min(current_app.config['JOB_RETRY_SECONDS'] * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_job(worker):
+    """Mark the oldest due job as running by worker and return it, or None"""
+    now = datetime.utcnow()
+    due = (
+        select(Job.id)
+        .where(Job.status == 'queued', Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    job_id = db.session.execute(
+        update(Job)
+        .where(Job.id == due, Job.status == 'queued')
+        .values(status='running', attempts=Job.attempts + 1, locked_by=worker, locked_at=now)
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    db.session.commit()
+    return db.session.get(Job, job_id) if job_id is not None else None
+
+
+def run_job(job):
+    """Run a claimed job and record its result, or schedule a retry"""
+    job_id, kind = job.id, job.kind
+    try:
+        result = JOB_HANDLERS[kind](job.payload)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.error = f'{e.__class__.__name__}: {e}'
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_at = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+        logger.warning('Job %s (%s) attempt %s failed: %s', job_id, kind, job.attempts, job.error)
+    else:
+        job = db.session.get(Job, job_id)
+        job.status = 'succeeded'
+        job.result = result
+        job.finished_at = datetime.utcnow()
+        logger.info('Job %s (%s) succeeded', job_id, kind)
+    job.locked_by = job.locked_at = None
+    db.session.commit()
+    return job
+
+
+def requeue_stale_jobs():
+    """Queue again the jobs whose worker stopped without finishing them"""
+    now = datetime.utcnow()
+    stale = (Job.status == 'running',
+             Job.locked_at < now - timedelta(seconds=current_app.config['JOB_TIMEOUT_SECONDS']))
+    values = {'locked_by': None, 'locked_at': None, 'error': 'Worker stopped'}
+    requeued = db.session.execute(
+        update(Job).where(*stale, Job.attempts < Job.max_attempts)
+        .values(status='queued', run_at=now, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    failed = db.session.execute(
+        update(Job).where(*stale)
+        .values(status='failed', finished_at=now, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return requeued + failed
+
+
+def work(worker, burst=False, should_stop=lambda: False):
+    """Run jobs as they become due (app context); with burst, stop when none are"""
+    processed = 0
+    while not should_stop():
+        job = claim_job(worker)
+        if job is None:
+            if burst:
+                break
+            db.session.remove()
+            time.sleep(current_app.config['JOB_POLL_SECONDS'])
+            continue
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def _worker_process(app, burst):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the pool stops its workers
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    with app.app_context():
+        work(worker, burst, should_stop=lambda: bool(stopping))
+
+
+def run_worker_pool(app, processes, burst=False):
+    """Run worker processes until interrupted (or, with burst, until the queue is empty)
+
+    Workers are forked from this process and replaced if they exit; the pool
+    also queues again the jobs of workers that died while running them.
+    """
+    context = multiprocessing.get_context('fork')
+    stopping = []
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+    def start():
+        process = context.Process(target=_worker_process, args=(app, burst), daemon=True)
+        process.start()
+        return process
+
+    with app.app_context():
+        requeue_stale_jobs()
+        db.session.remove()
+    pool = [start() for _ in range(processes)]
+    try:
+        while not stopping and any(process.is_alive() for process in pool):
+            time.sleep(app.config['JOB_POLL_SECONDS'])
+            with app.app_context():
+                requeue_stale_jobs()
+            if not burst:
+                pool = [process if process.is_alive() else start() for process in pool]
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in pool:
+            if process.is_alive():
+                process.terminate()  # SIGTERM: finish the current job, then exit
+        for process in pool:
+            process.join()
+        signal.signal(signal.SIGTERM, previous)
+
+
+# Job kinds
+
+@job_handler('low_stock_alert')
+def low_stock_alert(payload):
+    """Report items at or below their reorder level, to LOW_STOCK_WEBHOOK_URL if set"""
+    items = [
+        {'inventory_item_id': item.id, 'name': item.name, 'unit': item.unit,
+         'quantity': item.quantity, 'reorder_level': item.reorder_level,
+         'supplier_name': item.supplier_name}
+        for item in db.session.scalars(
+            select(InventoryItem)
+            .where(InventoryItem.id.in_(payload.get('inventory_item_ids', [])))
+            .order_by(InventoryItem.id))
+        # Stock may have been received since the job was queued
+        if is_low_stock(item.quantity, item.reorder_level)
+    ]
+    alert = {'order_id': payload.get('order_id'), 'items': items}
+    url = current_app.config['LOW_STOCK_WEBHOOK_URL']
+    if items and url:
+        request = urllib.request.Request(url, data=json.dumps(alert).encode(), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        # A failed delivery raises, and the job is retried
+        with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT):
+            pass
+    elif items:
+        logger.warning('Low stock: %s', ', '.join(
+            f"{item['name']} {item['quantity']:g} {item['unit']}" for item in items))
+    return {**alert, 'notified': bool(items and url)}
+
+
+@job_handler('rebuild_forecasts')
+def rebuild_forecasts_job(payload):
+    from forecasting import rebuild_forecasts
+
+    return {'items': rebuild_forecasts()}
+
+
+@job_handler('rebuild_financial_rollups')
+def rebuild_financial_rollups_job(payload):
+    from reports import rebuild_financial_rollups
+
+    return {'daily_rows': rebuild_financial_rollups()}
+
+
+@job_handler('rebuild_stats')
+def rebuild_stats_job(payload):
+    rebuild_stat_counters()
+    return {}
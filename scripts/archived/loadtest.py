@@ -0,0 +1,227 @@
+"""
+Hamees Attire Inventory Management System
+Load Test
+
+Sends a weighted mix of API requests, from several threads, either through
+Flask's test client (in process, against the configured DATABASE_URL) or to
+a running server (--url). Request parameters are drawn from the id ranges
+reported by /api/stats, so the harness works with any dataset from
+generate_data.py. Reports requests, errors, throughput and p50/p95/p99
+latency per endpoint.
+
+Usage: python loadtest.py [--url http://localhost:5000] [--requests N | --duration S]
+       [--concurrency N] [--mix order=30,search=15,...] [--seed N]
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+SEARCH_TERMS = ['ah', 'kha', 'ahmed khan', 'fatima', 'sidd', 'bhatti', 'cotton', 'silk',
+                'navy', '0300', '92-321']
+GARMENT_TYPES = ['shirt', 'pant', 'suit', 'kurta', 'waistcoat']
+
+
+def _random_order(rng, scale):
+    return {
+        'customer_id': rng.randint(1, scale['customers']),
+        'garment_type': rng.choice(GARMENT_TYPES),
+        'chest': round(rng.gauss(40, 3), 1),
+        'waist': round(rng.gauss(34, 3), 1),
+        'total_price': 2500.0,
+        'advance_payment': 500.0,
+        'items_used': [{'inventory_item_id': rng.randint(1, scale['inventory_items']),
+                        'quantity_used': 2.5}],
+    }
+
+
+# name: function(rng, scale) -> (method, path, json body)
+ENDPOINTS = {
+    'order': lambda rng, scale: ('GET', f"/api/orders/{rng.randint(1, scale['total_orders'])}",
+                                 None),
+    'orders_page': lambda rng, scale: ('GET', '/api/orders?limit=50', None),
+    'orders_by_status': lambda rng, scale: (
+        'GET', f"/api/orders?status={rng.choice(['pending', 'in_progress'])}&limit=50", None),
+    'customer': lambda rng, scale: (
+        'GET', f"/api/customers/{rng.randint(1, scale['customers'])}", None),
+    'customers_page': lambda rng, scale: ('GET', '/api/customers?limit=50', None),
+    'inventory': lambda rng, scale: ('GET', '/api/inventory?limit=100', None),
+    'low_stock': lambda rng, scale: ('GET', '/api/inventory/low-stock', None),
+    'search': lambda rng, scale: (
+        'GET', '/api/search?' + urlencode({'q': rng.choice(SEARCH_TERMS)}), None),
+    'similar': lambda rng, scale: ('GET', '/api/orders/similar?' + urlencode({
+        'garment_type': rng.choice(GARMENT_TYPES), 'chest': round(rng.gauss(40, 3), 1),
+        'waist': round(rng.gauss(34, 3), 1)}), None),
+    'requirements': lambda rng, scale: ('GET', '/api/inventory/requirements?shortfall=1', None),
+    'forecast': lambda rng, scale: ('GET', '/api/inventory/forecast', None),
+    'stats': lambda rng, scale: ('GET', '/api/stats', None),
+    'create_order': lambda rng, scale: ('POST', '/api/orders', _random_order(rng, scale)),
+}
+
+DEFAULT_MIX = {'order': 25, 'orders_page': 10, 'orders_by_status': 5, 'customer': 15,
+               'customers_page': 5, 'inventory': 5, 'low_stock': 5, 'search': 15,
+               'similar': 5, 'stats': 5, 'create_order': 5}
+
+
+def parse_mix(text):
+    """{'name': weight} from 'order=30,search=10'"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+class TestClientTransport:
+    """Requests through Flask's test client; one per thread"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HttpTransport:
+    """Requests to a running server, one connection per request"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+
+    def request(self, method, path, body):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            connection.request(method, path, json.dumps(body) if body is not None else None,
+                               headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(timings, errors, wall):
+    values = sorted(timings)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'throughput': len(values) / wall,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': values[-1],
+    }
+
+
+def run(make_transport, scale, mix=None, requests=1000, duration=None, concurrency=4, seed=0):
+    """Send requests (or run for duration seconds) and return per-endpoint results"""
+    mix = mix or DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    remaining = [requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def take():
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        with lock:
+            remaining[0] -= 1
+            return remaining[0] >= 0
+
+    def worker(number):
+        rng = random.Random(seed * 1000 + number)
+        transport = make_transport()
+        while take():
+            name = rng.choices(names, weights)[0]
+            method, path, body = ENDPOINTS[name](rng, scale)
+            start = time.perf_counter()
+            try:
+                ok = transport.request(method, path, body)[0] < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                timings[name].append(elapsed)
+                if not ok:
+                    errors[name] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    results = {name: summarize(timings[name], errors[name], wall)
+               for name in sorted(timings, key=lambda name: -len(timings[name]))}
+    if timings:
+        results['total'] = summarize([value for values in timings.values() for value in values],
+                                     sum(errors.values()), wall)
+    return results
+
+
+def format_report(results):
+    lines = [f"{'endpoint':<18} {'requests':>8} {'errors':>6} {'req/s':>8} "
+             f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+    for name, result in results.items():
+        lines.append(f"{name:<18} {result['requests']:>8} {result['errors']:>6} "
+                     f"{result['throughput']:>8.1f} {result['p50']:>8.2f} {result['p95']:>8.2f} "
+                     f"{result['p99']:>8.2f} {result['max']:>8.2f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--url', help='running server, e.g. http://localhost:5000 '
+                                      '(default: the Flask test client)')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--duration', type=float, help='run for this many seconds instead')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--mix', type=parse_mix, default=None,
+                        help=f"weights, default {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())}")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.url:
+        def make_transport():
+            return HttpTransport(args.url)
+    else:
+        from app import create_app
+        app = create_app()
+
+        def make_transport():
+            return TestClientTransport(app)
+
+    status, body = make_transport().request('GET', '/api/stats', None)
+    scale = json.loads(body) if status == 200 else {}
+    if not all(scale.get(key) for key in ('customers', 'total_orders', 'inventory_items')):
+        raise SystemExit('The database needs customers, orders and inventory; '
+                         'run generate_data.py first.')
+
+    print(f"{scale['customers']} customers, {scale['total_orders']} orders, "
+          f"{scale['inventory_items']} inventory items; concurrency {args.concurrency}")
+    results = run(make_transport, scale, args.mix, args.requests, args.duration,
+                  args.concurrency, args.seed)
+    print(format_report(results))
+
+
+if __name__ == '__main__':
+    main()
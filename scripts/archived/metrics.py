@@ -0,0 +1,422 @@
+"""
+Hamees Attire Inventory Management System
+Prometheus Metrics
+
+``/metrics`` serves request counts and latency histograms per route, SQL
+statement counts and durations, connection pool usage, response cache hits
+and business gauges (orders by status, low-stock items) in the Prometheus
+text format.
+
+Each app keeps its own values, engines and ``METRICS_DIR`` in
+``app.extensions['metrics']``. Recording a request or a statement only
+updates dictionaries owned by the current thread, so there is no lock on the
+hot path. Every few seconds
+(``METRICS_FLUSH_SECONDS``) a worker merges its threads' values and writes
+them to ``<pid>.json`` in ``METRICS_DIR`` (an atomic rename). A scrape can
+reach any worker, so it adds up the files of all workers. Files left by
+workers that have exited are folded into ``archive.json``, so counters keep
+growing across restarts. Gauges only come from live workers. Values
+recorded before a fork (e.g. by a preloading gunicorn master) stay with the
+parent.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+from cache import response_cache
+from models import db
+from stats import rebuild_stat_counters, stored_counters
+
+# Histogram buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help)
+METRICS = {
+    'hamees_http_requests_total': ('counter', 'HTTP requests handled'),
+    'hamees_http_request_duration_seconds': ('histogram', 'HTTP request latency'),
+    'hamees_db_query_duration_seconds': ('histogram', 'SQL statement execution time'),
+    'hamees_response_cache_requests_total': ('counter', 'Response cache lookups by result'),
+    'hamees_db_pool_connections': ('gauge', 'Pooled database connections by state'),
+    'hamees_orders': ('gauge', 'Orders by status'),
+    'hamees_low_stock_items': ('gauge', 'Inventory items at or below their reorder level'),
+    'hamees_customers': ('gauge', 'Customers'),
+    'hamees_inventory_items': ('gauge', 'Inventory items'),
+}
+
+ARCHIVE = 'archive.json'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def new_histogram():
+    """Per-bucket counts (the last one is +Inf), then the sum"""
+    return [0] * (len(BUCKETS) + 1) + [0.0]
+
+
+def bucket_index(value):
+    for index, bound in enumerate(BUCKETS):
+        if value <= bound:
+            return index
+    return len(BUCKETS)
+
+
+class ThreadValues:
+    """Counters and histograms written by one thread only"""
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.counters = {}
+        self.histograms = {}
+
+
+class Values:
+    """Counters and histograms keyed by (name, labels), mergeable and JSON-friendly"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def add(self, counters, histograms):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, buckets in histograms.items():
+            total = self.histograms.setdefault(key, new_histogram())
+            for index, value in enumerate(buckets):
+                total[index] += value
+
+    def to_json(self):
+        return {
+            'counters': [[name, dict(labels), value]
+                         for (name, labels), value in self.counters.items()],
+            'histograms': [[name, dict(labels), buckets]
+                           for (name, labels), buckets in self.histograms.items()],
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        values = cls()
+        values.add({(name, labels_key(labels)): value for name, labels, value in data['counters']},
+                   {(name, labels_key(labels)): buckets
+                    for name, labels, buckets in data['histograms']})
+        return values
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """Replace a file atomically, so readers never see a partial write"""
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class AppMetrics:
+    """One app's per-thread counters and histograms, shared between workers through files"""
+
+    def __init__(self, directory, flush_seconds):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.engines = []
+        self._reset()
+
+    def _reset(self):
+        self._threads = []
+        self._retired = Values()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._last_flush = 0.0
+        self._token = f'{time.time()}-{id(self._local)}'
+        self._claimed = False
+
+    # Recording
+
+    def _values(self):
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = ThreadValues()
+            with self._lock:
+                self._threads.append(values)
+        return values
+
+    def inc(self, name, labels=None, value=1):
+        counters = self._values().counters
+        key = (name, labels_key(labels or {}))
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, seconds, labels=None):
+        histograms = self._values().histograms
+        key = (name, labels_key(labels or {}))
+        buckets = histograms.get(key)
+        if buckets is None:
+            buckets = histograms[key] = new_histogram()
+        buckets[bucket_index(seconds)] += 1
+        buckets[-1] += seconds
+
+    def instrument_engine(self, engine):
+        self.engines.append(engine)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            conn.info['metrics_query_start'] = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def end_query(conn, cursor, statement, parameters, context, executemany):
+            self.observe('hamees_db_query_duration_seconds',
+                         time.perf_counter() - conn.info['metrics_query_start'])
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    # Sharing between workers
+
+    def snapshot(self):
+        """This process's values, merged over its threads"""
+        with self._lock:
+            # Fold threads that have exited into one set of values, so
+            # thread-per-request servers do not grow the list without bound
+            for values in list(self._threads):
+                if not values.thread.is_alive():
+                    self._retired.add(values.counters, values.histograms)
+                    self._threads.remove(values)
+            threads = list(self._threads)
+            merged = Values()
+            merged.add(self._retired.counters, self._retired.histograms)
+        for values in threads:
+            # Copy first: the owning thread may add keys meanwhile
+            histograms = dict(values.histograms)
+            merged.add(dict(values.counters),
+                       {key: list(buckets) for key, buckets in histograms.items()})
+        return merged
+
+    def process_gauges(self):
+        """Gauges that belong to this process: pool usage and cache lookups"""
+        gauges = []
+        for engine in self.engines:
+            pool = engine.pool
+            for state, method in (('checked_out', 'checkedout'), ('idle', 'checkedin'),
+                                  ('overflow', 'overflow')):
+                if hasattr(pool, method):
+                    # QueuePool.overflow() is negative while the pool is not full
+                    gauges.append(['hamees_db_pool_connections', {'state': state},
+                                   max(0, getattr(pool, method)())])
+        return gauges
+
+    def cache_counters(self):
+        return {
+            ('hamees_response_cache_requests_total', (('result', 'hit'),)): response_cache.hits,
+            ('hamees_response_cache_requests_total', (('result', 'miss'),)): response_cache.misses,
+        }
+
+    @contextmanager
+    def _directory_lock(self):
+        """Serialize archiving between the processes sharing METRICS_DIR"""
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _archive(self, paths):
+        """Add the counters in worker files to the archive, then delete them"""
+        archive_path = os.path.join(self.directory, ARCHIVE)
+        archive = Values.from_json(read_json(archive_path) or {'counters': [], 'histograms': []})
+        for path in paths:
+            data = read_json(path)
+            if data is not None:
+                values = Values.from_json(data)
+                archive.add(values.counters, values.histograms)
+        write_json(archive_path, archive.to_json())
+        for path in paths:
+            os.remove(path)
+        return archive
+
+    def flush(self):
+        """Write this process's values to its file"""
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            if not self._claimed:
+                # A file under our pid was left by an earlier process
+                with self._directory_lock():
+                    data = read_json(path)
+                    if data is not None and data.get('token') != self._token:
+                        self._archive([path])
+                self._claimed = True
+            values = self.snapshot()
+            values.add(self.cache_counters(), {})
+            write_json(path, {**values.to_json(), 'gauges': self.process_gauges(),
+                              'token': self._token})
+            self._last_flush = time.monotonic()
+        finally:
+            self._flush_lock.release()
+
+    def collect(self):
+        """Values and gauges of all workers, archiving the files of exited ones"""
+        self.flush()
+        with self._directory_lock():
+            workers = {}
+            for filename in os.listdir(self.directory):
+                stem, extension = os.path.splitext(filename)
+                if extension == '.json' and stem.isdigit():
+                    workers[int(stem)] = os.path.join(self.directory, filename)
+            exited = [path for pid, path in workers.items() if not pid_alive(pid)]
+            if exited:
+                archive = self._archive(exited)
+            else:
+                archive = Values.from_json(read_json(os.path.join(self.directory, ARCHIVE)) or
+                                           {'counters': [], 'histograms': []})
+            total = Values()
+            total.add(archive.counters, archive.histograms)
+            gauges = {}
+            for pid, path in workers.items():
+                data = read_json(path) if path not in exited else None
+                if data is None:
+                    continue
+                values = Values.from_json(data)
+                total.add(values.counters, values.histograms)
+                for name, labels, value in data['gauges']:
+                    key = (name, labels_key(labels))
+                    gauges[key] = gauges.get(key, 0) + value
+        return total, gauges
+
+
+class Metrics:
+    """Records requests and statements into the current app's AppMetrics"""
+
+    def __init__(self, app=None):
+        self._apps = weakref.WeakSet()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self):
+        for app_metrics in list(self._apps):
+            app_metrics._reset()
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_DIR', os.path.join(app.instance_path, 'metrics'))
+        app.config.setdefault('METRICS_FLUSH_SECONDS', 5.0)
+        app_metrics = AppMetrics(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_SECONDS'])
+        os.makedirs(app_metrics.directory, exist_ok=True)
+        with app.app_context():
+            for engine in db.engines.values():
+                app_metrics.instrument_engine(engine)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.extensions['metrics'] = app_metrics
+        self._apps.add(app_metrics)
+
+    @property
+    def current(self):
+        return current_app.extensions['metrics']
+
+    def start_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def finish_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        app_metrics = self.current
+        app_metrics.inc('hamees_http_requests_total', {
+            'method': request.method, 'route': route, 'status': str(response.status_code)})
+        app_metrics.observe('hamees_http_request_duration_seconds', time.perf_counter() - start,
+                            {'method': request.method, 'route': route})
+        app_metrics.flush_if_due()
+        return response
+
+    def flush(self):
+        """Write the values of every app in this process to their files (at exit)"""
+        for app_metrics in list(self._apps):
+            app_metrics.flush()
+
+    def business_gauges(self):
+        """Order, customer and stock gauges from the maintained stat counters"""
+        counters = stored_counters()
+        if counters is None:
+            rebuild_stat_counters()
+            counters = stored_counters()
+        gauges = {
+            ('hamees_customers', ()): counters.get('customers', 0),
+            ('hamees_inventory_items', ()): counters.get('inventory_items', 0),
+            ('hamees_low_stock_items', ()): counters.get('low_stock_items', 0),
+        }
+        for name, value in counters.items():
+            if name.startswith('orders:'):
+                gauges[('hamees_orders', (('status', name.split(':', 1)[1]),))] = value
+        return gauges
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        values, gauges = self.current.collect()
+        gauges.update(self.business_gauges())
+        samples = {}
+        for (name, labels), value in sorted(values.counters.items()):
+            samples.setdefault(name, []).append(f'{name}{format_labels(labels)} '
+                                                f'{format_value(value)}')
+        for (name, labels), buckets in sorted(values.histograms.items()):
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, '+Inf'), buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels((*labels, ("le", bound)))} '
+                             f'{cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(buckets[-1])}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        for (name, labels), value in sorted(gauges.items()):
+            samples.setdefault(name, []).append(f'{name}{format_labels(labels)} '
+                                                f'{format_value(value)}')
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            if name in samples:
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}', *samples[name]]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,141 @@
+"""
+Hamees Attire Inventory Management System
+Schema Migrations
+
+``db.create_all()`` creates missing tables but never changes existing ones.
+The migrations below bring a database created by an older version up to date.
+Applied migrations are tracked in SQLite's ``PRAGMA user_version``, and every
+step checks the schema first, so running them on a freshly created database
+is a no-op.
+
+Run with: flask --app app upgrade-db
+"""
+from sqlalchemy import inspect, text
+
+from models import db, FinancialRollup, ReplicationHeartbeat
+from reports import ROLLUP_FIELDS, build_financial_rollups
+from search import create_search_indexes
+
+
+def _has_column(connection, table, column):
+    return column in {c['name'] for c in inspect(connection).get_columns(table)}
+
+
+def _add_low_stock_flag(connection):
+    """1: indexed is_low_stock generated column on inventory_items"""
+    if not _has_column(connection, 'inventory_items', 'is_low_stock'):
+        # SQLite can only add VIRTUAL generated columns to an existing table;
+        # the index stores the computed values either way.
+        connection.execute(text(
+            'ALTER TABLE inventory_items ADD COLUMN is_low_stock BOOLEAN '
+            'GENERATED ALWAYS AS (quantity <= reorder_level) VIRTUAL'
+        ))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_inventory_items_is_low_stock '
+        'ON inventory_items (is_low_stock)'
+    ))
+
+
+def _add_query_indexes(connection):
+    """2: indexes for the order, inventory and order item access paths"""
+    for name, table, columns in (
+        ('ix_inventory_items_category', 'inventory_items', 'category'),
+        ('ix_tailoring_orders_order_date', 'tailoring_orders', 'order_date'),
+        ('ix_tailoring_orders_status_order_date', 'tailoring_orders', 'status, order_date'),
+        ('ix_tailoring_orders_customer_order_date', 'tailoring_orders', 'customer_id, order_date'),
+        ('ix_order_items_order_id', 'order_items', 'order_id'),
+        ('ix_order_items_inventory_item_id', 'order_items', 'inventory_item_id'),
+    ):
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+    # Statistics gathered on empty tables (including the FTS shadow tables)
+    # make the planner pick scans that slow inserts down as the tables grow
+    if connection.execute(text('SELECT 1 FROM tailoring_orders LIMIT 1')).first():
+        connection.execute(text('ANALYZE'))
+
+
+def _add_search_indexes(connection):
+    """3: FTS5 search tables over customers and inventory items"""
+    create_search_indexes(connection)
+
+
+def _add_updated_at_index(connection):
+    """4: index for reloading orders changed since a point in time"""
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_tailoring_orders_updated_at '
+        'ON tailoring_orders (updated_at)'
+    ))
+
+
+def _add_completed_at(connection):
+    """5: tailoring_orders.completed_at, backfilled for completed orders"""
+    if not _has_column(connection, 'tailoring_orders', 'completed_at'):
+        connection.execute(text('ALTER TABLE tailoring_orders ADD COLUMN completed_at DATETIME'))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_tailoring_orders_completed_at '
+        'ON tailoring_orders (completed_at)'
+    ))
+    # The stock deduction recorded in the ledger is the best record of when an
+    # order was completed; older orders fall back to their last update
+    completed = 'updated_at'
+    if inspect(connection).has_table('stock_movements'):
+        completed = (
+            'coalesce((SELECT min(created_at) FROM stock_movements '
+            "WHERE order_id = tailoring_orders.id AND reason = 'order_completion'), updated_at)"
+        )
+    connection.execute(text(
+        f'UPDATE tailoring_orders SET completed_at = {completed} '
+        "WHERE completed_at IS NULL AND status IN ('completed', 'delivered')"
+    ))
+
+
+def _add_import_index(connection):
+    """6: index for matching imported rows to items by name and supplier"""
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_inventory_items_name_supplier '
+        'ON inventory_items (name, supplier_name)'
+    ))
+
+
+def _add_financial_rollups(connection):
+    """7: financial_rollups table, built from the existing orders"""
+    FinancialRollup.__table__.create(connection, checkfirst=True)
+    if all(_has_column(connection, 'tailoring_orders', column) for column in ROLLUP_FIELDS):
+        build_financial_rollups(connection)
+
+
+def _add_replication_heartbeat(connection):
+    """8: replication_heartbeat table, the replica lag marker"""
+    ReplicationHeartbeat.__table__.create(connection, checkfirst=True)
+
+
+MIGRATIONS = [
+    _add_low_stock_flag,
+    _add_query_indexes,
+    _add_search_indexes,
+    _add_updated_at_index,
+    _add_completed_at,
+    _add_import_index,
+    _add_financial_rollups,
+    _add_replication_heartbeat,
+]
+
+
+def schema_version(connection):
+    return connection.execute(text('PRAGMA user_version')).scalar()
+
+
+def run_migrations(connection):
+    """Apply pending migrations on a connection; returns how many ran"""
+    version = schema_version(connection)
+    pending = MIGRATIONS[version:]
+    for number, migration in enumerate(pending, start=version + 1):
+        migration(connection)
+        connection.execute(text(f'PRAGMA user_version = {number}'))
+    return len(pending)
+
+
+def upgrade_database():
+    """Create missing tables and apply pending migrations (app context)"""
+    db.create_all()
+    with db.engine.begin() as connection:
+        return run_migrations(connection)
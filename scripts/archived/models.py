@@ -4,8 +4,11 @@ Database Models
 """
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload
 
-db = SQLAlchemy()
+from routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class Customer(db.Model):
@@ -45,6 +48,8 @@ class InventoryItem(db.Model):
     unit = db.Column(db.String(20), nullable=False)  # meters, pieces, yards, etc.
     price_per_unit = db.Column(db.Float, nullable=False)
     reorder_level = db.Column(db.Float, default=10)  # Low stock alert threshold
+    # Computed by the database on every write and indexed for /api/inventory/low-stock
+    is_low_stock = db.Column(db.Boolean, db.Computed('quantity <= reorder_level'), index=True)
     supplier_name = db.Column(db.String(100))
     supplier_contact = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -53,6 +58,13 @@ class InventoryItem(db.Model):
     # Relationships
     order_items = db.relationship('OrderItem', back_populates='inventory_item')
     
+    __table_args__ = (
+        # ?category= lists, paged by id (the rowid is the implicit last key)
+        db.Index('ix_inventory_items_category', 'category'),
+        # Imports match existing items by name and supplier
+        db.Index('ix_inventory_items_name_supplier', 'name', 'supplier_name'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -65,7 +77,7 @@ class InventoryItem(db.Model):
             'reorder_level': self.reorder_level,
             'supplier_name': self.supplier_name,
             'supplier_contact': self.supplier_contact,
-            'is_low_stock': self.quantity <= self.reorder_level,
+            'is_low_stock': bool(self.is_low_stock),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -79,6 +91,7 @@ class TailoringOrder(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
     order_date = db.Column(db.DateTime, default=datetime.utcnow)
     delivery_date = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)  # set when stock is deducted
     status = db.Column(db.String(20), default='pending')  # pending, in_progress, completed, delivered
     garment_type = db.Column(db.String(50), nullable=False)  # shirt, pant, suit, dress, etc.
     
@@ -104,6 +117,17 @@ class TailoringOrder(db.Model):
     customer = db.relationship('Customer', back_populates='orders')
     order_items = db.relationship('OrderItem', back_populates='order', cascade='all, delete-orphan')
     
+    # Order lists are filtered by status or customer and paged by (order_date, id);
+    # the sizing matrix reloads orders by updated_at and forecasts read
+    # consumption by completed_at
+    __table_args__ = (
+        db.Index('ix_tailoring_orders_order_date', 'order_date'),
+        db.Index('ix_tailoring_orders_status_order_date', 'status', 'order_date'),
+        db.Index('ix_tailoring_orders_customer_order_date', 'customer_id', 'order_date'),
+        db.Index('ix_tailoring_orders_updated_at', 'updated_at'),
+        db.Index('ix_tailoring_orders_completed_at', 'completed_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -111,6 +135,7 @@ class TailoringOrder(db.Model):
             'customer_name': self.customer.name if self.customer else None,
             'order_date': self.order_date.isoformat() if self.order_date else None,
             'delivery_date': self.delivery_date.isoformat() if self.delivery_date else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'status': self.status,
             'garment_type': self.garment_type,
             'measurements': {
@@ -138,8 +163,8 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('tailoring_orders.id'), nullable=False)
-    inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_items.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('tailoring_orders.id'), nullable=False, index=True)
+    inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_items.id'), nullable=False, index=True)
     quantity_used = db.Column(db.Float, nullable=False)
     
     # Relationships
@@ -155,3 +180,136 @@ class OrderItem(db.Model):
             'quantity_used': self.quantity_used,
             'unit': self.inventory_item.unit if self.inventory_item else None
         }
+
+
+class StockMovement(db.Model):
+    """Append-only ledger of every change to InventoryItem.quantity"""
+    __tablename__ = 'stock_movements'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_items.id', ondelete='CASCADE'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('tailoring_orders.id', ondelete='SET NULL'))
+    delta = db.Column(db.Float, nullable=False)
+    reason = db.Column(db.String(30), nullable=False)  # opening_balance, initial, adjustment, order_completion
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_stock_movements_item_created', 'inventory_item_id', 'created_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'inventory_item_id': self.inventory_item_id,
+            'order_id': self.order_id,
+            'delta': self.delta,
+            'reason': self.reason,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class StockSnapshot(db.Model):
+    """Stock level of an item after a given ledger movement"""
+    __tablename__ = 'stock_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_items.id', ondelete='CASCADE'), nullable=False)
+    movement_id = db.Column(db.Integer, nullable=False)  # last movement included in quantity
+    quantity = db.Column(db.Float, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_stock_snapshots_item_taken', 'inventory_item_id', 'taken_at'),
+    )
+
+
+class DemandForecast(db.Model):
+    """Forecast daily consumption of an inventory item (see forecasting.py)"""
+    __tablename__ = 'demand_forecasts'
+    
+    inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_items.id', ondelete='CASCADE'), primary_key=True)
+    as_of = db.Column(db.Date, nullable=False)  # history runs up to the day before
+    completions = db.Column(db.Integer, nullable=False)  # completed orders when computed
+    completed_through = db.Column(db.DateTime)  # latest completion when computed
+    moving_average = db.Column(db.Float, nullable=False)
+    smoothed = db.Column(db.Float, nullable=False)
+    daily_std = db.Column(db.Float, nullable=False)
+    reorder_level = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class StatCounter(db.Model):
+    """Dashboard counters kept up to date on every write (see stats.py)"""
+    __tablename__ = 'stat_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)  # customers, low_stock_items, orders:<status>, etc.
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class FinancialRollup(db.Model):
+    """Order totals per day or month, status and garment type (see reports.py)"""
+    __tablename__ = 'financial_rollups'
+
+    period = db.Column(db.String(5), primary_key=True)  # day, month
+    period_start = db.Column(db.Date, primary_key=True)  # by order_date
+    status = db.Column(db.String(20), primary_key=True)
+    garment_type = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)  # sum of total_price
+    advance = db.Column(db.Float, nullable=False, default=0)  # sum of advance_payment
+
+
+class ReplicationHeartbeat(db.Model):
+    """Single row stamped by every committed write on the primary (see routing.py)"""
+    __tablename__ = 'replication_heartbeat'
+
+    id = db.Column(db.Integer, primary_key=True)
+    written_at = db.Column(db.DateTime, nullable=False)
+
+
+class Job(db.Model):
+    """Background job in the persistent queue (see jobs.py)"""
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # low_stock_alert, rebuild_forecasts, etc.
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # not before; retries back off
+    locked_by = db.Column(db.String(100))  # worker running it
+    locked_at = db.Column(db.DateTime)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)  # last failure
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Workers claim the oldest due job: WHERE status = 'queued' AND run_at <= now
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+# Eager loading for TailoringOrder.to_dict(), which touches the customer, every
+# order item and each item's inventory row, so a single order is loaded with
+# one joined query. Order lists bypass the ORM (see serializers.py).
+ORDER_DETAIL_LOADING = (
+    joinedload(TailoringOrder.customer),
+    joinedload(TailoringOrder.order_items).joinedload(OrderItem.inventory_item)
+)
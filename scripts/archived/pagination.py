@@ -0,0 +1,120 @@
+"""
+Hamees Attire Inventory Management System
+Keyset Pagination and Streaming Helpers
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask import Response, stream_with_context
+from sqlalchemy import DateTime, and_, or_
+
+from models import db
+from serializers import dumps
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+
+class PaginationError(ValueError):
+    """Raised when the limit or after query parameters are invalid"""
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    payload = json.dumps([
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, key_columns):
+    """Decode a cursor produced by encode_cursor back into sort key values"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(key_columns):
+        raise PaginationError('Invalid cursor')
+
+    decoded = []
+    for column, value in zip(key_columns, values):
+        try:
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value) if value is not None else None
+            else:
+                value = int(value)
+        except (ValueError, TypeError):
+            raise PaginationError('Invalid cursor')
+        decoded.append(value)
+    return decoded
+
+
+def parse_limit(raw_limit):
+    """Validate the limit query parameter"""
+    if raw_limit is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw_limit)
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise PaginationError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit
+
+
+def keyset_filter(key_columns, values):
+    """Build the row-value comparison (k1, k2, ...) > (v1, v2, ...)
+
+    SQLite sorts NULLs first, so every non-NULL value comes after a NULL one
+    and nothing comes before it; ``== None`` already renders as IS NULL.
+    """
+    clauses = []
+    for i, column in enumerate(key_columns):
+        equal = [key_columns[j] == values[j] for j in range(i)]
+        after = column.is_not(None) if values[i] is None else column > values[i]
+        clauses.append(and_(*equal, after))
+    return or_(*clauses)
+
+
+def apply_cursor(statement, key_columns, after):
+    """Restrict a select to rows after the cursor and order it by the key"""
+    if after:
+        statement = statement.where(keyset_filter(key_columns, decode_cursor(after, key_columns)))
+    return statement.order_by(*key_columns)
+
+
+def paginate(statement, key_columns, args):
+    """Return one page of rows and the cursor for the next page (or None)
+
+    The select must include the key columns under their own names.
+    """
+    limit = parse_limit(args.get('limit'))
+    statement = apply_cursor(statement, key_columns, args.get('after'))
+
+    # Fetch one extra row to know whether another page exists
+    rows = db.session.execute(statement.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in key_columns])
+    return rows, next_cursor
+
+
+def stream_json_array(statement, serialize, batch_size=STREAM_BATCH_SIZE):
+    """Stream a select as a JSON array, fetching and serializing batch_size rows at a time"""
+    def generate():
+        result = db.session.execute(statement.execution_options(yield_per=batch_size))
+        yield b'['
+        first = True
+        for rows in result.partitions():
+            chunk = b','.join(dumps(obj) for obj in serialize(rows))
+            yield chunk if first else b',' + chunk
+            first = False
+        yield b']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
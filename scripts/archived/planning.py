@@ -0,0 +1,108 @@
+"""
+Hamees Attire Inventory Management System
+Material Requirements
+
+Stock is only deducted when an order is completed, so the fabric that open
+(pending or in progress) orders will use is still counted in
+``InventoryItem.quantity``. ``material_requirements()`` adds up that reserved
+demand per item with one grouped aggregate over the items of open orders,
+which the (status, order_date) and order_items(order_id) indexes find without
+a table scan, and loads the orders behind each shortfall (the ones due first) with
+one more query.
+"""
+from collections import defaultdict
+
+from sqlalchemy import func, select
+
+from models import db, InventoryItem, TailoringOrder, OrderItem
+
+OPEN_STATUSES = ('pending', 'in_progress')
+
+# Orders listed per short item; open_orders has the full count
+MAX_SHORTFALL_ORDERS = 20
+
+
+def open_order_ids():
+    return select(TailoringOrder.id).where(TailoringOrder.status.in_(OPEN_STATUSES))
+
+
+def reserved_demand_query():
+    """(item, reserved quantity, open order count) for every item open orders use"""
+    # Filtering order_items by an IN (open orders) subquery, rather than joining,
+    # keeps SQLite from walking every order item in inventory_item_id order
+    demand = (
+        select(
+            OrderItem.inventory_item_id,
+            func.sum(OrderItem.quantity_used).label('reserved'),
+            func.count(OrderItem.order_id.distinct()).label('open_orders'),
+        )
+        .where(OrderItem.order_id.in_(open_order_ids()))
+        .group_by(OrderItem.inventory_item_id)
+        .subquery()
+    )
+    return (
+        select(InventoryItem.id, InventoryItem.name, InventoryItem.unit, InventoryItem.quantity,
+               demand.c.reserved, demand.c.open_orders)
+        .join(demand, demand.c.inventory_item_id == InventoryItem.id)
+    )
+
+
+def shortfall_orders(item_ids, per_item=MAX_SHORTFALL_ORDERS):
+    """The open orders using each item that are due first"""
+    due_first = (TailoringOrder.delivery_date.is_(None), TailoringOrder.delivery_date,
+                 TailoringOrder.id)
+    ranked = (
+        select(OrderItem.inventory_item_id, TailoringOrder.id, TailoringOrder.status,
+               TailoringOrder.delivery_date,
+               func.sum(OrderItem.quantity_used).label('quantity_used'),
+               func.row_number().over(partition_by=OrderItem.inventory_item_id,
+                                      order_by=due_first).label('position'))
+        .join(TailoringOrder, TailoringOrder.id == OrderItem.order_id)
+        .where(OrderItem.inventory_item_id.in_(item_ids),
+               OrderItem.order_id.in_(open_order_ids()))
+        .group_by(OrderItem.inventory_item_id, TailoringOrder.id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(*list(ranked.c)[:-1])
+        .where(ranked.c.position <= per_item)
+        .order_by(ranked.c.inventory_item_id, ranked.c.position)
+    )
+    orders = defaultdict(list)
+    for item_id, order_id, status, delivery_date, quantity_used in rows:
+        orders[item_id].append({
+            'order_id': order_id,
+            'status': status,
+            'delivery_date': delivery_date.isoformat() if delivery_date else None,
+            'quantity_used': quantity_used,
+        })
+    return orders
+
+
+def material_requirements(shortfall_only=False):
+    """Reserved demand, free stock and shortfall per item, largest shortfall first"""
+    items = []
+    for item_id, name, unit, quantity, reserved, open_orders in db.session.execute(
+        reserved_demand_query()
+    ):
+        free = quantity - reserved
+        if shortfall_only and free >= 0:
+            continue
+        items.append({
+            'inventory_item_id': item_id,
+            'name': name,
+            'unit': unit,
+            'quantity': quantity,
+            'reserved': reserved,
+            'free': max(free, 0),
+            'shortfall': max(-free, 0),
+            'open_orders': open_orders,
+        })
+    items.sort(key=lambda item: (-item['shortfall'], item['name']))
+
+    short = [item['inventory_item_id'] for item in items if item['shortfall'] > 0]
+    orders = shortfall_orders(short) if short else {}
+    for item in items:
+        if item['shortfall'] > 0:
+            item['orders'] = orders[item['inventory_item_id']]
+    return {'items': items, 'shortfall_items': len(short)}
@@ -0,0 +1,187 @@
+"""
+Hamees Attire Inventory Management System
+Request Profiling
+
+Every request records how many SQL statements it sent and how long they took
+to execute (SQLAlchemy engine events), and how long it spent turning rows
+into dictionaries and encoding JSON (the serializers in serializers.py and
+``jsonify``). The rest of the time, ORM loading and handler code, is reported
+as ``app``. The numbers go into a ``Server-Timing`` header, which browser
+developer tools display, and into one JSON log line per request on the
+``hamees.requests`` logger.
+
+With ``PROFILE_SLOW_QUERIES=N`` the log line also lists the N slowest
+statements of the request with their ``EXPLAIN QUERY PLAN``. The plans are
+taken after the response is built, so they do not affect the timings.
+Streamed responses are timed up to their first byte.
+"""
+import heapq
+import itertools
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db
+
+PROFILE_KEY = 'request_profile'
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with')
+
+logger = logging.getLogger('hamees.requests')
+
+
+class RequestProfile:
+    """SQL and serialization timings for one request"""
+
+    def __init__(self, slow_query_count=0):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.slow_query_count = slow_query_count
+        self.slow_queries = []  # min-heap of (duration, sequence, engine, statement, parameters)
+        self._sequence = itertools.count()
+
+    def add_query(self, duration, engine, statement, parameters, executemany):
+        self.queries += 1
+        self.db_time += duration
+        if self.slow_query_count and not executemany:
+            entry = (duration, next(self._sequence), engine, statement, parameters)
+            if len(self.slow_queries) < self.slow_query_count:
+                heapq.heappush(self.slow_queries, entry)
+            elif duration > self.slow_queries[0][0]:
+                heapq.heapreplace(self.slow_queries, entry)
+
+    def timings(self):
+        """Milliseconds spent in SQL, serialization, everything else and in total"""
+        total = time.perf_counter() - self.start
+        db_ms, serialize_ms = self.db_time * 1000, self.serialize_time * 1000
+        total_ms = total * 1000
+        return {'db': db_ms, 'serialize': serialize_ms,
+                'app': max(0.0, total_ms - db_ms - serialize_ms), 'total': total_ms}
+
+
+def current_profile():
+    return g.get(PROFILE_KEY) if has_app_context() else None
+
+
+@contextmanager
+def timed_serialization():
+    """Count the time inside the block as serialization, less any SQL it runs"""
+    profile = current_profile()
+    if profile is None or profile.serializing:
+        yield
+        return
+    profile.serializing = True
+    start, db_time = time.perf_counter(), profile.db_time
+    try:
+        yield
+    finally:
+        profile.serializing = False
+        profile.serialize_time += time.perf_counter() - start - (profile.db_time - db_time)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with encoding counted as serialization"""
+
+    def dumps(self, obj, **kwargs):
+        with timed_serialization():
+            return super().dumps(obj, **kwargs)
+
+
+def server_timing(profile, timings):
+    return ', '.join([
+        f'db;dur={timings["db"]:.2f};desc="queries: {profile.queries}"',
+        f'serialize;dur={timings["serialize"]:.2f}',
+        f'app;dur={timings["app"]:.2f}',
+        f'total;dur={timings["total"]:.2f}',
+    ])
+
+
+def explain(engine, statement, parameters):
+    """Query plan lines for a statement, run on the request's session"""
+    if not statement.lstrip().lower().startswith(EXPLAINABLE):
+        return []
+    prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    try:
+        connection = db.session.connection(bind_arguments={'bind': engine})
+        rows = connection.exec_driver_sql(prefix + statement, parameters)
+        return [str(row[-1]) for row in rows]
+    except SQLAlchemyError as e:
+        return [f'EXPLAIN failed: {e.__class__.__name__}']
+
+
+class RequestProfiler:
+    """Times SQL and serialization per request; reports them in headers and logs"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REQUEST_PROFILING', True)
+        app.config.setdefault('PROFILE_SLOW_QUERIES', 0)
+        app.json = TimedJSONProvider(app)
+        with app.app_context():
+            for engine in db.engines.values():
+                self.instrument_engine(engine)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        if not logger.hasHandlers():
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+        if logger.level == logging.NOTSET:
+            logger.setLevel(logging.INFO)
+        app.extensions['request_profiler'] = self
+
+    def instrument_engine(self, engine):
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            conn.info['query_start'] = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def end_query(conn, cursor, statement, parameters, context, executemany):
+            duration = time.perf_counter() - conn.info['query_start']
+            profile = current_profile()
+            if profile is not None:
+                profile.add_query(duration, conn.engine, statement, parameters, executemany)
+
+    def start_request(self):
+        if current_app.config['REQUEST_PROFILING']:
+            g.setdefault(PROFILE_KEY, RequestProfile(current_app.config['PROFILE_SLOW_QUERIES']))
+
+    def finish_request(self, response):
+        profile = g.pop(PROFILE_KEY, None)
+        if profile is None:
+            return response
+        timings = profile.timings()
+        response.headers['Server-Timing'] = server_timing(profile, timings)
+        if not logger.isEnabledFor(logging.INFO):
+            return response
+
+        record = {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': response.status_code,
+            'queries': profile.queries,
+            **{f'{name}_ms': round(value, 2) for name, value in timings.items()},
+        }
+        if profile.slow_queries:
+            record['slow_queries'] = [
+                {'ms': round(duration * 1000, 2), 'sql': statement,
+                 'plan': explain(engine, statement, parameters)}
+                for duration, _, engine, statement, parameters
+                in sorted(profile.slow_queries, reverse=True)
+            ]
+        logger.info(json.dumps(record, default=str))
+        return response
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,297 @@
+"""
+Hamees Attire Inventory Management System
+Financial Reports
+
+Revenue (``total_price``), advance collected (``advance_payment``) and the
+balance due of orders are kept pre-aggregated in ``financial_rollups``: one
+row per day and one per month for every status and garment type, by order
+date. A ``before_flush`` hook moves each added, changed or deleted order in
+and out of its rows in the same transaction, as do the Core writes that
+bypass the ORM (completing an order, bulk imports), so the rollups never
+trail the orders.
+
+``financial_report()`` answers any date range from whole months, the whole
+days at either end and, where the range starts or ends mid-day, the raw
+orders of those partial days. For [2024-01-15 12:00, 2024-04-10 00:00):
+
+    orders 2024-01-15 12:00 - 24:00     raw rows (index on order_date)
+    days   2024-01-16 .. 2024-01-31     daily rollups
+    months 2024-02 .. 2024-03           monthly rollups
+    days   2024-04-01 .. 2024-04-09     daily rollups
+
+so even a report over years reads a few thousand rollup rows.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+
+from sqlalchemy import Date, and_, bindparam, delete, event, func, insert, or_, select, tuple_, update
+
+from models import db, FinancialRollup, TailoringOrder
+from stats import committed_value, flushed_value
+
+INTERVALS = ('day', 'month')
+
+# Order attributes a rollup row depends on, in adjust_financial_rollups() order
+ROLLUP_FIELDS = ('order_date', 'status', 'garment_type', 'total_price', 'advance_payment')
+
+rollups = FinancialRollup.__table__
+ROLLUP_KEY = (rollups.c.period, rollups.c.period_start, rollups.c.status, rollups.c.garment_type)
+
+
+class ReportError(ValueError):
+    """Raised when a report request has invalid parameters"""
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def midnight(value):
+    return datetime.combine(value.date(), time())
+
+
+def adjust_financial_rollups(connection, changes):
+    """Apply order changes to the rollups in the connection's transaction
+
+    Each change is ``(sign, order_date, status, garment_type, total_price,
+    advance_payment)``: sign 1 for an order that now counts, -1 for its old
+    values or a deleted order.
+    """
+    default_status = TailoringOrder.status.default.arg
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for sign, order_date, status, garment_type, total_price, advance in changes:
+        if order_date is None:
+            continue
+        day = order_date.date()
+        for period, start in (('day', day), ('month', month_start(day))):
+            delta = deltas[(period, start, status or default_status, garment_type)]
+            delta[0] += sign
+            delta[1] += sign * (total_price or 0)
+            delta[2] += sign * (advance or 0)
+    rows = [
+        {'k_period': period, 'k_start': start, 'k_status': status, 'k_garment': garment,
+         'd_orders': orders, 'd_revenue': revenue, 'd_advance': advance}
+        for (period, start, status, garment), (orders, revenue, advance) in deltas.items()
+        if orders or revenue or advance
+    ]
+    if not rows:
+        return
+    result = connection.execute(
+        update(rollups)
+        .where(*(column == bindparam(name) for column, name
+                 in zip(ROLLUP_KEY, ('k_period', 'k_start', 'k_status', 'k_garment'))))
+        .values(orders=rollups.c.orders + bindparam('d_orders'),
+                revenue=rollups.c.revenue + bindparam('d_revenue'),
+                advance=rollups.c.advance + bindparam('d_advance')),
+        rows
+    )
+    if result.rowcount < len(rows):
+        keys = [(row['k_period'], row['k_start'], row['k_status'], row['k_garment'])
+                for row in rows]
+        existing = {tuple(key) for key in connection.execute(
+            select(*ROLLUP_KEY).where(tuple_(*ROLLUP_KEY).in_(keys)))}
+        connection.execute(insert(rollups), [
+            {'period': key[0], 'period_start': key[1], 'status': key[2], 'garment_type': key[3],
+             'orders': row['d_orders'], 'revenue': row['d_revenue'], 'advance': row['d_advance']}
+            for key, row in zip(keys, rows) if key not in existing
+        ])
+
+
+def _order_values(order, value):
+    return tuple(value(order, field) for field in ROLLUP_FIELDS)
+
+
+@event.listens_for(db.session, 'before_flush')
+def track_financial_rollups(session, flush_context, instances):
+    """Apply this flush's orders to the rollups in the same transaction"""
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, TailoringOrder):
+            if obj.order_date is None:
+                # Fix the default now, so the order and its rollup agree on the day
+                obj.order_date = datetime.utcnow()
+            changes.append((1, *_order_values(obj, flushed_value)))
+    for obj in session.deleted:
+        if isinstance(obj, TailoringOrder):
+            changes.append((-1, *_order_values(obj, committed_value)))
+    for obj in session.dirty:
+        if not isinstance(obj, TailoringOrder) or obj in session.deleted \
+                or not session.is_modified(obj):
+            continue
+        old, new = _order_values(obj, committed_value), _order_values(obj, flushed_value)
+        if old != new:
+            changes.extend([(-1, *old), (1, *new)])
+    if changes:
+        adjust_financial_rollups(session.connection(), changes)
+
+
+def build_financial_rollups(connection):
+    """Recompute the rollups from the orders; returns the number of daily rows"""
+    day = func.date(TailoringOrder.order_date, type_=Date)
+    status = func.coalesce(TailoringOrder.status, TailoringOrder.status.default.arg)
+    daily = connection.execute(
+        select(day, status, TailoringOrder.garment_type, func.count(),
+               func.sum(TailoringOrder.total_price),
+               func.coalesce(func.sum(TailoringOrder.advance_payment), 0))
+        .where(TailoringOrder.order_date.is_not(None))
+        .group_by(day, status, TailoringOrder.garment_type)
+    ).all()
+    monthly = defaultdict(lambda: [0, 0.0, 0.0])
+    for start, status, garment_type, orders, revenue, advance in daily:
+        totals = monthly[(month_start(start), status, garment_type)]
+        totals[0] += orders
+        totals[1] += revenue
+        totals[2] += advance
+
+    connection.execute(delete(rollups))
+    rows = [
+        {'period': 'day', 'period_start': start, 'status': status, 'garment_type': garment_type,
+         'orders': orders, 'revenue': revenue, 'advance': advance}
+        for start, status, garment_type, orders, revenue, advance in daily
+    ] + [
+        {'period': 'month', 'period_start': start, 'status': status,
+         'garment_type': garment_type, 'orders': orders, 'revenue': revenue, 'advance': advance}
+        for (start, status, garment_type), (orders, revenue, advance) in monthly.items()
+    ]
+    if rows:
+        connection.execute(insert(rollups), rows)
+    return len(daily)
+
+
+def rebuild_financial_rollups():
+    """Recompute the rollups (call after bulk loads)"""
+    count = build_financial_rollups(db.session.connection())
+    db.session.commit()
+    return count
+
+
+def _parse_time(text, name, end=False):
+    try:
+        value = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise ReportError(f'{name} must be an ISO 8601 date')
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if end and len(text) == 10:
+        # A date alone includes that whole day
+        value += timedelta(days=1)
+    return value
+
+
+def parse_report_args(args):
+    """(start, end, interval) from ?from=&to=&interval=; end is exclusive"""
+    interval = args.get('interval') or None
+    if interval not in (None, *INTERVALS):
+        raise ReportError(f"interval must be one of {', '.join(INTERVALS)}")
+    end = _parse_time(args['to'], 'to', end=True) if args.get('to') else datetime.utcnow()
+    if args.get('from'):
+        start = _parse_time(args['from'], 'from')
+    else:
+        first = db.session.execute(
+            select(func.min(FinancialRollup.period_start))
+            .where(FinancialRollup.period == 'month')
+        ).scalar()
+        start = min(datetime.combine(first, time()), end) if first else end
+    if start > end:
+        raise ReportError('from must not be after to')
+    return start, end, interval
+
+
+def report_segments(start, end, monthly=True):
+    """Split [start, end) into (raw, days, months) lists of [low, high) ranges
+
+    Raw ranges are the partial days at the ends, as datetimes; day and month
+    ranges are dates, served by the rollups.
+    """
+    first = start if start == midnight(start) else midnight(start) + timedelta(days=1)
+    last = midnight(end)
+    if first >= last:
+        return ([(start, end)] if start < end else []), [], []
+    raw = [(low, high) for low, high in ((start, first), (last, end)) if low < high]
+    first_day, last_day = first.date(), last.date()
+    first_month = first_day if first_day.day == 1 else next_month(first_day)
+    last_month = month_start(last_day)
+    if not monthly or first_month >= last_month:
+        return raw, [(first_day, last_day)], []
+    days = [(low, high) for low, high in ((first_day, first_month), (last_month, last_day))
+            if low < high]
+    return raw, days, [(first_month, last_month)]
+
+
+def _in_ranges(column, ranges):
+    return or_(*(and_(column >= low, column < high) for low, high in ranges))
+
+
+def _amounts(orders, revenue, advance):
+    return {
+        'orders': orders,
+        'revenue': round(revenue, 2),
+        'advance_collected': round(advance, 2),
+        'balance_due': round(revenue - advance, 2)
+    }
+
+
+def financial_report(start, end, interval=None):
+    """Orders, revenue, advance collected and balance due for [start, end)
+
+    Totals, by status and by garment type, plus one entry per day or month
+    with an interval.
+    """
+    raw, days, months = report_segments(start, end, monthly=interval != 'day')
+    # (period label, status, garment_type) -> [orders, revenue, advance]
+    sums = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def add(rows):
+        for day, status, garment_type, orders, revenue, advance in rows:
+            label = (None if interval is None else
+                     day.isoformat() if interval == 'day' else day.strftime('%Y-%m'))
+            totals = sums[(label, status, garment_type)]
+            totals[0] += orders
+            totals[1] += revenue
+            totals[2] += advance
+
+    for period, ranges in (('day', days), ('month', months)):
+        if ranges:
+            add(db.session.execute(
+                select(rollups.c.period_start, rollups.c.status, rollups.c.garment_type,
+                       rollups.c.orders, rollups.c.revenue, rollups.c.advance)
+                .where(rollups.c.period == period, _in_ranges(rollups.c.period_start, ranges))
+            ))
+    if raw:
+        day = func.date(TailoringOrder.order_date, type_=Date)
+        status = func.coalesce(TailoringOrder.status, TailoringOrder.status.default.arg)
+        add(db.session.execute(
+            select(day, status, TailoringOrder.garment_type, func.count(),
+                   func.sum(TailoringOrder.total_price),
+                   func.coalesce(func.sum(TailoringOrder.advance_payment), 0))
+            .where(_in_ranges(TailoringOrder.order_date, raw))
+            .group_by(day, status, TailoringOrder.garment_type)
+        ))
+
+    def grouped(position):
+        groups = defaultdict(lambda: [0, 0.0, 0.0])
+        for key, values in sums.items():
+            totals = groups[key[position] if position is not None else None]
+            for i, value in enumerate(values):
+                totals[i] += value
+        # Rollup rows of orders that have since moved away count nothing
+        return {key: _amounts(*values)
+                for key, values in sorted(groups.items(), key=lambda item: item[0] or '')
+                if values[0]}
+
+    report = {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'totals': grouped(None).get(None, _amounts(0, 0.0, 0.0)),
+        'by_status': grouped(1),
+        'by_garment_type': grouped(2),
+    }
+    if interval:
+        report['interval'] = interval
+        report['periods'] = [{'period': period, **amounts}
+                             for period, amounts in grouped(0).items()]
+    return report
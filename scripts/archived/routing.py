@@ -0,0 +1,180 @@
+"""
+Hamees Attire Inventory Management System
+Read Replica Routing
+
+With ``DATABASE_REPLICA_URL`` set, the ``replica`` bind is a second engine and
+GET requests read from it, keeping reports, lists and exports off the primary
+that takes the orders. Everything else uses the primary, and so does a GET as
+soon as its session writes (a flush or an INSERT/UPDATE/DELETE statement).
+
+A GET reads from the primary instead when:
+
+- the client wrote within ``REPLICA_STICKY_SECONDS``. Successful writes set a
+  cookie holding the time until which that client reads from the primary, so
+  it always sees its own changes.
+- the replica is behind. Every transaction that writes on the primary
+  stamps the single ``replication_heartbeat`` row as it commits, whatever
+  the tables it changed. The stamp on both databases is compared at most
+  every ``REPLICA_LAG_CHECK_SECONDS`` per worker; a difference over
+  ``REPLICA_MAX_LAG_SECONDS``, or a replica that cannot be reached, sends
+  reads to the primary until the next check.
+
+Replica connections are opened read-only where the database supports it
+(``PRAGMA query_only`` on SQLite; see database.py).
+"""
+import logging
+import math
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import DateTime, Integer, column, event, insert, select, table, update
+from sqlalchemy.exc import SQLAlchemyError
+
+REPLICA_BIND = 'replica'
+PRIMARY_COOKIE = 'hamees_primary_until'
+READ_METHODS = ('GET', 'HEAD')
+WROTE_KEY = 'replication_wrote'
+
+# The lag marker (models.ReplicationHeartbeat, which cannot be imported here)
+HEARTBEAT = table('replication_heartbeat', column('id', Integer), column('written_at', DateTime))
+
+logger = logging.getLogger('hamees.replica')
+
+
+def reading_from_replica():
+    """Whether the current request was routed to the replica"""
+    return has_request_context() and g.get('read_from_replica', False)
+
+
+def stamp_heartbeat(engine):
+    """Stamp the heartbeat row in every transaction that writes on the engine"""
+    @event.listens_for(engine, 'after_cursor_execute')
+    def note_write(conn, cursor, statement, parameters, context, executemany):
+        if context.isinsert or context.isupdate or context.isdelete:
+            conn.info[WROTE_KEY] = True
+
+    @event.listens_for(engine, 'commit')
+    def write_heartbeat(conn):
+        if conn.info.get(WROTE_KEY):
+            now = datetime.utcnow()
+            stamped = conn.execute(update(HEARTBEAT).where(HEARTBEAT.c.id == 1)
+                                   .values(written_at=now)).rowcount
+            if not stamped:
+                conn.execute(insert(HEARTBEAT).values(id=1, written_at=now))
+        conn.info.pop(WROTE_KEY, None)
+
+    @event.listens_for(engine, 'rollback')
+    def forget_write(conn):
+        conn.info.pop(WROTE_KEY, None)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends the reads of replica requests to the replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and reading_from_replica() and not self._uses_primary(clause):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _uses_primary(self, clause):
+        if self.info.get('use_primary'):
+            return True
+        if self._flushing or getattr(clause, 'is_dml', False):
+            # Later reads in the request must see the write, so stay on the primary
+            self.info['use_primary'] = True
+            return True
+        return False
+
+    @contextmanager
+    def primary(self):
+        """Run the block's statements on the primary, even in a replica request"""
+        previous = self.info.get('use_primary', False)
+        self.info['use_primary'] = True
+        try:
+            yield
+        finally:
+            self.info['use_primary'] = previous
+
+
+class ReplicaRouter:
+    """Picks the primary or the replica for each request"""
+
+    def __init__(self, app=None):
+        self._lag_checks = weakref.WeakKeyDictionary()  # replica engine -> (checked at, lag)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5.0)
+        app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 10.0)
+        app.config.setdefault('REPLICA_LAG_CHECK_SECONDS', 1.0)
+        app.extensions['replica_router'] = self
+        if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+            return
+        with app.app_context():
+            stamp_heartbeat(current_app.extensions['sqlalchemy'].engines[None])
+        app.before_request(self.route_request)
+        app.after_request(self.stick_to_primary)
+
+    def route_request(self):
+        max_lag = current_app.config['REPLICA_MAX_LAG_SECONDS']
+        g.read_from_replica = (request.method in READ_METHODS and not self._sticky()
+                               and self.replica_lag() <= max_lag)
+
+    def _sticky(self):
+        try:
+            return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def stick_to_primary(self, response):
+        """After a successful write, send the client's reads to the primary for a while"""
+        if request.method not in READ_METHODS and response.status_code < 400:
+            seconds = current_app.config['REPLICA_STICKY_SECONDS']
+            response.set_cookie(PRIMARY_COOKIE, f'{time.time() + seconds:.3f}',
+                                max_age=math.ceil(seconds), httponly=True, samesite='Lax')
+        return response
+
+    def replica_lag(self):
+        """Seconds the replica's heartbeat is behind the primary's, checked periodically"""
+        engines = current_app.extensions['sqlalchemy'].engines
+        replica = engines[REPLICA_BIND]
+        interval, now = current_app.config['REPLICA_LAG_CHECK_SECONDS'], time.monotonic()
+        checked_at, lag = self._lag_checks.get(replica, (None, None))
+        if checked_at is not None and now - checked_at < interval:
+            return lag
+        with self._lock:
+            # Another thread may have measured while this one waited
+            checked_at, lag = self._lag_checks.get(replica, (None, None))
+            if checked_at is not None and time.monotonic() - checked_at < interval:
+                return lag
+            lag = self._measure_lag(engines[None], replica)
+            self._lag_checks[replica] = (time.monotonic(), lag)
+        return lag
+
+    def _measure_lag(self, primary, replica):
+        stamp = select(HEARTBEAT.c.written_at).where(HEARTBEAT.c.id == 1)
+        try:
+            with replica.connect() as connection:
+                replica_stamp = connection.execute(stamp).scalar()
+        except SQLAlchemyError as e:
+            logger.warning('Replica unavailable, reading from the primary: %s', e)
+            return float('inf')
+        with primary.connect() as connection:
+            primary_stamp = connection.execute(stamp).scalar()
+        if primary_stamp is None:
+            return 0.0
+        if replica_stamp is None:
+            return float('inf')
+        return max(0.0, (primary_stamp - replica_stamp).total_seconds())
+
+
+replica_router = ReplicaRouter()
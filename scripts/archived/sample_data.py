@@ -2,12 +2,12 @@
 Sample Data Generator for Hamees Attire Inventory System
 Run this script to populate the database with sample data for testing
 """
-from app import app, db
-from models import Customer, InventoryItem, TailoringOrder, OrderItem
+from app import create_app
+from models import db, Customer, InventoryItem, TailoringOrder, OrderItem
 from datetime import datetime, timedelta
 
 
-def clear_database():
+def clear_database(app):
     """Clear all existing data"""
     with app.app_context():
         db.drop_all()
@@ -15,7 +15,7 @@ def clear_database():
         print("Database cleared and recreated.")
 
 
-def add_sample_data():
+def add_sample_data(app):
     """Add sample data to the database"""
     with app.app_context():
         # Add sample customers
@@ -322,9 +322,9 @@ def add_sample_data():
         print(f"  Customers: {Customer.query.count()}")
         print(f"  Inventory Items: {InventoryItem.query.count()}")
         print(f"  Orders: {TailoringOrder.query.count()}")
-        print(f"  Low Stock Items: {InventoryItem.query.filter(InventoryItem.quantity <= InventoryItem.reorder_level).count()}")
+        print(f"  Low Stock Items: {InventoryItem.query.filter_by(is_low_stock=True).count()}")
         print("\nLow Stock Items:")
-        low_stock = InventoryItem.query.filter(InventoryItem.quantity <= InventoryItem.reorder_level).all()
+        low_stock = InventoryItem.query.filter_by(is_low_stock=True).all()
         for item in low_stock:
             print(f"  - {item.name}: {item.quantity} {item.unit} (Reorder at: {item.reorder_level})")
 
@@ -335,8 +335,9 @@ if __name__ == '__main__':
     response = input("Continue? (yes/no): ")
     
     if response.lower().strip() in ['yes', 'y']:
-        clear_database()
-        add_sample_data()
+        app = create_app()
+        clear_database(app)
+        add_sample_data(app)
         print("\nYou can now start the application with: python app.py")
     else:
         print("Operation cancelled.")
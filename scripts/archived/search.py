@@ -0,0 +1,179 @@
+"""
+Hamees Attire Inventory Management System
+Full-Text Search
+
+Customers and inventory items are indexed in SQLite FTS5 virtual tables
+(``customers_fts`` and ``inventory_items_fts``) whose rowid is the id of the
+indexed row. Triggers on the base tables keep them in sync, so Core bulk
+inserts and raw SQL writes are indexed as well as ORM writes. Both tables
+keep prefix indexes, so the partial words typed at the front desk are matched
+without scanning the term list, and results are ordered by bm25 rank.
+
+Every match is ranked, so a word as common as "Khan" scores tens of
+thousands of rows at a million customers (see bench_search.py). Setting
+``SEARCH_RANK_CANDIDATES`` bounds that cost by ranking only the newest N
+matches (highest rowid, which FTS5 reads in index order and stops early);
+results are then the best of the most recent matches only, and an older
+customer who matches better may not be returned.
+
+Input that looks like a phone number is matched against the start of the
+number's digits, so "+92 300-12", "9230012" and "92-300-12" all find
++92-300-1234567. A single group of digits ("1234567") also matches any group
+of the stored number.
+"""
+import re
+
+from sqlalchemy import DDL, column, event, select, table, text
+
+from models import Customer, InventoryItem
+from serializers import CUSTOMERS, INVENTORY_ITEMS
+
+DEFAULT_RESULTS = 20
+MAX_RESULTS = 100
+
+TERM = re.compile(r'\w+')
+PHONE = re.compile(r'^[\d\s()+.-]+$')
+
+
+class SearchError(ValueError):
+    """Raised when a search query has nothing to search for"""
+
+
+def digits_only(expression):
+    """SQL expression stripping the usual phone number punctuation"""
+    for character in '-+(). ':
+        expression = f"replace({expression}, '{character}', '')"
+    return expression
+
+
+class SearchIndex:
+    """An FTS5 table mirroring some text columns of a model's table
+
+    ``columns`` maps each indexed column to the SQL expression computing it
+    from a base table row (``{row}`` is replaced by ``new.`` in triggers), and
+    ``weights`` gives the bm25 weight of each column in the same order.
+    """
+
+    def __init__(self, model, serializer, columns, weights, digits_column=None):
+        self.model = model
+        self.serializer = serializer
+        self.base = model.__table__.name
+        self.name = f'{self.base}_fts'
+        self.columns = columns
+        self.weights = weights
+        self.digits_column = digits_column
+        self.table = table(self.name, column('rowid'), column('rank'), column(self.name))
+
+    def values(self, row=''):
+        return ', '.join(expression.format(row=row) for expression in self.columns.values())
+
+    def watched_columns(self):
+        """Base table columns the indexed expressions read"""
+        return [name for name in self.model.__table__.columns.keys()
+                if any(f'{{row}}{name}' in expression for expression in self.columns.values())]
+
+    def ddl(self):
+        """Statements creating the FTS table and its triggers (idempotent)"""
+        names = ', '.join(self.columns)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.name} USING fts5({names}, '
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3 4 5 6')",
+            # Make ORDER BY rank use the column weights
+            f"INSERT INTO {self.name} ({self.name}, rank) VALUES ('rank', 'bm25({weights})')",
+            f'CREATE TRIGGER IF NOT EXISTS {self.name}_insert AFTER INSERT ON {self.base} BEGIN '
+            f'INSERT INTO {self.name} (rowid, {names}) VALUES (new.id, {self.values("new.")}); END',
+            f'CREATE TRIGGER IF NOT EXISTS {self.name}_delete AFTER DELETE ON {self.base} BEGIN '
+            f'DELETE FROM {self.name} WHERE rowid = old.id; END',
+            f'CREATE TRIGGER IF NOT EXISTS {self.name}_update '
+            f'AFTER UPDATE OF {", ".join(self.watched_columns())} ON {self.base} BEGIN '
+            f'DELETE FROM {self.name} WHERE rowid = old.id; '
+            f'INSERT INTO {self.name} (rowid, {names}) VALUES (new.id, {self.values("new.")}); END',
+        ]
+
+    def rebuild(self, connection):
+        """Re-index every row of the base table"""
+        connection.execute(text(f'DELETE FROM {self.name}'))
+        connection.execute(text(
+            f'INSERT INTO {self.name} (rowid, {", ".join(self.columns)}) '
+            f'SELECT id, {self.values()} FROM {self.base}'
+        ))
+
+    def match_expression(self, query):
+        """FTS5 query matching rows with a word starting with every typed term"""
+        terms = TERM.findall(query)
+        if not any(len(term) > 1 for term in terms):
+            raise SearchError('q must contain a word of at least 2 letters or digits')
+        if self.digits_column and PHONE.match(query):
+            expression = f'{self.digits_column} : "{"".join(terms)}"*'
+            return expression if len(terms) > 1 else f'{expression} OR "{terms[0]}"*'
+        # Quoting each term keeps FTS5 operators in the input from being parsed
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, query, limit=DEFAULT_RESULTS, candidates=None):
+        """Select the best ``limit`` matches, best first, in the serializer's shape
+
+        With ``candidates``, only that many of the newest matches are ranked.
+        """
+        matches = (
+            select(self.table.c.rowid.label('id'), self.table.c.rank.label('rank'))
+            .where(self.table.c[self.name].op('MATCH')(self.match_expression(query)))
+        )
+        if candidates:
+            newest = matches.order_by(self.table.c.rowid.desc()).limit(candidates).subquery()
+            hits = select(newest).order_by(newest.c.rank).limit(limit).subquery()
+        else:
+            hits = matches.order_by(self.table.c.rank).limit(limit).subquery()
+        return (
+            self.serializer.select()
+            .join(hits, hits.c.id == self.model.id)
+            .order_by(hits.c.rank)
+        )
+
+
+SEARCH_INDEXES = {
+    'customers': SearchIndex(
+        Customer, CUSTOMERS,
+        {'name': '{row}name', 'phone': '{row}phone', 'email': '{row}email',
+         'phone_digits': digits_only('{row}phone')},
+        weights=(10.0, 5.0, 2.0, 5.0),
+        digits_column='phone_digits'
+    ),
+    'inventory': SearchIndex(
+        InventoryItem, INVENTORY_ITEMS,
+        {'name': '{row}name', 'description': '{row}description',
+         'supplier_name': '{row}supplier_name'},
+        weights=(10.0, 1.0, 3.0)
+    ),
+}
+
+
+def create_search_indexes(connection):
+    """Create the FTS tables and triggers and index the existing rows"""
+    for index in SEARCH_INDEXES.values():
+        for statement in index.ddl():
+            connection.execute(text(statement))
+        index.rebuild(connection)
+
+
+def parse_result_limit(raw_limit):
+    """Validate the limit query parameter of a search"""
+    if raw_limit is None:
+        return DEFAULT_RESULTS
+    try:
+        limit = int(raw_limit)
+    except ValueError:
+        raise SearchError('limit must be an integer')
+    if limit < 1 or limit > MAX_RESULTS:
+        raise SearchError(f'limit must be between 1 and {MAX_RESULTS}')
+    return limit
+
+
+# Tables created by db.create_all() get their FTS table and triggers at once,
+# and db.drop_all() drops the FTS table with its base table.
+for _index in SEARCH_INDEXES.values():
+    for _statement in _index.ddl():
+        event.listen(_index.model.__table__, 'after_create',
+                     DDL(_statement).execute_if(dialect='sqlite'))
+    event.listen(_index.model.__table__, 'after_drop',
+                 DDL(f'DROP TABLE IF EXISTS {_index.name}').execute_if(dialect='sqlite'))
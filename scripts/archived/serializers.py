@@ -0,0 +1,166 @@
+"""
+Hamees Attire Inventory Management System
+Fast Serialization for List Endpoints
+
+List endpoints select only the columns they return, as plain row tuples, and
+map them to the same dictionaries the models' to_dict() methods produce. This
+skips building ORM instances entirely. Responses are encoded with a reused
+standard library encoder and are byte-identical to jsonify's output, so
+ETags do not depend on which optional packages are installed.
+"""
+import json
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Customer, InventoryItem, TailoringOrder, OrderItem
+from profiling import timed_serialization
+
+MEASUREMENT_FIELDS = ('chest', 'waist', 'shoulder', 'sleeve_length',
+                      'shirt_length', 'neck', 'hip', 'inseam')
+
+# SQLite allows at most 32766 bound parameters per statement
+IN_CLAUSE_BATCH = 5000
+
+_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+
+def dumps(obj):
+    """Encode to compact JSON bytes with sorted keys, as jsonify does"""
+    with timed_serialization():
+        return _encoder.encode(obj).encode()
+
+
+def json_response(payload, status=200):
+    """Equivalent of jsonify(payload) using the fast encoder"""
+    return current_app.response_class(dumps(payload) + b'\n', status=status,
+                                      mimetype='application/json')
+
+
+class RowSerializer:
+    """Selects a fixed set of columns and maps each row tuple to a dictionary
+
+    Rows are converted in batches, so subclasses can load related data for a
+    whole batch with one query.
+    """
+
+    def __init__(self, fields, datetime_fields=(), bool_fields=()):
+        self.fields = fields
+        self.keys = tuple(key for key, _ in fields)
+        self.datetime_fields = datetime_fields
+        self.bool_fields = bool_fields
+
+    def select(self):
+        return select(*(column.label(key) for key, column in self.fields))
+
+    def __call__(self, rows):
+        keys = self.keys
+        result = []
+        with timed_serialization():
+            for row in rows:
+                data = dict(zip(keys, row))
+                for key in self.datetime_fields:
+                    value = data[key]
+                    data[key] = value.isoformat() if value is not None else None
+                for key in self.bool_fields:
+                    data[key] = bool(data[key])
+                result.append(data)
+        return result
+
+
+class OrderSerializer(RowSerializer):
+    """TailoringOrder.to_dict() shape, with items loaded per batch of orders"""
+
+    items = RowSerializer([
+        ('id', OrderItem.id),
+        ('order_id', OrderItem.order_id),
+        ('inventory_item_id', OrderItem.inventory_item_id),
+        ('inventory_item_name', InventoryItem.name),
+        ('quantity_used', OrderItem.quantity_used),
+        ('unit', InventoryItem.unit),
+    ])
+
+    def select(self):
+        return (
+            super().select()
+            .select_from(TailoringOrder)
+            .outerjoin(Customer, Customer.id == TailoringOrder.customer_id)
+        )
+
+    def items_by_order(self, order_ids):
+        items = defaultdict(list)
+        for start in range(0, len(order_ids), IN_CLAUSE_BATCH):
+            rows = db.session.execute(
+                self.items.select()
+                .select_from(OrderItem)
+                .outerjoin(InventoryItem, InventoryItem.id == OrderItem.inventory_item_id)
+                .where(OrderItem.order_id.in_(order_ids[start:start + IN_CLAUSE_BATCH]))
+                .order_by(OrderItem.order_id, OrderItem.id)
+            )
+            for item in self.items(rows):
+                items[item['order_id']].append(item)
+        return items
+
+    def __call__(self, rows):
+        with timed_serialization():
+            orders = super().__call__(rows)
+            items = self.items_by_order([order['id'] for order in orders])
+            for order in orders:
+                order['measurements'] = {key: order.pop(key) for key in MEASUREMENT_FIELDS}
+                order['balance_due'] = order['total_price'] - order['advance_payment']
+                order['items_used'] = items.get(order['id'], [])
+        return orders
+
+
+CUSTOMERS = RowSerializer(
+    [
+        ('id', Customer.id),
+        ('name', Customer.name),
+        ('phone', Customer.phone),
+        ('email', Customer.email),
+        ('address', Customer.address),
+        ('created_at', Customer.created_at),
+    ],
+    datetime_fields=('created_at',)
+)
+
+INVENTORY_ITEMS = RowSerializer(
+    [
+        ('id', InventoryItem.id),
+        ('name', InventoryItem.name),
+        ('category', InventoryItem.category),
+        ('description', InventoryItem.description),
+        ('quantity', InventoryItem.quantity),
+        ('unit', InventoryItem.unit),
+        ('price_per_unit', InventoryItem.price_per_unit),
+        ('reorder_level', InventoryItem.reorder_level),
+        ('supplier_name', InventoryItem.supplier_name),
+        ('supplier_contact', InventoryItem.supplier_contact),
+        ('is_low_stock', InventoryItem.is_low_stock),
+        ('created_at', InventoryItem.created_at),
+        ('updated_at', InventoryItem.updated_at),
+    ],
+    datetime_fields=('created_at', 'updated_at'),
+    bool_fields=('is_low_stock',)
+)
+
+ORDERS = OrderSerializer(
+    [
+        ('id', TailoringOrder.id),
+        ('customer_id', TailoringOrder.customer_id),
+        ('customer_name', Customer.name),
+        ('order_date', TailoringOrder.order_date),
+        ('delivery_date', TailoringOrder.delivery_date),
+        ('completed_at', TailoringOrder.completed_at),
+        ('status', TailoringOrder.status),
+        ('garment_type', TailoringOrder.garment_type),
+        *((key, getattr(TailoringOrder, key)) for key in MEASUREMENT_FIELDS),
+        ('special_instructions', TailoringOrder.special_instructions),
+        ('total_price', TailoringOrder.total_price),
+        ('advance_payment', TailoringOrder.advance_payment),
+        ('created_at', TailoringOrder.created_at),
+        ('updated_at', TailoringOrder.updated_at),
+    ],
+    datetime_fields=('order_date', 'delivery_date', 'completed_at', 'created_at', 'updated_at')
+)
@@ -0,0 +1,270 @@
+"""
+Hamees Attire Inventory Management System
+Sizing Suggestions
+
+Finds past orders of the same garment type whose measurements are closest
+to a new customer's, so their pattern can be reused. Every process keeps the
+measurements of all orders in a NumPy matrix (NaN where a measurement was not
+taken). The matrix is refreshed only when the shared ``orders`` version from
+cache.py changes, and then incrementally: orders updated since the last load
+are patched in or appended, and a full reload happens only when rows were
+deleted.
+
+The distance between two profiles is the root mean square difference over
+the measurements both have, and an order must share at least half of the
+given measurements to count as a match.
+"""
+import threading
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import func, select
+
+from cache import response_cache
+from models import db, TailoringOrder
+from serializers import MEASUREMENT_FIELDS, ORDERS
+
+DEFAULT_MATCHES = 5
+MAX_MATCHES = 50
+
+# Rows x profiles compared per NumPy batch, bounding the temporary arrays
+BATCH_ELEMENTS = 1 << 20
+
+# Re-read rows updated slightly before the last load, in case a transaction
+# with an earlier updated_at committed after it
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+LOAD_BATCH_SIZE = 10000
+
+
+class SizingError(ValueError):
+    """Raised when a sizing query is missing or has invalid parameters"""
+
+
+class MeasurementIndex:
+    """In-memory measurement matrix of all orders, sorted by order id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.garments = np.empty(0, dtype=np.int32)
+        self.matrix = np.empty((0, len(MEASUREMENT_FIELDS)))
+        self.size = 0
+        self.garment_codes = {}
+        self.version = None
+        self.loaded_until = None
+        self._feature_cache = {}
+
+    def _garment_code(self, garment_type):
+        return self.garment_codes.setdefault(garment_type, len(self.garment_codes))
+
+    def _reserve(self, size):
+        """Grow the arrays (doubling) to hold at least size rows"""
+        capacity = len(self.ids)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        for name in ('ids', 'garments', 'matrix'):
+            old = getattr(self, name)
+            new = np.empty((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _apply(self, rows):
+        """Patch or append rows of (id, garment_type, *measurements)
+
+        Returns False if a row falls between existing ids, which the sorted
+        arrays cannot take without a reload.
+        """
+        if not rows:
+            return True
+        columns = list(zip(*rows))
+        ids = np.array(columns[0], dtype=np.int64)
+        names, inverse = np.unique(np.array(columns[1], dtype=object), return_inverse=True)
+        codes = np.array([self._garment_code(name) for name in names], dtype=np.int32)
+        garments = codes[inverse.reshape(-1)]
+        matrix = np.array(columns[2:], dtype=float).T
+
+        positions = np.searchsorted(self.ids[:self.size], ids)
+        existing = positions < self.size
+        existing[existing] = self.ids[positions[existing]] == ids[existing]
+        self.garments[positions[existing]] = garments[existing]
+        self.matrix[positions[existing]] = matrix[existing]
+
+        new = ~existing
+        if not new.any():
+            return True
+        order = np.argsort(ids[new])
+        new_ids = ids[new][order]
+        if self.size and new_ids[0] < self.ids[self.size - 1]:
+            return False
+        end = self.size + len(new_ids)
+        self._reserve(end)
+        self.ids[self.size:end] = new_ids
+        self.garments[self.size:end] = garments[new][order]
+        self.matrix[self.size:end] = matrix[new][order]
+        self.size = end
+        return True
+
+    def _load(self, statement):
+        # A Core execution on the session's connection skips the ORM result layer
+        result = db.session.connection().execute(
+            statement.execution_options(yield_per=LOAD_BATCH_SIZE))
+        for rows in result.partitions():
+            if not self._apply(rows):
+                return False
+        return True
+
+    def _reload(self):
+        self.reset()
+        statement = select(TailoringOrder.id, TailoringOrder.garment_type,
+                           *(getattr(TailoringOrder, key) for key in MEASUREMENT_FIELDS))
+        self._load(statement.order_by(TailoringOrder.id))
+
+    def _update(self, since):
+        """Apply orders updated since the last load; False if a reload is needed"""
+        statement = (
+            select(TailoringOrder.id, TailoringOrder.garment_type,
+                   *(getattr(TailoringOrder, key) for key in MEASUREMENT_FIELDS))
+            .where(TailoringOrder.updated_at >= since - REFRESH_OVERLAP)
+        )
+        if not self._load(statement):
+            return False
+        # Deleted orders (or rows written without updated_at) change the count
+        count = db.session.execute(select(func.count()).select_from(TailoringOrder)).scalar()
+        return count == self.size
+
+    def refresh(self):
+        """Bring the matrix up to date if any order was written since the last load"""
+        version = response_cache.versions(('orders',))
+        if version == self.version:
+            return
+        # From the primary: rows missing from a lagging replica would never be reloaded
+        with db.session().primary():
+            loaded_until = db.session.execute(
+                select(func.max(TailoringOrder.updated_at))).scalar()
+            if self.loaded_until is None or not self._update(self.loaded_until):
+                self._reload()
+        self.version = version
+        self.loaded_until = loaded_until
+        self._feature_cache = {}
+
+    def _features(self, garment_type):
+        """Rows of a garment type and their [m^2 | m | present] feature matrix
+
+        Missing measurements are 0 in all three blocks. Cached until a refresh.
+        """
+        code = self.garment_codes.get(garment_type)
+        if code not in self._feature_cache:
+            rows = (np.flatnonzero(self.garments[:self.size] == code)
+                    if code is not None else np.empty(0, dtype=np.intp))
+            matrix = self.matrix[rows]
+            present = ~np.isnan(matrix)
+            filled = np.where(present, matrix, 0.0)
+            self._feature_cache[code] = (rows, np.hstack([filled * filled, filled, present]))
+        return self._feature_cache[code]
+
+    def nearest(self, profiles, garment_type, k=DEFAULT_MATCHES):
+        """Closest orders of a garment type for each row of profiles
+
+        ``profiles`` is a (queries, len(MEASUREMENT_FIELDS)) array with NaN for
+        measurements not given. Returns, per profile, a list of
+        (order_id, distance, shared_measurements), closest first.
+        """
+        profiles = np.atleast_2d(np.asarray(profiles, dtype=float))
+        given = (~np.isnan(profiles)).astype(float)
+        values = np.nan_to_num(profiles)
+        min_shared = np.maximum(1, (given.sum(axis=1) + 1) // 2)
+
+        # Summed over the measurements both sides have, (m - p)^2 = m^2 - 2mp + p^2,
+        # so one matrix product gives the squared distance (first len(profiles)
+        # columns) and the number of shared measurements (the rest) for the batch
+        zeros = np.zeros_like(given.T)
+        coefficients = np.hstack([
+            np.vstack([given.T, -2 * values.T, (values * values).T]),
+            np.vstack([zeros, zeros, given.T]),
+        ])
+        count = len(profiles)
+
+        with self._lock:
+            self.refresh()
+            rows, features = self._features(garment_type)
+
+            batch_rows = max(1, BATCH_ELEMENTS // count)
+            best = []
+            for start in range(0, len(rows), batch_rows):
+                product = (features[start:start + batch_rows] @ coefficients).T
+                squares, shared = product[:count], product[count:]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    distance = np.sqrt(np.maximum(squares, 0.0) / shared)
+                distance[shared < min_shared[:, None]] = np.inf
+
+                # Keep the k closest of this batch
+                take = min(k, distance.shape[1])
+                closest = np.argpartition(distance, take - 1, axis=1)[:, :take]
+                best.append((np.take_along_axis(distance, closest, axis=1),
+                             np.take_along_axis(shared, closest, axis=1),
+                             closest + start))
+            if not best:
+                return [[] for _ in profiles]
+
+            distance, shared, positions = (np.hstack(arrays) for arrays in zip(*best))
+            order = np.argsort(distance, axis=1, kind='stable')[:, :k]
+            return [
+                [(int(self.ids[rows[positions[i, j]]]), float(distance[i, j]),
+                  int(shared[i, j]))
+                 for j in columns if np.isfinite(distance[i, j])]
+                for i, columns in enumerate(order)
+            ]
+
+
+measurement_index = MeasurementIndex()
+
+
+def parse_profile(args):
+    """Measurement vector (NaN where missing) from request arguments"""
+    profile = np.full(len(MEASUREMENT_FIELDS), np.nan)
+    for i, key in enumerate(MEASUREMENT_FIELDS):
+        if args.get(key) not in (None, ''):
+            try:
+                profile[i] = float(args[key])
+            except ValueError:
+                raise SizingError(f'{key} must be a number')
+            if not np.isfinite(profile[i]):
+                raise SizingError(f'{key} must be a number')
+    if np.isnan(profile).all():
+        raise SizingError(f"Give at least one of: {', '.join(MEASUREMENT_FIELDS)}")
+    return profile
+
+
+def parse_match_count(raw_k):
+    if raw_k is None:
+        return DEFAULT_MATCHES
+    try:
+        k = int(raw_k)
+    except ValueError:
+        raise SizingError('k must be an integer')
+    if k < 1 or k > MAX_MATCHES:
+        raise SizingError(f'k must be between 1 and {MAX_MATCHES}')
+    return k
+
+
+def similar_orders(garment_type, profile, k=DEFAULT_MATCHES):
+    """The k closest orders as ORDERS dictionaries with distance and shared_measurements"""
+    matches = measurement_index.nearest(profile, garment_type, k)[0]
+    if not matches:
+        return []
+    rows = db.session.execute(
+        ORDERS.select().where(TailoringOrder.id.in_([order_id for order_id, _, _ in matches]))
+    )
+    orders = {order['id']: order for order in ORDERS(rows)}
+    result = []
+    for order_id, distance, shared in matches:
+        # An order deleted since the last refresh is simply skipped
+        if order_id in orders:
+            result.append({**orders[order_id], 'distance': round(distance, 4),
+                           'shared_measurements': shared})
+    return result
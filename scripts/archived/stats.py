@@ -0,0 +1,154 @@
+"""
+Hamees Attire Inventory Management System
+Dashboard Statistics and Maintained Counters
+
+All dashboard numbers come from a single UNION ALL aggregate query that yields
+(name, value) rows. The same rows are stored in the ``stat_counters`` table and
+kept current by a ``before_flush`` hook, so that with ``STATS_USE_COUNTERS``
+enabled ``/api/stats`` only reads a handful of rows.
+"""
+from collections import Counter
+
+from sqlalchemy import case, delete, event, func, insert, inspect, literal, select, union_all, update
+
+from models import db, Customer, InventoryItem, TailoringOrder, StatCounter
+
+REPORTED_STATUSES = ('pending', 'in_progress', 'completed')
+
+
+def is_low_stock(quantity, reorder_level):
+    """Mirror of the InventoryItem.is_low_stock computed column"""
+    return quantity is not None and reorder_level is not None and quantity <= reorder_level
+
+
+def counter_query():
+    """One aggregate query returning (name, value) for every counter"""
+    default_status = TailoringOrder.status.default.arg
+    status = func.coalesce(TailoringOrder.status, default_status)
+    return union_all(
+        select(literal('orders:') + status, func.count())
+        .select_from(TailoringOrder).group_by(status),
+        select(literal('customers'), func.count()).select_from(Customer),
+        select(literal('inventory_items'), func.count()).select_from(InventoryItem),
+        select(literal('low_stock_items'), func.count()).select_from(InventoryItem)
+        .where(InventoryItem.is_low_stock == True)  # noqa: E712
+    )
+
+
+def aggregate_counters():
+    """Compute the counters directly from the tables"""
+    return {name: value for name, value in db.session.execute(counter_query())}
+
+
+def stored_counters():
+    """Read the maintained counters, or None if they have not been built"""
+    counters = {
+        name: value
+        for name, value in db.session.execute(select(StatCounter.name, StatCounter.value))
+    }
+    return counters or None
+
+
+def rebuild_stat_counters():
+    """Recompute the counter table from scratch (call after bulk loads)"""
+    db.session.execute(delete(StatCounter))
+    db.session.execute(
+        insert(StatCounter).from_select(['name', 'value'], counter_query())
+    )
+    db.session.commit()
+
+
+def stats_payload(counters):
+    """Shape counters into the /api/stats response"""
+    return {
+        'customers': counters.get('customers', 0),
+        'inventory_items': counters.get('inventory_items', 0),
+        'total_orders': sum(
+            value for name, value in counters.items() if name.startswith('orders:')
+        ),
+        'orders': {
+            status: counters.get(f'orders:{status}', 0) for status in REPORTED_STATUSES
+        },
+        'low_stock_items': counters.get('low_stock_items', 0)
+    }
+
+
+def adjust_stat_counters(connection, deltas):
+    """Add deltas to the stored counters with a single UPDATE
+
+    Counters that do not exist yet are created by rebuild_stat_counters();
+    new order statuses are inserted on first use.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    result = connection.execute(
+        update(StatCounter)
+        .where(StatCounter.name.in_(list(deltas)))
+        .values(value=StatCounter.value + case(deltas, value=StatCounter.name))
+    )
+    if result.rowcount < len(deltas) and _counters_built(connection):
+        existing = set(connection.execute(
+            select(StatCounter.name).where(StatCounter.name.in_(list(deltas)))
+        ).scalars())
+        missing = [
+            {'name': name, 'value': delta}
+            for name, delta in deltas.items() if name not in existing
+        ]
+        connection.execute(insert(StatCounter), missing)
+
+
+def _counters_built(connection):
+    return connection.execute(
+        select(StatCounter.name).where(StatCounter.name == 'customers')
+    ).first() is not None
+
+
+def flushed_value(obj, attr):
+    """Value an attribute will have once flushed, including column defaults"""
+    value = getattr(obj, attr)
+    if value is None:
+        default = getattr(type(obj), attr).default
+        if default is not None and default.is_scalar:
+            value = default.arg
+    return value
+
+
+def committed_value(obj, attr):
+    """Value an attribute had in the database before this flush"""
+    history = inspect(obj).attrs[attr].load_history()
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _counter_names(obj, value):
+    """Counters an object contributes to, reading attributes through value()"""
+    if isinstance(obj, Customer):
+        return ['customers']
+    if isinstance(obj, InventoryItem):
+        names = ['inventory_items']
+        if is_low_stock(value(obj, 'quantity'), value(obj, 'reorder_level')):
+            names.append('low_stock_items')
+        return names
+    if isinstance(obj, TailoringOrder):
+        return [f"orders:{value(obj, 'status')}"]
+    return []
+
+
+@event.listens_for(db.session, 'before_flush')
+def track_stat_counters(session, flush_context, instances):
+    """Apply this flush's effect on the counters in the same transaction"""
+    deltas = Counter()
+    for obj in session.new:
+        deltas.update(_counter_names(obj, flushed_value))
+    for obj in session.deleted:
+        deltas.subtract(_counter_names(obj, committed_value))
+    for obj in session.dirty:
+        if obj in session.deleted or not session.is_modified(obj):
+            continue
+        deltas.subtract(_counter_names(obj, committed_value))
+        deltas.update(_counter_names(obj, flushed_value))
+    adjust_stat_counters(session.connection(), deltas)
@@ -0,0 +1,250 @@
+"""
+Hamees Attire Inventory Management System
+Stock Deduction
+
+Completing an order deducts stock with conditional UPDATE statements, so the
+check and the subtraction happen atomically in the database:
+
+    UPDATE inventory_items SET quantity = quantity - :required
+    WHERE id = :item_id AND quantity >= :required
+
+Callers commit on success and roll back on any StockError, which undoes every
+deduction made for the order.
+
+Every quantity change is also appended to the ``stock_movements`` ledger, from
+ORM flushes and from the deductions above. ``take_stock_snapshots()`` records
+the current level of every item that moved since its last snapshot; run it
+periodically (``flask snapshot-stock``) so that ``stock_at()`` only has to add
+up the movements since the latest snapshot before the requested time.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, inspect, literal, select, update
+
+from cache import mark_changed
+from jobs import enqueue
+from models import db, InventoryItem, TailoringOrder, StockMovement, StockSnapshot
+from reports import adjust_financial_rollups
+from stats import adjust_stat_counters, is_low_stock
+
+REASON_KEY = 'stock_movement_reason'
+
+
+class StockError(Exception):
+    """Base class for errors raised while completing an order"""
+    status_code = 400
+
+    def to_dict(self):
+        return {'error': str(self)}
+
+
+class OrderStatusConflict(StockError):
+    """The order was completed or changed by another request"""
+    status_code = 409
+
+
+class InsufficientStockError(StockError):
+    """An inventory item does not have enough stock for the order"""
+
+    def __init__(self, item_id, name, available, required):
+        super().__init__(f'Insufficient quantity for {name}')
+        self.item_id = item_id
+        self.name = name
+        self.available = available
+        self.required = required
+
+    def to_dict(self):
+        return {
+            'error': str(self),
+            'inventory_item_id': self.item_id,
+            'available': self.available,
+            'required': self.required
+        }
+
+
+def required_quantities(order):
+    """Total quantity needed per inventory item, in a stable lock order"""
+    required = defaultdict(float)
+    for order_item in order.order_items:
+        required[order_item.inventory_item_id] += order_item.quantity_used
+    return sorted(required.items())
+
+
+def complete_order_stock(order):
+    """Mark an order completed and deduct its stock in the current transaction
+
+    Returns the ids of the items the deduction took down to their reorder
+    level, for which a ``low_stock_alert`` job is queued in the same
+    transaction. Raises OrderStatusConflict if the order's status changed since it
+    was loaded and InsufficientStockError for the first item that falls short.
+    """
+    connection = db.session.connection()
+    previous_status = order.status
+
+    # Claim the order first so that two requests cannot both complete it
+    claimed = connection.execute(
+        update(TailoringOrder)
+        .where(TailoringOrder.id == order.id, TailoringOrder.status == previous_status)
+        .values(status='completed', completed_at=datetime.utcnow())
+    )
+    if claimed.rowcount != 1:
+        raise OrderStatusConflict('Order was modified by another request')
+
+    newly_low = []
+    movements = []
+    for item_id, required in required_quantities(order):
+        row = connection.execute(
+            update(InventoryItem)
+            .where(InventoryItem.id == item_id, InventoryItem.quantity >= required)
+            .values(quantity=InventoryItem.quantity - required)
+            .returning(InventoryItem.quantity, InventoryItem.reorder_level)
+        ).first()
+        if row is None:
+            current = connection.execute(
+                select(InventoryItem.name, InventoryItem.quantity)
+                .where(InventoryItem.id == item_id)
+            ).first()
+            name, available = current if current else (f'item {item_id}', 0)
+            raise InsufficientStockError(item_id, name, available, required)
+
+        movements.append({
+            'inventory_item_id': item_id,
+            'order_id': order.id,
+            'delta': -required,
+            'reason': 'order_completion'
+        })
+        quantity, reorder_level = row
+        if is_low_stock(quantity, reorder_level) and not is_low_stock(quantity + required,
+                                                                      reorder_level):
+            newly_low.append(item_id)
+
+    if movements:
+        connection.execute(insert(StockMovement), movements)
+    mark_changed(db.session, 'orders', 'inventory')
+
+    status_default = TailoringOrder.status.default.arg
+    adjust_stat_counters(connection, {
+        f'orders:{previous_status or status_default}': -1,
+        'orders:completed': 1,
+        'low_stock_items': len(newly_low)
+    })
+    amounts = (order.garment_type, order.total_price, order.advance_payment)
+    adjust_financial_rollups(connection, [(-1, order.order_date, previous_status, *amounts),
+                                          (1, order.order_date, 'completed', *amounts)])
+    if newly_low:
+        enqueue('low_stock_alert', {'order_id': order.id, 'inventory_item_ids': newly_low})
+    return newly_low
+
+
+@contextmanager
+def movement_reason(reason):
+    """Record ORM quantity changes flushed inside the block with this reason"""
+    session = db.session()
+    previous = session.info.get(REASON_KEY)
+    session.info[REASON_KEY] = reason
+    try:
+        yield
+    finally:
+        session.info[REASON_KEY] = previous
+
+
+@event.listens_for(db.session, 'after_flush')
+def record_stock_movements(session, flush_context):
+    """Append a ledger row for every InventoryItem quantity change in a flush"""
+    reason = session.info.get(REASON_KEY)
+    movements = []
+    for obj in session.new:
+        if isinstance(obj, InventoryItem) and obj.quantity:
+            movements.append({
+                'inventory_item_id': obj.id,
+                'delta': obj.quantity,
+                'reason': reason or 'initial'
+            })
+    for obj in session.dirty:
+        if not isinstance(obj, InventoryItem) or obj in session.deleted:
+            continue
+        history = inspect(obj).attrs.quantity.history
+        if history.added and history.deleted:
+            delta = (history.added[0] or 0) - (history.deleted[0] or 0)
+            if delta:
+                movements.append({
+                    'inventory_item_id': obj.id,
+                    'delta': delta,
+                    'reason': reason or 'adjustment'
+                })
+    if movements:
+        session.connection().execute(insert(StockMovement), movements)
+
+
+def open_stock_ledger():
+    """Give items created before the ledger existed an opening balance"""
+    has_movements = (
+        select(StockMovement.id)
+        .where(StockMovement.inventory_item_id == InventoryItem.id)
+        .exists()
+    )
+    db.session.execute(
+        insert(StockMovement).from_select(
+            ['inventory_item_id', 'delta', 'reason', 'created_at'],
+            select(InventoryItem.id, InventoryItem.quantity,
+                   literal('opening_balance'), literal(datetime.utcnow()))
+            .where(InventoryItem.quantity != 0, ~has_movements)
+        )
+    )
+    db.session.commit()
+
+
+def take_stock_snapshots():
+    """Snapshot every item whose stock moved since its last snapshot
+
+    A single INSERT ... SELECT, so quantity and movement_id are consistent.
+    Returns the number of snapshots written.
+    """
+    last_movement = (
+        select(StockMovement.inventory_item_id, func.max(StockMovement.id).label('movement_id'))
+        .group_by(StockMovement.inventory_item_id)
+        .subquery()
+    )
+    last_snapshot = (
+        select(func.coalesce(func.max(StockSnapshot.movement_id), 0))
+        .where(StockSnapshot.inventory_item_id == InventoryItem.id)
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        insert(StockSnapshot).from_select(
+            ['inventory_item_id', 'movement_id', 'quantity', 'taken_at'],
+            select(InventoryItem.id, last_movement.c.movement_id,
+                   InventoryItem.quantity, literal(datetime.utcnow()))
+            .join(last_movement, last_movement.c.inventory_item_id == InventoryItem.id)
+            .where(last_movement.c.movement_id > last_snapshot)
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def stock_at(item_id, at):
+    """Stock level of an item at a point in time
+
+    Starts from the latest snapshot taken at or before ``at`` and adds the
+    movements recorded after it, so the scan is bounded by the snapshot period.
+    """
+    snapshot = db.session.execute(
+        select(StockSnapshot.quantity, StockSnapshot.movement_id, StockSnapshot.taken_at)
+        .where(StockSnapshot.inventory_item_id == item_id, StockSnapshot.taken_at <= at)
+        .order_by(StockSnapshot.taken_at.desc(), StockSnapshot.id.desc())
+        .limit(1)
+    ).first()
+
+    query = (
+        select(func.coalesce(func.sum(StockMovement.delta), 0))
+        .where(StockMovement.inventory_item_id == item_id, StockMovement.created_at <= at)
+    )
+    base = 0
+    if snapshot is not None:
+        base = snapshot.quantity
+        query = query.where(StockMovement.created_at >= snapshot.taken_at,
+                            StockMovement.id > snapshot.movement_id)
+    return base + db.session.execute(query).scalar()
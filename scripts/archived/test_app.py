@@ -1,30 +1,167 @@
 """
 Basic tests for Hamees Attire Inventory Management System
 """
+import atexit
+import gc
 import unittest
+import csv
+import gzip
+import io
 import json
-from app import app, db
-from models import Customer, InventoryItem, TailoringOrder, OrderItem
-from datetime import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, inspect, select, text, update
+from sqlalchemy.exc import OperationalError
+from flask import jsonify
+
+from app import create_app
+from models import db
+from cache import response_cache
+import serializers
+from stats import aggregate_counters, rebuild_stat_counters, stored_counters
+from models import Customer, InventoryItem, TailoringOrder, OrderItem, StockMovement, StockSnapshot
+from stock import stock_at, take_stock_snapshots
+from migrations import MIGRATIONS, run_migrations
+from search import SEARCH_INDEXES
+from sizing import measurement_index
+from planning import reserved_demand_query
+from datetime import date, datetime, timedelta
+import forecasting
+import bulk
+import database
+import exports
+import generate_data
+import loadtest
+from metrics import metrics
+from routing import PRIMARY_COOKIE, replica_router
+import jobs
+import reports
+from models import FinancialRollup, Job, ReplicationHeartbeat
+
+# One database file, resource versions and metrics folder per test process,
+# so parallel runs (pytest -n with pytest-xdist) never share them
+TEST_DIR = tempfile.mkdtemp(prefix='hamees-tests-')
+TEST_CONFIG = {
+    'TESTING': True,
+    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(TEST_DIR, 'test_hamees_inventory.db')}",
+    'RESOURCE_VERSION_DIR': os.path.join(TEST_DIR, 'versions'),
+    'METRICS_DIR': os.path.join(TEST_DIR, 'metrics'),
+}
+app = create_app(TEST_CONFIG)
+
+
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+@contextmanager
+def count_statements():
+    """Count the SQL statements sent to the database inside the block
+
+    SAVEPOINTs from the rolled-back test transaction are not counted.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(SAVEPOINT_STATEMENTS):
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain_query_plan(query):
+    """Return the EXPLAIN QUERY PLAN details for an ORM query or statement"""
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=db.engine.dialect,
+                                 compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}'))
+    return ' | '.join(row[-1] for row in rows)
+
+
+def setUpModule():
+    """Create the schema once; each test then runs in a rolled-back transaction"""
+    with app.app_context():
+        # Sessions bound to a test's connection commit and roll back SAVEPOINTs
+        db.session.configure(join_transaction_mode='create_savepoint')
+        db.create_all()
+
+
+def tearDownModule():
+    atexit.unregister(metrics.flush)
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+def without_rollback(test):
+    """Run a test on the engine itself instead of inside a rolled-back transaction
+
+    For tests that use several threads or connections, which cannot share
+    the test's connection. Their data is deleted afterwards.
+    """
+    test.without_rollback = True
+    return test
 
 
 class InventorySystemTestCase(unittest.TestCase):
     """Test cases for the inventory management system"""
     
     def setUp(self):
-        """Set up test database before each test"""
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test_hamees_inventory.db'
+        """Run the test inside a transaction on one connection"""
         self.app = app.test_client()
-        
+        response_cache.clear()
+        measurement_index.reset()
+        self.connection = None
+        if getattr(getattr(self, self._testMethodName), 'without_rollback', False):
+            return
+
         with app.app_context():
-            db.create_all()
+            self.engine = db.engine
+            self.connection = self.engine.connect()
+        # pysqlite starts transactions itself and would commit when the
+        # outermost SAVEPOINT is released; take control with an explicit BEGIN
+        self.driver_connection = self.connection.connection.driver_connection
+        self.isolation_level = self.driver_connection.isolation_level
+        self.driver_connection.isolation_level = None
+        self.transaction = self.connection.begin()
+        self.connection.exec_driver_sql('BEGIN')
+        # Every session (app contexts, requests) joins this transaction through
+        # Flask-SQLAlchemy's get_bind(), committing to SAVEPOINTs inside it
+        with app.app_context():
+            db.engines[None] = self.connection
     
     def tearDown(self):
-        """Clean up test database after each test"""
+        """Roll the test's transaction back, or empty the tables"""
         with app.app_context():
             db.session.remove()
-            db.drop_all()
+            if self.connection is None:
+                for table in reversed(db.metadata.sorted_tables):
+                    db.session.execute(table.delete())
+                # Statistics from ANALYZE would outlive the rows, and open
+                # connections keep the ones they have loaded
+                if db.session.execute(text(
+                        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")).first():
+                    db.session.execute(text('DELETE FROM sqlite_stat1'))
+                db.session.commit()
+                db.session.remove()
+                db.engine.dispose()
+                return
+            db.engines[None] = self.engine
+        self.transaction.rollback()
+        self.driver_connection.isolation_level = self.isolation_level
+        self.connection.close()
     
     def test_index(self):
         """Test the index endpoint"""
@@ -186,6 +323,1433 @@ class InventorySystemTestCase(unittest.TestCase):
         self.assertIn('total_orders', data)
         self.assertIn('orders', data)
 
+    def test_customers_keyset_pagination(self):
+        """Test walking the customer list page by page with next_cursor"""
+        with app.app_context():
+            for i in range(5):
+                db.session.add(Customer(name=f'Customer {i}', phone=str(i)))
+            db.session.commit()
+
+        names = []
+        cursor = None
+        pages = 0
+        while True:
+            url = '/api/customers?limit=2'
+            if cursor:
+                url += f'&after={cursor}'
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            names.extend(customer['name'] for customer in data['items'])
+            pages += 1
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(names, [f'Customer {i}' for i in range(5)])
+
+    def test_orders_stream_and_cursor(self):
+        """Test streaming orders and keyset paging on order_date"""
+        with app.app_context():
+            customer = Customer(name='Test Customer', phone='1234567890')
+            db.session.add(customer)
+            db.session.flush()
+            for day in (3, 1, 2):
+                db.session.add(TailoringOrder(
+                    customer_id=customer.id,
+                    order_date=datetime(2024, 1, day),
+                    garment_type='shirt',
+                    total_price=100.0
+                ))
+            db.session.commit()
+
+        response = self.app.get('/api/orders?stream=1')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([order['order_date'][:10] for order in data],
+                         ['2024-01-01', '2024-01-02', '2024-01-03'])
+
+        response = self.app.get('/api/orders?limit=1')
+        cursor = json.loads(response.data)['next_cursor']
+        response = self.app.get(f'/api/orders?limit=5&after={cursor}')
+        data = json.loads(response.data)
+        self.assertEqual([order['order_date'][:10] for order in data['items']],
+                         ['2024-01-02', '2024-01-03'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_orders_cursor_with_null_order_date(self):
+        """Test that paging does not skip orders past a NULL order_date"""
+        order_ids = self._create_orders(5, items_per_order=1)
+        with app.app_context():
+            db.session.execute(
+                update(TailoringOrder)
+                .where(TailoringOrder.id.in_(order_ids[1:4:2]))
+                .values(order_date=None)
+            )
+            db.session.commit()
+            expected = db.session.scalars(
+                select(TailoringOrder.id)
+                .order_by(TailoringOrder.order_date, TailoringOrder.id)
+            ).all()
+
+        ids = []
+        cursor = None
+        while True:
+            url = '/api/orders?limit=1'
+            if cursor:
+                url += f'&after={cursor}'
+            data = json.loads(self.app.get(url).data)
+            ids.extend(order['id'] for order in data['items'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(sorted(ids), order_ids)
+
+    def test_invalid_pagination_parameters(self):
+        """Test that bad limit/after values are rejected"""
+        self.assertEqual(self.app.get('/api/inventory?limit=0').status_code, 400)
+        self.assertEqual(self.app.get('/api/inventory?limit=abc').status_code, 400)
+        self.assertEqual(self.app.get('/api/inventory?after=not-a-cursor').status_code, 400)
+
+    def _create_orders(self, count, items_per_order=2):
+        """Create orders that each use several inventory items"""
+        with app.app_context():
+            customer = Customer(name='Test Customer', phone='1234567890')
+            db.session.add(customer)
+            items = [
+                InventoryItem(name=f'Fabric {i}', category='fabric', quantity=100,
+                              unit='meters', price_per_unit=20.0)
+                for i in range(items_per_order)
+            ]
+            db.session.add_all(items)
+            db.session.flush()
+            order_ids = []
+            for _ in range(count):
+                order = TailoringOrder(customer_id=customer.id, garment_type='shirt',
+                                       total_price=100.0)
+                order.order_items = [
+                    OrderItem(inventory_item_id=item.id, quantity_used=1.0)
+                    for item in items
+                ]
+                db.session.add(order)
+                db.session.flush()
+                order_ids.append(order.id)
+            db.session.commit()
+            return order_ids
+
+    def test_order_endpoints_statement_count(self):
+        """Test that order list and detail use a fixed number of queries"""
+        order_ids = self._create_orders(20)
+
+        with count_statements() as statements:
+            response = self.app.get('/api/orders')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(len(data), 20)
+        self.assertEqual(data[0]['customer_name'], 'Test Customer')
+        self.assertEqual(data[0]['items_used'][0]['unit'], 'meters')
+        self.assertLessEqual(len(statements), 2)
+
+        with count_statements() as statements:
+            response = self.app.get('/api/orders?limit=5')
+        self.assertEqual(len(json.loads(response.data)['items']), 5)
+        self.assertLessEqual(len(statements), 2)
+
+        with count_statements() as statements:
+            response = self.app.get(f'/api/orders/{order_ids[0]}')
+        self.assertEqual(len(json.loads(response.data)['items_used']), 2)
+        self.assertEqual(len(statements), 1)
+
+    def test_stats_counters_track_writes(self):
+        """Test that maintained counters match a fresh aggregate after writes"""
+        app.config['STATS_USE_COUNTERS'] = True
+        try:
+            self.assertEqual(self.app.get('/api/stats').status_code, 200)
+            order_ids = self._create_orders(3)
+            customer = json.loads(self.app.post(
+                '/api/customers', json={'name': 'Walk In', 'phone': '555'}).data)
+            item_id = json.loads(self.app.post('/api/inventory', json={
+                'name': 'Silk', 'category': 'fabric', 'quantity': 4, 'unit': 'meters',
+                'price_per_unit': 80.0, 'reorder_level': 5}).data)['id']
+            self.app.put(f'/api/orders/{order_ids[0]}', json={'status': 'in_progress'})
+            self.app.put(f'/api/orders/{order_ids[1]}', json={'status': 'delivered'})
+            self.app.post(f'/api/orders/{order_ids[2]}/complete')
+            self.app.put(f'/api/inventory/{item_id}', json={'quantity': 50})
+            self.app.delete(f"/api/customers/{customer['id']}")
+
+            with count_statements() as statements:
+                data = json.loads(self.app.get('/api/stats').data)
+            self.assertEqual(len(statements), 1)
+            self.assertEqual(data['customers'], 1)
+            self.assertEqual(data['total_orders'], 3)
+            self.assertEqual(data['orders'],
+                             {'pending': 0, 'in_progress': 1, 'completed': 1})
+            self.assertEqual(data['low_stock_items'], 0)
+
+            self.app.delete(f'/api/orders/{order_ids[0]}')
+            with app.app_context():
+                stored = {name: value for name, value in stored_counters().items() if value}
+                expected = {name: value for name, value in aggregate_counters().items() if value}
+                self.assertEqual(stored, expected)
+        finally:
+            app.config['STATS_USE_COUNTERS'] = False
+
+    def _create_stock_orders(self, count, stocks):
+        """Create orders that each use one unit of every item in stocks"""
+        with app.app_context():
+            customer = Customer(name='Test Customer', phone='1234567890')
+            items = [
+                InventoryItem(name=f'Fabric {i}', category='fabric', quantity=quantity,
+                              unit='meters', price_per_unit=20.0, reorder_level=0)
+                for i, quantity in enumerate(stocks)
+            ]
+            db.session.add(customer)
+            db.session.add_all(items)
+            db.session.flush()
+            orders = [
+                TailoringOrder(customer_id=customer.id, garment_type='shirt', total_price=100.0,
+                               order_items=[OrderItem(inventory_item_id=item.id, quantity_used=1.0)
+                                            for item in items])
+                for _ in range(count)
+            ]
+            db.session.add_all(orders)
+            db.session.commit()
+            return [order.id for order in orders], [item.id for item in items]
+
+    def test_complete_order_insufficient_stock_rolls_back(self):
+        """Test that a shortfall on one item leaves every item untouched"""
+        order_ids, item_ids = self._create_stock_orders(1, [10, 0.5])
+
+        response = self.app.post(f'/api/orders/{order_ids[0]}/complete')
+        self.assertEqual(response.status_code, 400)
+        data = json.loads(response.data)
+        self.assertEqual(data['inventory_item_id'], item_ids[1])
+        self.assertEqual(data['available'], 0.5)
+        self.assertEqual(data['required'], 1.0)
+
+        with app.app_context():
+            self.assertEqual(db.session.get(InventoryItem, item_ids[0]).quantity, 10)
+            self.assertEqual(db.session.get(TailoringOrder, order_ids[0]).status, 'pending')
+
+        response = self.app.put(f'/api/orders/{order_ids[0]}', json={'status': 'completed'})
+        self.assertEqual(response.status_code, 400)
+
+    @without_rollback
+    def test_parallel_completions_never_oversell(self):
+        """Stress test: concurrent completions never drive stock negative"""
+        order_ids, item_ids = self._create_stock_orders(60, [25, 30])
+        results = []
+        lock = threading.Lock()
+
+        def worker(ids):
+            client = app.test_client()
+            for order_id in ids:
+                # Complete each order twice from different threads
+                for url, method in ((f'/api/orders/{order_id}/complete', 'post'),
+                                    (f'/api/orders/{order_id}', 'put')):
+                    if method == 'post':
+                        response = client.post(url)
+                    else:
+                        response = client.put(url, json={'status': 'completed'})
+                    with lock:
+                        results.append(response.status_code)
+
+        threads = [threading.Thread(target=worker, args=(order_ids[i::6] + order_ids[:10],))
+                   for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertNotIn(500, results)
+        with app.app_context():
+            quantities = [db.session.get(InventoryItem, item_id).quantity for item_id in item_ids]
+            completed = TailoringOrder.query.filter_by(status='completed').count()
+        self.assertEqual(completed, 25)
+        self.assertEqual(quantities, [0, 5])
+
+    def _utcnow_between_steps(self):
+        """A timestamp strictly between the writes before and after it"""
+        time.sleep(0.01)
+        now = datetime.utcnow()
+        time.sleep(0.01)
+        return now
+
+    def test_stock_ledger_and_point_in_time_queries(self):
+        """Test that every quantity change is ledgered and replayable"""
+        order_ids, item_ids = self._create_stock_orders(1, [50])
+        item_id = item_ids[0]
+        after_create = self._utcnow_between_steps()
+
+        self.app.put(f'/api/inventory/{item_id}', json={'quantity': 40})
+        self.app.post(f'/api/orders/{order_ids[0]}/complete')
+        after_complete = self._utcnow_between_steps()
+
+        with app.app_context():
+            self.assertEqual(take_stock_snapshots(), 1)
+            self.assertEqual(take_stock_snapshots(), 0)
+        after_snapshot = self._utcnow_between_steps()
+        self.app.put(f'/api/inventory/{item_id}', json={'quantity': 100})
+
+        with app.app_context():
+            movements = StockMovement.query.order_by(StockMovement.id).all()
+            self.assertEqual([(m.delta, m.reason) for m in movements],
+                             [(50, 'initial'), (-10, 'adjustment'),
+                              (-1, 'order_completion'), (61, 'adjustment')])
+            self.assertEqual(movements[2].order_id, order_ids[0])
+            self.assertEqual(stock_at(item_id, after_create), 50)
+            self.assertEqual(stock_at(item_id, after_complete), 39)
+            self.assertEqual(stock_at(item_id, after_snapshot), 39)
+            self.assertEqual(stock_at(item_id, datetime.utcnow()), 100)
+
+        response = self.app.get(f'/api/inventory/{item_id}/stock?at={after_complete.isoformat()}')
+        self.assertEqual(json.loads(response.data)['quantity'], 39)
+        response = self.app.get(f'/api/inventory/{item_id}/stock?at=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+        # Deletes apply the foreign keys' ON DELETE actions
+        self.assertEqual(self.app.delete(f'/api/orders/{order_ids[0]}').status_code, 204)
+        with app.app_context():
+            self.assertEqual(db.session.scalars(
+                db.select(StockMovement.order_id).where(StockMovement.order_id.is_not(None))
+            ).all(), [])
+        self.assertEqual(self.app.delete(f'/api/inventory/{item_id}').status_code, 204)
+        with app.app_context():
+            self.assertEqual(StockMovement.query.filter_by(inventory_item_id=item_id).count(), 0)
+            self.assertEqual(StockSnapshot.query.filter_by(inventory_item_id=item_id).count(), 0)
+
+    def test_low_stock_uses_index(self):
+        """Test that the low-stock flag tracks writes and is served by its index"""
+        _, item_ids = self._create_stock_orders(1, [50, 5])
+        self.app.put(f'/api/inventory/{item_ids[0]}', json={'reorder_level': 60})
+        self.app.put(f'/api/inventory/{item_ids[1]}', json={'quantity': 1, 'reorder_level': 0})
+
+        data = json.loads(self.app.get('/api/inventory/low-stock').data)
+        self.assertEqual([item['id'] for item in data], [item_ids[0]])
+
+        with app.app_context():
+            plan = explain_query_plan(InventoryItem.query.filter_by(is_low_stock=True))
+        self.assertIn('USING INDEX ix_inventory_items_is_low_stock', plan)
+        self.assertNotIn('SCAN inventory_items', plan)
+
+    def _endpoint_query_plans(self, url):
+        """Run EXPLAIN QUERY PLAN on every SELECT a GET request issues"""
+        captured = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                captured.append((statement, parameters))
+
+        with app.app_context():
+            engine = db.engine
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                response = self.app.get(url)
+            finally:
+                event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+            self.assertEqual(response.status_code, 200)
+            connection = db.session.connection()
+            return [
+                ' | '.join(row[-1] for row in connection.exec_driver_sql(
+                    f'EXPLAIN QUERY PLAN {statement}', parameters))
+                for statement, parameters in captured
+            ]
+
+    def test_endpoint_query_plans_use_indexes(self):
+        """Test that filtered and paged endpoints never scan a table or sort"""
+        order_ids = self._create_orders(5)
+        with app.app_context():
+            customer_id = db.session.get(TailoringOrder, order_ids[0]).customer_id
+
+        for url in ('/api/orders?limit=2',
+                    '/api/orders?status=pending&limit=2',
+                    f'/api/orders?customer_id={customer_id}&limit=2',
+                    f'/api/orders/{order_ids[0]}',
+                    '/api/inventory?category=fabric&limit=2',
+                    '/api/inventory/low-stock'):
+            plans = self._endpoint_query_plans(url)
+            self.assertTrue(plans, url)
+            for plan in plans:
+                for step in plan.split(' | '):
+                    if step.startswith('SCAN'):
+                        self.assertIn('USING', step, f'{url}: {plan}')
+                self.assertNotIn('TEMP B-TREE', plan, f'{url}: {plan}')
+
+    def test_migrations_upgrade_existing_database(self):
+        """Test that migrations add the low-stock flag to an old database"""
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        engine = create_engine(f'sqlite:///{path}')
+        try:
+            with engine.begin() as connection:
+                # Schema as created by the first release of models.py
+                for ddl in (
+                    'CREATE TABLE customers (id INTEGER PRIMARY KEY, name VARCHAR(100), '
+                    'phone VARCHAR(20), email VARCHAR(100))',
+                    'CREATE TABLE inventory_items (id INTEGER PRIMARY KEY, name VARCHAR(100), '
+                    'category VARCHAR(50), description TEXT, quantity FLOAT, '
+                    'reorder_level FLOAT, supplier_name VARCHAR(100))',
+                    'CREATE TABLE tailoring_orders (id INTEGER PRIMARY KEY, customer_id INTEGER, '
+                    'order_date DATETIME, status VARCHAR(20), updated_at DATETIME)',
+                    'CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER, '
+                    'inventory_item_id INTEGER, quantity_used FLOAT)',
+                ):
+                    connection.execute(text(ddl))
+                connection.execute(text(
+                    "INSERT INTO inventory_items VALUES (1, 'Silk', 'fabric', NULL, 2, 10, NULL), "
+                    "(2, 'Wool', 'fabric', NULL, 20, 10, 'Lahore Mills')"
+                ))
+                connection.execute(text(
+                    "INSERT INTO tailoring_orders VALUES (1, 1, '2024-01-01', 'completed', "
+                    "'2024-01-03 10:00:00.000000'), (2, 1, '2024-01-02', 'pending', NULL)"
+                ))
+            with engine.begin() as connection:
+                self.assertEqual(run_migrations(connection), len(MIGRATIONS))
+                self.assertEqual(run_migrations(connection), 0)
+                low = connection.execute(text(
+                    'SELECT id FROM inventory_items WHERE is_low_stock = 1')).scalars().all()
+                indexed = connection.execute(text(
+                    "SELECT rowid FROM inventory_items_fts WHERE inventory_items_fts MATCH 'lah*'"
+                )).scalars().all()
+                completed_at = connection.execute(text(
+                    'SELECT completed_at FROM tailoring_orders ORDER BY id')).scalars().all()
+            self.assertEqual(low, [1])
+            self.assertEqual(indexed, [2])
+            self.assertEqual(completed_at, ['2024-01-03 10:00:00.000000', None])
+            indexes = {
+                index['name']
+                for table in ('inventory_items', 'tailoring_orders', 'order_items')
+                for index in inspect(engine).get_indexes(table)
+            }
+            self.assertLessEqual({'ix_inventory_items_is_low_stock',
+                                  'ix_inventory_items_category',
+                                  'ix_inventory_items_name_supplier',
+                                  'ix_tailoring_orders_status_order_date',
+                                  'ix_tailoring_orders_customer_order_date',
+                                  'ix_order_items_order_id',
+                                  'ix_order_items_inventory_item_id'}, indexes)
+        finally:
+            engine.dispose()
+            os.remove(path)
+
+    def test_conditional_get_with_etags(self):
+        """Test ETag/If-None-Match and invalidation by writes"""
+        response = self.app.get('/api/inventory')
+        etag = response.headers['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        with count_statements() as statements:
+            response = self.app.get('/api/inventory', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(statements, [])
+
+        self.app.post('/api/inventory', json={
+            'name': 'Linen', 'category': 'fabric', 'quantity': 40, 'unit': 'meters',
+            'price_per_unit': 45.0})
+        response = self.app.get('/api/inventory', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(json.loads(response.data)), 1)
+
+    def test_response_cache_invalidated_by_commits(self):
+        """Test that unchanged polls skip the database until a commit"""
+        order_ids, item_ids = self._create_stock_orders(1, [10])
+        url = '/api/orders?status=pending'
+        first = self.app.get(url)
+
+        with count_statements() as statements:
+            second = self.app.get(url)
+        self.assertEqual(statements, [])
+        self.assertEqual(first.data, second.data)
+
+        # Stock deducted with Core UPDATEs must invalidate inventory too
+        inventory = json.loads(self.app.get('/api/inventory').data)
+        self.app.post(f'/api/orders/{order_ids[0]}/complete')
+        self.assertEqual(json.loads(self.app.get(url).data), [])
+        self.assertNotEqual(json.loads(self.app.get('/api/inventory').data), inventory)
+
+        # Writes outside the request handlers invalidate as well
+        with app.app_context():
+            db.session.get(InventoryItem, item_ids[0]).name = 'Renamed'
+            db.session.commit()
+        data = json.loads(self.app.get('/api/inventory').data)
+        self.assertEqual(data[0]['name'], 'Renamed')
+
+    def test_fast_serializers_match_to_dict(self):
+        """Test that list endpoints return exactly what to_dict() + jsonify would"""
+        self._create_orders(3)
+        with app.app_context():
+            db.session.add(Customer(name='Zoë Ahmed', phone='+92-300-1', address='Café Road'))
+            order = TailoringOrder.query.first()
+            order.delivery_date = datetime(2024, 2, 15)
+            order.chest = 40.5
+            db.session.commit()
+
+        for url, model, key in (
+            ('/api/customers?limit=100', Customer, (Customer.id,)),
+            ('/api/inventory?limit=100', InventoryItem, (InventoryItem.id,)),
+            ('/api/orders?limit=100', TailoringOrder,
+             (TailoringOrder.order_date, TailoringOrder.id)),
+        ):
+            body = self.app.get(url).data
+            with app.test_request_context():
+                rows = model.query.order_by(*key).all()
+                expected = jsonify({'items': [row.to_dict() for row in rows],
+                                    'next_cursor': None}).data
+            self.assertEqual(body, expected, url)
+
+    @without_rollback
+    def test_sqlite_connections_are_tuned(self):
+        """Test that every connection gets the configured pragmas"""
+        with app.app_context():
+            self.assertTrue(db.engine.url.database.endswith('test_hamees_inventory.db'))
+            with db.engine.connect() as connection:
+                pragma = lambda name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+                self.assertEqual(pragma('journal_mode'), 'wal')
+                self.assertEqual(pragma('synchronous'), 1)  # NORMAL
+                self.assertEqual(pragma('busy_timeout'), app.config['SQLITE_BUSY_TIMEOUT_MS'])
+                self.assertEqual(pragma('cache_size'), -app.config['SQLITE_CACHE_SIZE_KB'])
+                self.assertEqual(pragma('mmap_size'), app.config['SQLITE_MMAP_SIZE'])
+                self.assertEqual(pragma('foreign_keys'), 1)
+
+    def test_search_customers_and_inventory(self):
+        """Test prefix search, ranking and index maintenance by triggers"""
+        for name, phone, email in (
+            ('Ahmed Khan', '+92-300-1234567', 'ahmed@example.com'),
+            ('Bilal Ahmed', '+92-321-7654321', None),
+            ('Sara Malik', '+92-333-5550000', 'khan.sara@example.com'),
+        ):
+            self.app.post('/api/customers', json={'name': name, 'phone': phone, 'email': email})
+        self.app.post('/api/inventory', json={
+            'name': 'Egyptian Cotton', 'category': 'fabric', 'quantity': 50, 'unit': 'meters',
+            'price_per_unit': 30, 'supplier_name': 'Khan Textiles'
+        })
+
+        def search(**params):
+            response = self.app.get('/api/search', query_string=params)
+            self.assertEqual(response.status_code, 200)
+            return json.loads(response.data)
+
+        data = search(q='kha')
+        # A match in the name outranks one in the email
+        self.assertEqual([c['name'] for c in data['customers']], ['Ahmed Khan', 'Sara Malik'])
+        self.assertEqual([i['name'] for i in data['inventory']], ['Egyptian Cotton'])
+        self.assertEqual(data['customers'][0], json.loads(self.app.get('/api/customers/1').data))
+
+        self.assertEqual([c['name'] for c in search(q='ahm kh')['customers']], ['Ahmed Khan'])
+        self.assertEqual([c['name'] for c in search(q='92300123', type='customers')['customers']],
+                         ['Ahmed Khan'])
+        self.assertEqual([c['name'] for c in search(q='+92 321-765')['customers']],
+                         ['Bilal Ahmed'])
+        self.assertEqual([c['name'] for c in search(q='555', type='customers')['customers']],
+                         ['Sara Malik'])
+        self.assertEqual(len(search(q='ahmed', limit=1)['customers']), 1)
+        self.assertNotIn('inventory', search(q='ahmed', type='customers'))
+
+        # Updates and deletes reach the index through the triggers
+        self.app.put('/api/customers/2', json={'name': 'Bilal Qureshi'})
+        self.app.delete('/api/customers/3')
+        self.assertEqual([c['name'] for c in search(q='ahmed')['customers']], ['Ahmed Khan'])
+        self.assertEqual([c['name'] for c in search(q='qure')['customers']], ['Bilal Qureshi'])
+        self.assertEqual(search(q='sara')['customers'], [])
+
+        # Every match is ranked unless the candidates are capped to the newest
+        for name, email in (('Omar Farooq', 'khan.omar@example.com'),
+                            ('Zara Iqbal', 'khan.zara@example.com')):
+            self.app.post('/api/customers', json={'name': name, 'phone': '1', 'email': email})
+        self.assertEqual(search(q='kha', limit=1)['customers'][0]['name'], 'Ahmed Khan')
+        with app.app_context():
+            rows = db.session.execute(SEARCH_INDEXES['customers'].search('kha', 1, candidates=2))
+            self.assertNotEqual(serializers.CUSTOMERS(rows)[0]['name'], 'Ahmed Khan')
+
+        for params in ({}, {'q': '"*'}, {'q': 'a b'}, {'q': 'ah', 'limit': 0},
+                       {'q': 'ah', 'type': 'orders'}):
+            self.assertEqual(self.app.get('/api/search', query_string=params).status_code, 400)
+
+        with app.app_context():
+            plan = explain_query_plan(SEARCH_INDEXES['customers'].search('ahmed'))
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+        self.assertIn('USING INTEGER PRIMARY KEY', plan)
+
+    def test_similar_orders_by_measurements(self):
+        """Test NaN-aware nearest orders and incremental matrix refreshes"""
+        self.app.post('/api/customers', json={'name': 'Ali', 'phone': '+92-300-1111111'})
+        profiles = [
+            ('shirt', {'chest': 40, 'waist': 34, 'neck': 15.5}),
+            ('shirt', {'chest': 42, 'waist': 36, 'neck': 16}),
+            ('shirt', {'chest': 40.5, 'neck': 15.5}),          # no waist taken
+            ('pant', {'chest': 40, 'waist': 34, 'inseam': 32}),
+            ('shirt', {'shoulder': 18}),                       # nothing in common
+        ]
+        for garment_type, measurements in profiles:
+            self.app.post('/api/orders', json={'customer_id': 1, 'garment_type': garment_type,
+                                               'total_price': 1000, **measurements})
+
+        def similar(**params):
+            response = self.app.get('/api/orders/similar', query_string=params)
+            self.assertEqual(response.status_code, 200)
+            return [(m['id'], m['distance'], m['shared_measurements'])
+                    for m in json.loads(response.data)['matches']]
+
+        self.assertEqual(similar(garment_type='shirt', chest=40, waist=34, neck=15.5),
+                         [(1, 0.0, 3), (3, 0.3536, 2), (2, 1.6583, 3)])
+        self.assertEqual(similar(garment_type='shirt', chest=40, waist=34, neck=15.5, k=1),
+                         [(1, 0.0, 3)])
+        self.assertEqual(similar(garment_type='pant', waist=34)[0][0], 4)
+        self.assertEqual(similar(garment_type='dress', waist=34), [])
+
+        # Updates patch the cached matrix, new orders are appended
+        self.app.put('/api/orders/2', json={'chest': 40, 'waist': 34, 'neck': 15.5})
+        self.app.post('/api/orders', json={'customer_id': 1, 'garment_type': 'shirt',
+                                           'total_price': 1000, 'chest': 41, 'waist': 35})
+        self.assertEqual(similar(garment_type='shirt', chest=40, waist=34, neck=15.5),
+                         [(1, 0.0, 3), (2, 0.0, 3), (3, 0.3536, 2), (6, 1.0, 2)])
+        with app.app_context():
+            self.assertEqual(measurement_index.size, 6)
+        # Deletes force a reload
+        self.app.delete('/api/orders/1')
+        self.assertEqual([m[0] for m in similar(garment_type='shirt', chest=40, waist=34)],
+                         [2, 3, 6])
+
+        # Batches of profiles give the same answers as single queries
+        with app.app_context():
+            nan = float('nan')
+            batch = measurement_index.nearest(
+                [[40, 34, nan, nan, nan, 15.5, nan, nan], [41, 35] + [nan] * 6], 'shirt', k=2)
+        self.assertEqual([[m[0] for m in matches] for matches in batch], [[2, 3], [6, 3]])
+
+        for params in ({'chest': 40}, {'garment_type': 'shirt'},
+                       {'garment_type': 'shirt', 'chest': 'wide'},
+                       {'garment_type': 'shirt', 'chest': 40, 'k': 0}):
+            response = self.app.get('/api/orders/similar', query_string=params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_material_requirements_for_open_orders(self):
+        """Test reserved demand, free stock and the orders behind a shortfall"""
+        order_ids, item_ids = self._create_stock_orders(3, [1.0, 20.0])
+        with app.app_context():
+            # Second order is in progress and due first; the third is done
+            db.session.get(TailoringOrder, order_ids[1]).status = 'in_progress'
+            db.session.get(TailoringOrder, order_ids[1]).delivery_date = datetime(2024, 1, 5)
+            db.session.get(TailoringOrder, order_ids[2]).status = 'completed'
+            db.session.commit()
+
+        with count_statements() as statements:
+            response = self.app.get('/api/inventory/requirements')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(statements), 2)
+        data = json.loads(response.data)
+        self.assertEqual(data['shortfall_items'], 1)
+        short, enough = data['items']
+        self.assertEqual((short['inventory_item_id'], short['reserved'], short['free'],
+                          short['shortfall'], short['open_orders']),
+                         (item_ids[0], 2.0, 0, 1.0, 2))
+        self.assertEqual([o['order_id'] for o in short['orders']], [order_ids[1], order_ids[0]])
+        self.assertEqual((enough['reserved'], enough['free'], enough['shortfall']), (2.0, 18.0, 0))
+        self.assertNotIn('orders', enough)
+
+        response = self.app.get('/api/inventory/requirements?shortfall=1')
+        self.assertEqual([item['inventory_item_id'] for item in json.loads(response.data)['items']],
+                         [item_ids[0]])
+
+        with app.app_context():
+            plan = explain_query_plan(reserved_demand_query())
+        self.assertIn('ix_tailoring_orders_status_order_date', plan)
+        self.assertIn('ix_order_items_order_id', plan)
+
+    def test_demand_forecast_and_reorder_suggestions(self):
+        """Test vectorized forecasts against a loop and caching until completions"""
+        order_ids, item_ids = self._create_stock_orders(40, [100.0, 100.0, 50.0])
+        today = datetime.utcnow().date()
+        with app.app_context():
+            # Orders completed on the 40 days before today; item 3 is never used
+            for day, order_id in enumerate(order_ids, start=1):
+                order = db.session.get(TailoringOrder, order_id)
+                order.status = 'completed'
+                order.completed_at = datetime.combine(today, datetime.min.time()) - \
+                    timedelta(days=day, hours=-10)
+                order.order_items = order.order_items[:1] if day % 2 else order.order_items[:2]
+                for order_item in order.order_items:
+                    order_item.quantity_used = float(day % 5)
+            db.session.commit()
+
+        response = self.app.get('/api/inventory/forecast')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['as_of'], today.isoformat())
+        first, second, unused = data['items']
+
+        # Reference implementations over the same daily series
+        history = {item_id: [0.0] * forecasting.HISTORY_DAYS for item_id in item_ids}
+        for day in range(1, 41):
+            for item_id in item_ids[:1] if day % 2 else item_ids[:2]:
+                history[item_id][forecasting.HISTORY_DAYS - day] = float(day % 5)
+        for result, item_id in ((first, item_ids[0]), (second, item_ids[1])):
+            series = history[item_id]
+            level = series[0]
+            for value in series[1:]:
+                level = forecasting.SMOOTHING * value + (1 - forecasting.SMOOTHING) * level
+            moving_average = sum(series[-forecasting.MOVING_AVERAGE_DAYS:]) / \
+                forecasting.MOVING_AVERAGE_DAYS
+            self.assertAlmostEqual(result['daily_demand']['smoothed'], level, places=4)
+            self.assertAlmostEqual(result['daily_demand']['moving_average'], moving_average,
+                                   places=4)
+            self.assertGreater(result['suggested_reorder_level'], level * data['lead_time_days'])
+        self.assertEqual(unused['daily_demand'], {'moving_average': 0, 'smoothed': 0, 'std': 0})
+        self.assertFalse(unused['reorder_now'])
+        self.assertIsNone(unused['days_of_stock'])
+
+        # Stored forecasts are reused until another order is completed
+        with count_statements() as statements:
+            self.app.get('/api/inventory/forecast')
+        self.assertFalse(any(s.startswith('DELETE') for s in statements))
+
+        with app.app_context():
+            item = db.session.get(InventoryItem, item_ids[0])
+            item.quantity = 1.0
+            db.session.commit()
+        order_id, _ = self._create_stock_orders(1, [10.0])
+        response = self.app.post(f'/api/orders/{order_id[0]}/complete')
+        self.assertIsNotNone(json.loads(response.data)['completed_at'])
+        with count_statements() as statements:
+            data = json.loads(self.app.get('/api/inventory/forecast').data)
+        self.assertTrue(any(s.startswith('DELETE FROM demand_forecasts') for s in statements))
+        first = data['items'][0]
+        self.assertTrue(first['reorder_now'])
+        self.assertAlmostEqual(first['suggested_order_quantity'],
+                               first['suggested_reorder_level'] - 1.0
+                               + first['daily_demand']['smoothed'] * data['cover_days'],
+                               places=1)
+
+    def test_bulk_order_creation(self):
+        """Test that bulk orders are validated up front and inserted in chunks"""
+        app.config['STATS_USE_COUNTERS'] = True
+        _, item_ids = self._create_stock_orders(1, [100.0, 50.0])
+        with app.app_context():
+            customer_id = db.session.execute(db.select(Customer.id)).scalar()
+        orders = [
+            {'customer_id': customer_id, 'garment_type': 'shirt', 'chest': 40.0 + i,
+             'total_price': 1000.0, 'advance_payment': 200.0,
+             'delivery_date': '2024-06-01T00:00:00',
+             'items_used': [{'inventory_item_id': item_ids[i % 2], 'quantity_used': 1.5}]}
+            for i in range(7)
+        ]
+        try:
+            self.assertEqual(self.app.get('/api/stats').status_code, 200)
+            self.assertEqual(len(json.loads(self.app.get('/api/orders').data)), 1)
+            self.assertEqual(self.app.post('/api/orders/bulk', json={}).status_code, 400)
+
+            invalid = [dict(order) for order in orders]
+            invalid[2] = {**orders[2], 'customer_id': 999}
+            invalid[5] = {**orders[5], 'total_price': 'lots', 'delivery_date': 'soon',
+                          'items_used': [{'inventory_item_id': 999, 'quantity_used': 0}]}
+            response = self.app.post('/api/orders/bulk', json=invalid + [5])
+            self.assertEqual(response.status_code, 400)
+            results = json.loads(response.data)['results']
+            self.assertEqual([result['index'] for result in results], [2, 5, 7])
+            self.assertEqual(results[2]['errors'], {'order': 'must be an object'})
+            self.assertEqual(results[0]['errors'], {'customer_id': 'customer not found'})
+            self.assertEqual(set(results[1]['errors']), {
+                'total_price', 'delivery_date', 'items_used[0].inventory_item_id',
+                'items_used[0].quantity_used'})
+
+            original_chunk_size = bulk.CHUNK_SIZE
+            bulk.CHUNK_SIZE = 3
+            try:
+                with count_statements() as statements:
+                    response = self.app.post('/api/orders/bulk', json=orders)
+            finally:
+                bulk.CHUNK_SIZE = original_chunk_size
+            self.assertEqual(response.status_code, 201)
+            data = json.loads(response.data)
+            self.assertEqual((data['created'], data['failed']), (7, 0))
+            self.assertEqual([result['index'] for result in data['results']], list(range(7)))
+            self.assertEqual(sum(s.startswith('INSERT INTO tailoring_orders')
+                                 for s in statements), 3)
+
+            listed = {order['id']: order for order in
+                      json.loads(self.app.get('/api/orders').data)}
+            self.assertEqual(len(listed), 8)
+            for i, result in enumerate(data['results']):
+                order = listed[result['id']]
+                self.assertEqual(order['measurements']['chest'], 40.0 + i)
+                self.assertEqual(order['status'], 'pending')
+                self.assertEqual(order['balance_due'], 800.0)
+                self.assertEqual([(item['inventory_item_id'], item['quantity_used'])
+                                  for item in order['items_used']], [(item_ids[i % 2], 1.5)])
+            with app.app_context():
+                self.assertEqual(stored_counters()['orders:pending'], 8)
+                self.assertEqual(stored_counters(), aggregate_counters())
+
+            # A failed chunk keeps the chunks committed before it
+            calls, failing = [], [2]
+
+            def fail_chunk(connection, changes):
+                calls.append(changes)
+                if len(calls) in failing:
+                    raise OperationalError('INSERT', {}, Exception('disk I/O error'))
+
+            original_adjust = bulk.adjust_financial_rollups
+            bulk.adjust_financial_rollups, bulk.CHUNK_SIZE = fail_chunk, 3
+            try:
+                response = self.app.post('/api/orders/bulk', json=orders[:5])
+                self.assertEqual(response.status_code, 207)
+                data = json.loads(response.data)
+                self.assertEqual((data['created'], data['failed']), (3, 2))
+                self.assertEqual([('id' in result, result['index']) for result in data['results']],
+                                 [(True, 0), (True, 1), (True, 2), (False, 3), (False, 4)])
+                calls.clear()
+                failing[:] = [1]
+                response = self.app.post('/api/orders/bulk', json=orders[:2])
+                self.assertEqual(response.status_code, 500)
+                self.assertEqual(json.loads(response.data)['created'], 0)
+            finally:
+                bulk.adjust_financial_rollups, bulk.CHUNK_SIZE = original_adjust, original_chunk_size
+            self.assertEqual(len(json.loads(self.app.get('/api/orders').data)), 11)
+        finally:
+            app.config['STATS_USE_COUNTERS'] = False
+
+    def test_inventory_import_upserts_in_chunks(self):
+        """Test that CSV and NDJSON imports upsert by name and supplier in chunks"""
+        with app.app_context():
+            db.session.add(InventoryItem(name='Silk', category='fabric', quantity=5,
+                                         unit='meters', price_per_unit=80.0,
+                                         supplier_name='Lahore Mills'))
+            db.session.commit()
+            rebuild_stat_counters()
+
+        lines = ['name,category,quantity,unit,price_per_unit,supplier_name']
+        lines += [f'Fabric {i},fabric,{i},meters,20,Karachi Textiles' for i in range(10)]
+        lines[4] = 'Fabric 3,fabric,lots,meters,20,Karachi Textiles'
+        lines.append('Silk,,12,,95.5,Lahore Mills')
+        lines.append('"Linen, white",fabric,,meters,,')
+        lines.append('Fabric 1,fabric,7,meters,21,Karachi Textiles')
+        response = self.app.post('/api/inventory/import?chunk_size=4',
+                                 data='\r\n'.join(lines).encode('utf-8-sig'),
+                                 content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        events = [json.loads(line) for line in response.data.splitlines()]
+        errors = [event for event in events if event['event'] == 'error']
+        self.assertEqual([(event['line'], sorted(event['errors'])) for event in errors],
+                         [(5, ['quantity']), (13, ['price_per_unit'])])
+        progress = [event for event in events if event['event'] == 'progress']
+        self.assertEqual([event['rows'] for event in progress], [5, 9, 13])
+        self.assertEqual(events[-1], {'event': 'done', 'rows': 13, 'created': 9,
+                                      'updated': 2, 'rejected': 2})
+
+        with app.app_context():
+            items = {(item.name, item.supplier_name): item
+                     for item in db.session.scalars(db.select(InventoryItem))}
+            self.assertEqual(len(items), 10)
+            silk = items[('Silk', 'Lahore Mills')]
+            self.assertEqual((silk.quantity, silk.price_per_unit, silk.unit), (12.0, 95.5, 'meters'))
+            self.assertEqual(items[('Fabric 1', 'Karachi Textiles')].quantity, 7.0)
+            reasons = db.session.execute(
+                db.select(StockMovement.reason, db.func.count()).group_by(StockMovement.reason)
+            ).all()
+            self.assertEqual(dict(reasons), {'initial': 1, 'import': 10})
+            self.assertEqual(stored_counters(), aggregate_counters())
+
+        response = self.app.post('/api/inventory/import', content_type='application/x-ndjson',
+                                 data='{"name": "Silk", "supplier_name": "Lahore Mills", '
+                                      '"reorder_level": 20}\nnot json\n\n{"name": 5}\n')
+        events = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual([event.get('line') for event in events], [2, 4, 1, None])
+        self.assertEqual(events[-1]['updated'], 1)
+        low_stock = json.loads(self.app.get('/api/inventory/low-stock').data)
+        self.assertIn('Silk', [item['name'] for item in low_stock])
+
+        response = self.app.post('/api/inventory/import', data='name,colour\nSilk,red\n',
+                                 content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('colour', json.loads(response.data)['error'])
+        self.assertEqual(self.app.post('/api/inventory/import', data='name\n').status_code, 400)
+
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as csv_file:
+            csv_file.write('name,category,unit,price_per_unit\nThread,thread,spools,3\n')
+        try:
+            result = app.test_cli_runner().invoke(args=['import-inventory', path])
+        finally:
+            os.remove(path)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('1 rows: 1 created', result.output)
+
+    def test_streaming_exports(self):
+        """Test CSV/NDJSON exports against the list endpoints, in batches and gzipped"""
+        order_ids = self._create_orders(7)
+        with app.app_context():
+            for day, order_id in enumerate(order_ids, start=1):
+                db.session.get(TailoringOrder, order_id).order_date = datetime(2024, 3, day, 12)
+            db.session.commit()
+        listed = json.loads(self.app.get('/api/orders').data)
+
+        original_batch_size = exports.EXPORT_BATCH_SIZE
+        exports.EXPORT_BATCH_SIZE = 3
+        try:
+            with count_statements() as statements:
+                response = self.app.get('/api/export/orders?format=ndjson')
+                lines = response.data.splitlines()
+        finally:
+            exports.EXPORT_BATCH_SIZE = original_batch_size
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual([json.loads(line) for line in lines], listed)
+        # The order query plus one order item query per batch of 3
+        self.assertEqual(len(statements), 4)
+
+        response = self.app.get('/api/export/orders?from=2024-03-02&to=2024-03-04')
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn('filename=orders.csv', response.headers['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+        self.assertEqual([int(row['id']) for row in rows], order_ids[1:4])
+        self.assertEqual(rows[0]['items_used'], 'Fabric 0 x 1 meters; Fabric 1 x 1 meters')
+        self.assertEqual(rows[0]['chest'], '')
+        self.assertEqual(float(rows[0]['balance_due']), 100.0)
+
+        response = self.app.get('/api/export/inventory?format=ndjson',
+                                headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        items = [json.loads(line) for line in gzip.decompress(response.data).splitlines()]
+        self.assertEqual(items, json.loads(self.app.get('/api/inventory').data))
+
+        self.assertEqual(self.app.get('/api/export/customers').status_code, 404)
+        self.assertEqual(self.app.get('/api/export/orders?format=xml').status_code, 400)
+        self.assertEqual(self.app.get('/api/export/orders?from=March').status_code, 400)
+        self.assertEqual(
+            self.app.get('/api/export/orders?from=2024-03-05&to=2024-03-01').status_code, 400)
+
+    @without_rollback
+    def test_generated_data_and_load_test(self):
+        """Test that generated data is reproducible and the load test covers every endpoint"""
+        tables = ('customers', 'inventory_items', 'tailoring_orders', 'order_items')
+
+        def generate():
+            with app.app_context():
+                counts = generate_data.generate(30, 60, 200, 12, seed=3, end=date(2024, 6, 30),
+                                                log=lambda line: None)
+                rows = {table: db.session.execute(text(f'SELECT * FROM {table} ORDER BY id')).all()
+                        for table in tables}
+            return counts, rows
+
+        counts, first = generate()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+        self.assertEqual(generate(), (counts, first))
+        self.assertEqual([counts[table] for table in tables[:3]], [30, 12, 60])
+        self.assertGreater(counts['order_items'], 120)
+        with app.app_context():
+            fabrics = db.session.execute(
+                db.select(db.func.count(OrderItem.order_id.distinct()))
+                .join(InventoryItem).where(InventoryItem.category == 'fabric')
+            ).scalar()
+            self.assertEqual(fabrics, 60)
+            self.assertEqual(stored_counters(), aggregate_counters())
+
+        scale = json.loads(self.app.get('/api/stats').data)
+        self.assertEqual(scale['total_orders'], 60)
+        results = loadtest.run(lambda: loadtest.TestClientTransport(app), scale,
+                                mix=dict.fromkeys(loadtest.ENDPOINTS, 1), requests=80,
+                                concurrency=2, seed=1)
+        total = results.pop('total')
+        self.assertEqual(total['requests'], 80)
+        self.assertEqual(total['errors'], 0)
+        self.assertEqual(sum(result['requests'] for result in results.values()), 80)
+        self.assertLessEqual(total['p50'], total['p95'])
+        self.assertLessEqual(total['p95'], total['p99'])
+        self.assertIn('p99 ms', loadtest.format_report(results).splitlines()[0])
+
+    def test_request_profiling(self):
+        """Test Server-Timing headers, request log lines and slow query plans"""
+        self._create_orders(3)
+
+        def timing(response):
+            return {metric.split(';')[0]: metric for metric in
+                    response.headers['Server-Timing'].split(', ')}
+
+        with self.assertLogs('hamees.requests', 'INFO') as logs, \
+                count_statements() as statements:
+            response = self.app.get('/api/orders')
+        metrics = timing(response)
+        self.assertEqual(set(metrics), {'db', 'serialize', 'app', 'total'})
+        record = json.loads(logs.output[0].split(':', 2)[2])
+        self.assertIn(f'desc="queries: {record["queries"]}"', metrics['db'])
+        self.assertEqual(record['path'], '/api/orders')
+        self.assertEqual(record['status'], 200)
+        # The profile also counts the test transaction's SAVEPOINT
+        self.assertGreaterEqual(record['queries'], len(statements))
+        self.assertGreater(record['serialize_ms'], 0)
+        self.assertAlmostEqual(record['db_ms'] + record['serialize_ms'] + record['app_ms'],
+                               record['total_ms'], delta=0.05)
+        self.assertNotIn('slow_queries', record)
+
+        app.config['PROFILE_SLOW_QUERIES'] = 1
+        try:
+            with self.assertLogs('hamees.requests', 'INFO') as logs:
+                self.app.get('/api/orders?status=pending&limit=2')
+        finally:
+            app.config['PROFILE_SLOW_QUERIES'] = 0
+        record = json.loads(logs.output[0].split(':', 2)[2])
+        self.assertEqual(len(record['slow_queries']), 1)
+
+        # Which statement is slowest varies, so list them all to find the orders query
+        app.config['PROFILE_SLOW_QUERIES'] = 50
+        try:
+            with self.assertLogs('hamees.requests', 'INFO') as logs:
+                self.app.get('/api/orders?status=pending&limit=3')
+        finally:
+            app.config['PROFILE_SLOW_QUERIES'] = 0
+        slow_queries = json.loads(logs.output[0].split(':', 2)[2])['slow_queries']
+        self.assertEqual([query['ms'] for query in slow_queries],
+                         sorted((query['ms'] for query in slow_queries), reverse=True))
+        self.assertTrue(any(
+            query['sql'].startswith('SELECT') and any(
+                'ix_tailoring_orders_status_order_date' in line for line in query['plan'])
+            for query in slow_queries))
+
+        app.config['REQUEST_PROFILING'] = False
+        try:
+            self.assertNotIn('Server-Timing', self.app.get('/api/orders').headers)
+        finally:
+            app.config['REQUEST_PROFILING'] = True
+
+    @without_rollback
+    def test_metrics_endpoint(self):
+        """Test /metrics counts requests across threads and adds up all workers"""
+        def scrape():
+            response = self.app.get('/metrics')
+            self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+            samples = {}
+            for line in response.get_data(as_text=True).splitlines():
+                if not line.startswith('#'):
+                    name, value = line.rsplit(' ', 1)
+                    samples[name] = float(value)
+            return samples
+
+        def delta(after, before, name):
+            return after.get(name, 0) - before.get(name, 0)
+
+        self._create_orders(2)
+        before = scrape()
+
+        def get_orders():
+            client = app.test_client()
+            for _ in range(5):
+                client.get('/api/orders')
+
+        threads = [threading.Thread(target=get_orders) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.app.get('/api/orders/999')
+
+        after = scrape()
+        route = 'hamees_http_requests_total{method="GET",route="/api/orders",status="200"}'
+        self.assertEqual(delta(after, before, route), 15)
+        self.assertEqual(delta(after, before, 'hamees_http_requests_total{method="GET",'
+                                              'route="/api/orders/<int:order_id>",status="404"}'), 1)
+        histogram = 'hamees_http_request_duration_seconds_count{method="GET",route="/api/orders"}'
+        self.assertEqual(delta(after, before, histogram), 15)
+        self.assertGreater(delta(after, before, 'hamees_db_query_duration_seconds_count'), 0)
+        self.assertGreater(delta(after, before, 'hamees_response_cache_requests_total'
+                                                '{result="hit"}'), 0)
+        self.assertEqual(after['hamees_orders{status="pending"}'], 2)
+        self.assertEqual(after['hamees_low_stock_items'], 0)
+        self.assertIn('hamees_db_pool_connections{state="checked_out"}', after)
+
+        # Another live worker and one that has exited, as gunicorn would leave them
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        worker = {'counters': [['hamees_http_requests_total',
+                                {'method': 'GET', 'route': '/api/orders', 'status': '200'}, 7]],
+                  'histograms': [],
+                  'gauges': [['hamees_db_pool_connections', {'state': 'checked_out'}, 3]]}
+        for pid in (os.getppid(), exited.pid):
+            with open(os.path.join(app.config['METRICS_DIR'], f'{pid}.json'), 'w') as f:
+                json.dump(worker, f)
+        try:
+            samples = scrape()
+            self.assertEqual(delta(samples, after, route), 14)
+            self.assertEqual(delta(samples, after, 'hamees_db_pool_connections'
+                                                   '{state="checked_out"}'), 3)
+            self.assertFalse(os.path.exists(os.path.join(app.config['METRICS_DIR'],
+                                                         f'{exited.pid}.json')))
+            # The exited worker's counts live on in the archive
+            self.assertEqual(delta(scrape(), after, route), 14)
+        finally:
+            os.remove(os.path.join(app.config['METRICS_DIR'], f'{os.getppid()}.json'))
+
+    @without_rollback
+    def test_app_factory_and_forked_workers(self):
+        """Test that apps are configured independently and forks get their own connections"""
+        path = os.path.join(TEST_DIR, 'factory.db')
+        other = create_app({**TEST_CONFIG, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+                            'RESOURCE_VERSION_DIR': os.path.join(TEST_DIR, 'factory-versions'),
+                            'METRICS_DIR': os.path.join(TEST_DIR, 'factory-metrics'),
+                            'STATS_USE_COUNTERS': True})
+        self.assertTrue(other.config['STATS_USE_COUNTERS'])
+        self.assertFalse(app.config['STATS_USE_COUNTERS'])
+        engines = list(app.extensions['metrics'].engines)
+        self.assertEqual(app.extensions['metrics'].directory, TEST_CONFIG['METRICS_DIR'])
+        with other.app_context():
+            # Building the app does not connect to the database
+            self.assertEqual(db.engine.pool.checkedin(), 0)
+            db.create_all()
+        client = other.test_client()
+        self.assertEqual(client.post('/api/customers', json={'name': 'Other', 'phone': '1'})
+                         .status_code, 201)
+        self.assertEqual(len(json.loads(self.app.get('/api/customers').data)), 0)
+        with other.app_context():
+            self.assertEqual(db.engine.pool.checkedin(), 1)
+        # Each app counts its own requests and engines, in its own folder
+        other.extensions['metrics'].flush()
+        app.extensions['metrics'].flush()
+        route = ['hamees_http_requests_total',
+                 {'method': 'POST', 'route': '/api/customers', 'status': '201'}, 1]
+        with open(os.path.join(TEST_DIR, 'factory-metrics', f'{os.getpid()}.json')) as f:
+            self.assertIn(route, json.load(f)['counters'])
+        with open(os.path.join(TEST_CONFIG['METRICS_DIR'], f'{os.getpid()}.json')) as f:
+            self.assertNotIn(route, json.load(f)['counters'])
+        self.assertEqual(app.extensions['metrics'].engines, engines)
+
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with other.app_context():
+                    pool = db.engine.pool
+                    inherited = pool.checkedin()
+                    customers = len(json.loads(other.test_client().get('/api/customers').data))
+                os.write(write, json.dumps([inherited, customers]).encode())
+            finally:
+                os._exit(0)
+        os.close(write)
+        with os.fdopen(read) as pipe:
+            inherited, customers = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+        self.assertEqual((inherited, customers), (0, 1))
+        with other.app_context():
+            db.engine.dispose()
+            engine = weakref.ref(db.engine)
+        self.assertIn(engine(), database._fork_engines)
+
+        # The fork hook does not keep the engines of discarded apps alive
+        del other, client
+        gc.collect()
+        self.assertIsNone(engine())
+
+    @without_rollback
+    def test_read_replica_routing(self):
+        """Test that GETs read from the replica unless the client just wrote or it lags"""
+        primary_uri, replica_uri = (f"sqlite:///{os.path.join(TEST_DIR, name)}"
+                                    for name in ('primary.db', 'replica.db'))
+        routed = create_app({**TEST_CONFIG, 'SQLALCHEMY_DATABASE_URI': primary_uri,
+                             'DATABASE_REPLICA_URL': replica_uri,
+                             'RESOURCE_VERSION_DIR': os.path.join(TEST_DIR, 'replica-versions'),
+                             'REPLICA_LAG_CHECK_SECONDS': 0, 'REPLICA_MAX_LAG_SECONDS': 0})
+        # Replication is simulated by copying rows with engines of our own
+        primary, replica = create_engine(primary_uri), create_engine(replica_uri)
+        with routed.app_context():
+            db.create_all()
+        db.metadata.create_all(replica)
+        customers = Customer.__table__
+        heartbeat = ReplicationHeartbeat.__table__
+
+        def replicate():
+            with primary.connect() as source, replica.begin() as target:
+                for table in (customers, heartbeat):
+                    target.execute(table.delete())
+                    target.execute(table.insert(), source.execute(table.select()).mappings().all())
+            with replica.begin() as target:
+                target.execute(customers.insert(), {'name': 'Replica Only', 'phone': '0'})
+
+        def names(client):
+            return [customer['name'] for customer in json.loads(client.get('/api/customers').data)]
+
+        writer, reader = routed.test_client(), routed.test_client()
+        with replica.begin() as target:
+            target.execute(customers.insert(), {'name': 'Replica Only', 'phone': '0'})
+        self.assertEqual(names(reader), ['Replica Only'])
+
+        # The writer reads its own writes, and is not served the replica's
+        # (stale) response from the cache
+        response = writer.post('/api/customers', json={'name': 'Written', 'phone': '1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(writer.get_cookie(PRIMARY_COOKIE))
+        replicate()
+        self.assertEqual(names(reader), ['Written', 'Replica Only'])
+        self.assertEqual(names(writer), ['Written'])
+        writer.set_cookie(PRIMARY_COOKIE, str(time.time() - 1))
+        response_cache.clear()
+        self.assertEqual(names(writer), ['Written', 'Replica Only'])
+
+        # A replica missing any write (here a customer) is bypassed until it catches up
+        with routed.app_context():
+            db.session.get(Customer, 1).phone = '2'
+            db.session.commit()
+        response_cache.clear()
+        self.assertEqual(names(reader), ['Written'])
+        replicate()
+        response_cache.clear()
+        self.assertEqual(names(reader), ['Written', 'Replica Only'])
+        # Reads do not stamp the heartbeat
+        with routed.app_context():
+            stamp = db.session.get(ReplicationHeartbeat, 1).written_at
+            self.assertEqual(len(json.loads(reader.get('/api/orders').data)), 0)
+            db.session.commit()
+            db.session.expire_all()
+            self.assertEqual(db.session.get(ReplicationHeartbeat, 1).written_at, stamp)
+
+        # When a check is due, one thread measures and the others use its result
+        routed.config['REPLICA_LAG_CHECK_SECONDS'] = 60
+        measured, lags = [], []
+
+        def slow_measure(primary_engine, replica_engine):
+            measured.append(replica_engine)
+            time.sleep(0.1)
+            return 0.0
+
+        def check_lag():
+            with routed.app_context():
+                lags.append(replica_router.replica_lag())
+
+        replica_router._lag_checks.clear()
+        replica_router._measure_lag = slow_measure
+        try:
+            threads = [threading.Thread(target=check_lag) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            del replica_router._measure_lag
+        self.assertEqual((len(measured), lags), (1, [0.0] * 5))
+
+        with routed.app_context():
+            with self.assertRaises(OperationalError):
+                with db.engines['replica'].begin() as connection:
+                    connection.execute(customers.delete())
+            for engine in db.engines.values():
+                engine.dispose()
+        primary.dispose()
+        replica.dispose()
+
+    def test_low_stock_alert_job(self):
+        """Test that completing an order either way queues an alert for items that became low"""
+        order_ids, item_ids = self._create_stock_orders(3, [3, 4])
+        with app.app_context():
+            for item_id in item_ids:
+                db.session.get(InventoryItem, item_id).reorder_level = 2
+            db.session.commit()
+
+        self.assertEqual(self.app.post(f'/api/orders/{order_ids[0]}/complete').status_code, 200)
+        self.assertEqual(self.app.put(f'/api/orders/{order_ids[1]}',
+                                      json={'status': 'completed'}).status_code, 200)
+        self.assertEqual(self.app.post(f'/api/orders/{order_ids[2]}/complete').status_code, 200)
+        with app.app_context():
+            # The last completion took no item down to its reorder level
+            queued = db.session.scalars(db.select(Job).order_by(Job.id)).all()
+            self.assertEqual([(job.kind, job.status, job.payload) for job in queued], [
+                ('low_stock_alert', 'queued',
+                 {'order_id': order_ids[0], 'inventory_item_ids': [item_ids[0]]}),
+                ('low_stock_alert', 'queued',
+                 {'order_id': order_ids[1], 'inventory_item_ids': [item_ids[1]]})])
+
+            self.assertEqual(jobs.work('test-worker', burst=True), 2)
+            job = db.session.get(Job, queued[0].id)
+            self.assertEqual((job.status, job.attempts, job.locked_by), ('succeeded', 1, None))
+            self.assertEqual([(item['inventory_item_id'], item['quantity'])
+                              for item in job.result['items']], [(item_ids[0], 0.0)])
+            self.assertFalse(job.result['notified'])
+
+    def test_job_retries_and_status_endpoints(self):
+        """Test job submission, status, retry backoff, failure and stale job recovery"""
+        response = self.app.post('/api/jobs', json={'kind': 'mystery'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('rebuild_forecasts', json.loads(response.data)['error'])
+        self.assertEqual(self.app.get('/api/jobs/999').status_code, 404)
+
+        response = self.app.post('/api/jobs', json={'kind': 'rebuild_stats'})
+        self.assertEqual(response.status_code, 202)
+        status = self.app.get(response.headers['Location'])
+        self.assertEqual(json.loads(status.data)['status'], 'queued')
+
+        calls = []
+
+        def flaky(payload):
+            calls.append(payload)
+            raise RuntimeError('supplier API down')
+
+        jobs.JOB_HANDLERS['flaky'] = flaky
+        try:
+            with app.app_context():
+                flaky = jobs.enqueue('flaky', {'n': 1}, max_attempts=2)
+                db.session.commit()
+                flaky_id = flaky.id
+                self.assertEqual(jobs.work('test-worker', burst=True), 2)
+
+                job = db.session.get(Job, flaky_id)
+                self.assertEqual((job.status, job.attempts), ('queued', 1))
+                self.assertEqual(job.error, 'RuntimeError: supplier API down')
+                delay = (job.run_at - datetime.utcnow()).total_seconds()
+                self.assertAlmostEqual(delay, app.config['JOB_RETRY_SECONDS'], delta=5)
+                self.assertEqual(jobs.retry_delay(3), 4 * app.config['JOB_RETRY_SECONDS'])
+                self.assertEqual(jobs.retry_delay(20), jobs.MAX_RETRY_DELAY)
+
+                # Nothing is due until the backoff has passed
+                self.assertEqual(jobs.work('test-worker', burst=True), 0)
+                job.run_at = datetime.utcnow()
+                db.session.commit()
+                self.assertEqual(jobs.work('test-worker', burst=True), 1)
+                job = db.session.get(Job, flaky_id)
+                self.assertEqual((job.status, job.attempts, len(calls)), ('failed', 2, 2))
+
+                # A job whose worker died is queued again
+                stale = jobs.enqueue('rebuild_stats')
+                db.session.commit()
+                self.assertEqual(jobs.claim_job('dead-worker').id, stale.id)
+                stale.locked_at -= timedelta(seconds=app.config['JOB_TIMEOUT_SECONDS'] + 1)
+                db.session.commit()
+                self.assertEqual(jobs.requeue_stale_jobs(), 1)
+                self.assertEqual((db.session.get(Job, stale.id).status, stale.locked_by),
+                                 ('queued', None))
+        finally:
+            del jobs.JOB_HANDLERS['flaky']
+
+    def test_financial_rollups_and_report(self):
+        """Test that rollups follow every order write and reports match the raw orders"""
+        with app.app_context():
+            customer = Customer(name='Test Customer', phone='1234567890')
+            db.session.add(customer)
+            db.session.flush()
+            orders = [
+                TailoringOrder(customer_id=customer.id, order_date=order_date,
+                               garment_type=garment_type, total_price=price,
+                               advance_payment=advance)
+                for order_date, garment_type, price, advance in (
+                    (datetime(2024, 1, 15, 10), 'shirt', 1000, 200),
+                    (datetime(2024, 1, 15, 18), 'suit', 5000, 1000),
+                    (datetime(2024, 1, 31, 23, 30), 'shirt', 1200, 0),
+                    (datetime(2024, 2, 10, 12), 'pant', 800, 800),
+                    (datetime(2024, 3, 1), 'suit', 6000, 3000),
+                    (datetime(2024, 3, 5, 15), 'kurta', 1500, 500),
+                    (datetime(2024, 4, 2, 9), 'shirt', 1100, 100))
+            ]
+            db.session.add_all(orders)
+            db.session.commit()
+            ids, customer_id = [order.id for order in orders], customer.id
+
+        # ORM updates and deletes, Core completions (one combined with ORM
+        # changes) and a bulk import all move the rollups
+        self.assertEqual(self.app.put(f'/api/orders/{ids[1]}', json={
+            'status': 'in_progress', 'advance_payment': 2500}).status_code, 200)
+        self.assertEqual(self.app.put(f'/api/orders/{ids[3]}', json={
+            'status': 'completed', 'total_price': 900, 'garment_type': 'suit'}).status_code, 200)
+        self.assertEqual(self.app.post(f'/api/orders/{ids[5]}/complete').status_code, 200)
+        self.assertEqual(self.app.delete(f'/api/orders/{ids[6]}').status_code, 204)
+        self.assertEqual(self.app.post('/api/orders/bulk', json=[
+            {'customer_id': customer_id, 'garment_type': 'waistcoat', 'total_price': 700,
+             'advance_payment': 100}] * 2).status_code, 201)
+
+        def stored_rollups():
+            return db.session.execute(
+                db.select(FinancialRollup.period, FinancialRollup.period_start,
+                          FinancialRollup.status, FinancialRollup.garment_type,
+                          FinancialRollup.orders, FinancialRollup.revenue, FinancialRollup.advance)
+                .where(FinancialRollup.orders != 0)
+                .order_by(FinancialRollup.period, FinancialRollup.period_start,
+                          FinancialRollup.status, FinancialRollup.garment_type)
+            ).all()
+
+        with app.app_context():
+            maintained = stored_rollups()
+            reports.rebuild_financial_rollups()
+            self.assertEqual(stored_rollups(), maintained)
+
+        def from_orders(start, end):
+            with app.app_context():
+                rows = db.session.execute(
+                    db.select(TailoringOrder.status, TailoringOrder.garment_type,
+                              TailoringOrder.total_price, TailoringOrder.advance_payment)
+                    .where(TailoringOrder.order_date >= start, TailoringOrder.order_date < end)
+                ).all()
+
+            def amounts(selected):
+                revenue = sum(row.total_price for row in selected)
+                advance = sum(row.advance_payment for row in selected)
+                return {'orders': len(selected), 'revenue': revenue,
+                        'advance_collected': advance, 'balance_due': revenue - advance}
+
+            return {'totals': amounts(rows),
+                    'by_status': {status: amounts([row for row in rows if row.status == status])
+                                  for status in sorted({row.status for row in rows})},
+                    'by_garment_type': {
+                        garment: amounts([row for row in rows if row.garment_type == garment])
+                        for garment in sorted({row.garment_type for row in rows})}}
+
+        def report(**params):
+            response = self.app.get('/api/reports/financial', query_string=params)
+            self.assertEqual(response.status_code, 200, response.data)
+            return json.loads(response.data)
+
+        # Partial days, whole days and whole months in every combination
+        for start, end in (('2024-01-15T12:00:00', '2024-04-10T00:00:00'),
+                           ('2024-01-01', '2024-12-31'),
+                           ('2024-01-15T09:00:00', '2024-01-15T12:00:00'),
+                           ('2024-01-15T11:00:00', '2024-02-01T00:00:00'),
+                           ('2024-01-31T23:00:00', '2024-03-01T12:00:00'),
+                           ('2024-02-01', '2024-02-29')):
+            end_time = datetime.fromisoformat(end) + timedelta(days=1 if len(end) == 10 else 0)
+            data = report(**{'from': start, 'to': end})
+            self.assertEqual({key: data[key] for key in ('totals', 'by_status', 'by_garment_type')},
+                             from_orders(datetime.fromisoformat(start), end_time), (start, end))
+        self.assertEqual(reports.report_segments(datetime(2024, 1, 15, 12), datetime(2024, 4, 10)), (
+            [(datetime(2024, 1, 15, 12), datetime(2024, 1, 16))],
+            [(date(2024, 1, 16), date(2024, 2, 1)), (date(2024, 4, 1), date(2024, 4, 10))],
+            [(date(2024, 2, 1), date(2024, 4, 1))]))
+
+        months = report(**{'from': '2024-01-01', 'to': '2024-03-31', 'interval': 'month'})
+        self.assertEqual([(period['period'], period['orders']) for period in months['periods']],
+                         [('2024-01', 3), ('2024-02', 1), ('2024-03', 2)])
+        days = report(**{'from': '2024-01-15T12:00:00', 'to': '2024-01-16', 'interval': 'day'})
+        self.assertEqual([(period['period'], period['balance_due']) for period in days['periods']],
+                         [('2024-01-15', 2500.0)])
+        # Everything up to now, including the bulk orders
+        self.assertEqual(report()['totals']['orders'], 8)
+
+        # A report over a long range reads rollup rows, not orders
+        with count_statements() as statements:
+            report(**{'from': '2020-01-01T08:00:00', 'to': '2025-06-30T17:00:00'})
+        self.assertEqual(len(statements), 3)
+
+        for params in ({'interval': 'week'}, {'from': 'soon'}, {'from': '2024-02-01', 'to': '2024-01-01'}):
+            response = self.app.get('/api/reports/financial', query_string=params)
+            self.assertEqual(response.status_code, 400, params)
+
+    @without_rollback
+    def test_job_worker_pool(self):
+        """Test that pooled worker processes run every job exactly once"""
+        with app.app_context():
+            queued = [jobs.enqueue('rebuild_stats') for _ in range(8)]
+            db.session.commit()
+            ids = [job.id for job in queued]
+        poll_seconds = app.config['JOB_POLL_SECONDS']
+        app.config['JOB_POLL_SECONDS'] = 0.05
+        try:
+            jobs.run_worker_pool(app, 2, burst=True)
+        finally:
+            app.config['JOB_POLL_SECONDS'] = poll_seconds
+        with app.app_context():
+            self.assertEqual(db.session.execute(
+                db.select(Job.status, Job.attempts).where(Job.id.in_(ids))).all(),
+                [('succeeded', 1)] * 8)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,12 @@
+"""
+Hamees Attire Inventory Management System
+WSGI Entry Point
+
+For a pre-forking server, build the app once in the master and fork the
+workers from it; each worker opens its own database connections:
+
+    gunicorn --preload --workers 4 --bind 0.0.0.0:5000 wsgi:app
+"""
+from app import create_app
+
+app = create_app()